@@ -0,0 +1,406 @@
+"""Reproducible benchmarks of the simulator and its kernels, results are written as machine-readable JSON"""
+import argparse
+import contextlib
+import copy
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+from initialize_model import init_objects, init_multi_asset_objects
+from model import ABM_model, event_driven_ABM_model, multi_asset_ABM_model
+from objects.ensemble_analysis import EnsembleAnalysis
+from objects.orderbook import LimitOrderBook
+from objects.price_ladder import PriceLadderOrderBook
+from objects.trader import Trader, TraderVariables, TraderParameters, TraderExpectations
+from functions.portfolio_optimization import portfolio_optimization
+from functions.helpers import calculate_covariance_matrix, organise_data
+from functions.memory_probe import max_rss_kilobytes
+
+BASE_PARAMETERS = {'trader_sample_size': 10, 'n_traders': 50, 'init_stocks': 81, 'ticks': 100,
+                   'fundamental_value': 1112.2356754564078, 'std_fundamental': 0.036106530849401956,
+                   'base_risk_aversion': 0.7, 'spread_max': 0.004087, 'horizon': 212,
+                   'std_noise': 0.05149715506250338, 'w_random': 1.0, 'mean_reversion': 0.0,
+                   'fundamentalist_horizon_multiplier': 1.0, 'strat_share_chartists': 0.0,
+                   'mutation_intensity': 0.0, 'average_learning_ability': 0.0, 'trades_per_tick': 1}
+
+GRID = {'n_traders': [50, 1000, 10000], 'trader_sample_size': [10, 100], 'trades_per_tick': [1, 5]}
+QUICK_GRID = {'n_traders': [50, 1000], 'trader_sample_size': [10], 'trades_per_tick': [1]}
+MULTI_ASSET_GRID = {'n_assets': [2, 12, 36], 'n_traders': [2000], 'trader_sample_size': [100, 1000]}
+QUICK_MULTI_ASSET_GRID = {'n_assets': [2, 12], 'n_traders': [200], 'trader_sample_size': [100]}
+
+
+def measure(function, repeats=1):
+    """
+    Time a function and measure its peak memory allocation in a separate traced run
+    :param function: function without arguments to benchmark
+    :param repeats: integer amount of timed runs
+    :return: dictionary with the best and mean wall time in seconds and the peak traced memory in bytes
+    """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    # tracing slows down allocations, so memory is measured in a run which is not timed
+    tracemalloc.start()
+    function()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'seconds': min(timings), 'mean_seconds': float(np.mean(timings)), 'repeats': repeats,
+            'peak_memory_bytes': peak_memory}
+
+
+def silent(function):
+    """
+    :param function: function without arguments
+    :return: function which runs the original with its printed output discarded
+    """
+    def run():
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            return function()
+    return run
+
+
+def simulate(parameters, seed):
+    """Initialise and simulate the model once"""
+    traders, orderbook, market_maker = init_objects(parameters, seed)
+    return ABM_model(traders, orderbook, market_maker, parameters, seed)
+
+
+def benchmark_end_to_end(grid, ticks, repeats, seed):
+    """
+    Benchmark init_objects + ABM_model for all combinations of the grid
+    :param grid: dictionary of parameter names and lists of values
+    :param ticks: integer amount of ticks per simulation
+    :param repeats: integer amount of timed runs per combination
+    :param seed: integer seed
+    :return: list of dictionaries with parameters and measurements
+    """
+    results = []
+    for values in itertools.product(*grid.values()):
+        parameters = dict(BASE_PARAMETERS, ticks=ticks, **dict(zip(grid.keys(), values)))
+        if parameters['trader_sample_size'] > parameters['n_traders']:
+            continue
+        result = measure(silent(lambda: simulate(parameters, seed)), repeats)
+        result.update({name: parameters[name] for name in grid})
+        result.update({'ticks': ticks, 'seconds_per_tick': result['seconds'] / ticks})
+        results.append(result)
+        print('end_to_end', {name: parameters[name] for name in grid}, round(result['seconds'], 3), 's')
+    return results
+
+
+def make_trader(name, money=10 ** 9, stocks=10 ** 6):
+    """Create a trader which can hold and trade any order used in the benchmarks"""
+    variables = TraderVariables(1.0, 0.0, 0.0, 0.0, money, stocks, None, BASE_PARAMETERS['fundamental_value'])
+    parameters = TraderParameters(BASE_PARAMETERS['horizon'], BASE_PARAMETERS['base_risk_aversion'], 0.0,
+                                  BASE_PARAMETERS['spread_max'])
+    return Trader(name, variables, parameters, TraderExpectations(BASE_PARAMETERS['fundamental_value']))
+
+
+def benchmark_orderbook(n_orders, repeats, seed, tick_size=None, price_ladder=False):
+    """
+    Micro-benchmarks of adding, cancelling, matching and cleansing orders in the LimitOrderBook, and of 1000 reads
+    of its depth view
+    :param n_orders: integer amount of orders per side
+    :param repeats: integer amount of timed runs
+    :param seed: integer seed
+    :param tick_size: optional float price grid of the book
+    :param price_ladder: boolean whether to benchmark a PriceLadderOrderBook (requires tick_size) instead
+    :return: dictionary of measurements per operation
+    """
+    rng = np.random.RandomState(seed)
+    price = BASE_PARAMETERS['fundamental_value']
+    owner = make_trader(0)
+    bid_prices = rng.normal(price * 0.99, price * 0.01, n_orders)
+    ask_prices = rng.normal(price * 1.01, price * 0.01, n_orders)
+    volumes = rng.randint(1, 10, n_orders)
+
+    def new_book():
+        if price_ladder:
+            return PriceLadderOrderBook(price, BASE_PARAMETERS['spread_max'], BASE_PARAMETERS['horizon'], 10, tick_size)
+        return LimitOrderBook(price, BASE_PARAMETERS['spread_max'], BASE_PARAMETERS['horizon'], 10, tick_size)
+
+    def filled_book():
+        book = new_book()
+        orders = []
+        for bid, ask, volume in zip(bid_prices, ask_prices, volumes):
+            orders.append(book.add_bid(bid, volume, owner))
+            orders.append(book.add_ask(ask, volume, owner))
+        return book, orders
+
+    def add():
+        filled_book()
+
+    def cancel():
+        book, orders = filled_book()
+        random.Random(seed).shuffle(orders)
+        start = time.perf_counter()
+        for order in orders:
+            book.cancel_order(order)
+        return time.perf_counter() - start
+
+    def match():
+        book, orders = filled_book()
+        start = time.perf_counter()
+        while book.match_orders() is not None:
+            pass
+        return time.perf_counter() - start
+
+    def cleanse():
+        book, orders = filled_book()
+        start = time.perf_counter()
+        for _ in range(book.order_expiration + 2):
+            book.cleanse_book()
+        return time.perf_counter() - start
+
+    def depth():
+        book, orders = filled_book()
+        start = time.perf_counter()
+        for _ in range(1000):
+            book.depth(10)
+        return time.perf_counter() - start
+
+    results = {'n_orders_per_side': n_orders, 'add': measure(add, repeats)}
+    for name, operation in [('cancel', cancel), ('match', match), ('cleanse', cleanse), ('depth', depth)]:
+        result = measure(operation, repeats)
+        # exclude building the book from the timing of the operation itself
+        result['operation_seconds'] = min(operation() for _ in range(repeats))
+        results[name] = result
+    return results
+
+
+def benchmark_kernels(calls, repeats, seed):
+    """
+    Micro-benchmarks of the per trader portfolio kernels
+    :param calls: integer amount of calls per timed run
+    :param repeats: integer amount of timed runs
+    :param seed: integer seed
+    :return: dictionary of measurements per kernel
+    """
+    np.random.seed(seed)
+    returns = list(np.random.normal(0, BASE_PARAMETERS['std_fundamental'], BASE_PARAMETERS['horizon']))
+    trader = make_trader(0)
+    trader.var.covariance_matrix = calculate_covariance_matrix(returns, BASE_PARAMETERS['std_fundamental'])
+    trader.exp.returns['stocks'] = 0.01
+
+    def covariance():
+        for _ in range(calls):
+            calculate_covariance_matrix(returns, BASE_PARAMETERS['std_fundamental'])
+
+    def optimization():
+        for _ in range(calls):
+            portfolio_optimization(trader, 0)
+
+    return {'calls': calls,
+            'calculate_covariance_matrix': measure(covariance, repeats),
+            'portfolio_optimization': measure(optimization, repeats)}
+
+
+def benchmark_organise_data(n_runs, ticks, repeats, seed):
+    """
+    Benchmark organise_data on a list of simulated orderbooks
+    :param n_runs: integer amount of orderbooks
+    :param ticks: integer amount of ticks per simulation
+    :param repeats: integer amount of timed runs
+    :param seed: integer seed
+    :return: dictionary of measurements
+    """
+    parameters = dict(BASE_PARAMETERS, ticks=ticks)
+    orderbook = silent(lambda: simulate(parameters, seed))()[1]
+    obs = [copy.deepcopy(orderbook) for _ in range(n_runs)]
+    result = measure(lambda: organise_data(obs), repeats)
+    # callers which only need the returns do not compute the other statistics
+    result['returns_only'] = measure(lambda: EnsembleAnalysis.from_orderbooks(obs).returns, repeats)
+    result.update({'n_runs': n_runs, 'ticks': ticks})
+    return result
+
+
+def benchmark_calibration(n_traders, ticks, repeats, seed):
+    """
+    Benchmark the calibration objective for a single seed
+    :param n_traders: integer amount of traders
+    :param ticks: integer amount of ticks
+    :param repeats: integer amount of timed runs
+    :param seed: integer seed
+    :return: dictionary of measurements
+    """
+    from model_calibration import simulate_a_seed, params
+
+    # the Hurst exponent of the calibration moments needs at least 100 prices
+    ticks = max(ticks, 100)
+    parameters = dict(params, n_traders=n_traders, ticks=ticks)
+    result = measure(silent(lambda: simulate_a_seed([seed, parameters])), repeats)
+    result.update({'n_traders': n_traders, 'ticks': ticks})
+    return result
+
+
+def benchmark_multi_asset(grid, ticks, repeats, seed):
+    """
+    Benchmark init_multi_asset_objects + multi_asset_ABM_model for all combinations of the grid
+    :param grid: dictionary of parameter names and lists of values, e.g. n_assets and trader_sample_size
+    :param ticks: integer amount of ticks per simulation
+    :param repeats: integer amount of timed runs per combination
+    :param seed: integer seed
+    :return: list of dictionaries with parameters and measurements
+    """
+    results = []
+    for values in itertools.product(*grid.values()):
+        parameters = dict(BASE_PARAMETERS, ticks=ticks, **dict(zip(grid.keys(), values)))
+
+        def run():
+            traders, orderbooks, market_makers = init_multi_asset_objects(parameters, seed)
+            return multi_asset_ABM_model(traders, orderbooks, market_makers, parameters, seed)
+
+        result = measure(silent(run), repeats)
+        result.update({name: parameters[name] for name in grid})
+        result.update({'ticks': ticks, 'seconds_per_turn': result['seconds'] / (ticks * parameters['trades_per_tick'])})
+        results.append(result)
+        print('multi_asset', {name: parameters[name] for name in grid}, round(result['seconds'], 3), 's')
+    return results
+
+
+def benchmark_event_driven(grid, ticks, repeats, seed):
+    """
+    Benchmark init_objects + event_driven_ABM_model for all combinations of the grid, with the same expected
+    amount of activations per tick as ABM_model so the results compare with benchmark_end_to_end
+    :param grid: dictionary of parameter names and lists of values
+    :param ticks: integer amount of ticks per simulation
+    :param repeats: integer amount of timed runs per combination
+    :param seed: integer seed
+    :return: list of dictionaries with parameters and measurements
+    """
+    results = []
+    for values in itertools.product(*grid.values()):
+        parameters = dict(BASE_PARAMETERS, ticks=ticks, **dict(zip(grid.keys(), values)))
+        if parameters['trader_sample_size'] > parameters['n_traders']:
+            continue
+
+        def run():
+            traders, orderbook, market_maker = init_objects(parameters, seed)
+            return event_driven_ABM_model(traders, orderbook, market_maker, parameters, seed)
+
+        result = measure(silent(run), repeats)
+        events = silent(run)()[1].processed_events
+        result.update({name: parameters[name] for name in grid})
+        result.update({'ticks': ticks, 'events': events, 'seconds_per_tick': result['seconds'] / ticks,
+                       'seconds_per_event': result['seconds'] / events})
+        results.append(result)
+        print('event_driven', {name: parameters[name] for name in grid}, round(result['seconds'], 3), 's')
+    return results
+
+
+def benchmark_startup(modules, repeats):
+    """
+    Measure the time a fresh interpreter needs to import modules and which heavy dependencies they load
+    :param modules: list of module names, e.g. numpy as reference and model as core simulation
+    :param repeats: integer amount of fresh interpreters per module
+    :return: dictionary of measurements per module
+    """
+    code = ("import sys, time, json; start = time.perf_counter(); import {}; seconds = time.perf_counter() - start; "
+            "print(json.dumps([seconds, [m for m in ('pandas', 'scipy', 'matplotlib') if m in sys.modules]]))")
+    results = {}
+    for module in modules:
+        timings = []
+        for _ in range(repeats):
+            output = subprocess.check_output([sys.executable, '-c', code.format(module)])
+            seconds, loaded = json.loads(output)
+            timings.append(seconds)
+        results[module] = {'seconds': min(timings), 'mean_seconds': float(np.mean(timings)), 'repeats': repeats,
+                           'heavy_modules_loaded': loaded}
+    return results
+
+
+def benchmark_first_init(parameters, seed, repeats):
+    """
+    Measure the time a fresh interpreter which has imported the model needs for its first init_objects, e.g. in a
+    new simulation worker, and which heavy dependencies it loads
+    :param parameters: dictionary of parameters, e.g. with vectorized_activation
+    :param seed: integer seed
+    :param repeats: integer amount of fresh interpreters
+    :return: dictionary of measurements
+    """
+    code = ("import sys, time, json; import model; from initialize_model import init_objects; "
+            "parameters = json.loads(sys.argv[1]); start = time.perf_counter(); init_objects(parameters, {}); "
+            "seconds = time.perf_counter() - start; "
+            "print(json.dumps([seconds, [m for m in ('pandas', 'scipy', 'matplotlib') if m in sys.modules]]))")
+    timings = []
+    for _ in range(repeats):
+        output = subprocess.check_output([sys.executable, '-c', code.format(seed), json.dumps(parameters)])
+        seconds, loaded = json.loads(output)
+        timings.append(seconds)
+    return {'seconds': min(timings), 'mean_seconds': float(np.mean(timings)), 'repeats': repeats,
+            'heavy_modules_loaded': loaded}
+
+
+def metadata(seed):
+    """
+    :return: dictionary describing the code version and machine the benchmarks ran on
+    """
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': commit, 'seed': seed,
+            'python': sys.version.split()[0], 'numpy': np.__version__, 'platform': platform.platform(),
+            'processor': platform.processor(), 'cpu_count': os.cpu_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON file the results are written to')
+    parser.add_argument('--parts', default='startup,end_to_end,event_driven,orderbook,price_ladder,kernels,'
+                                           'organise_data,calibration,multi_asset',
+                        help='comma separated benchmark parts to run')
+    parser.add_argument('--quick', action='store_true', help='use a small grid and few repeats')
+    parser.add_argument('--ticks', type=int, default=100, help='ticks per end-to-end simulation')
+    parser.add_argument('--repeats', type=int, default=3, help='timed runs per micro-benchmark')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    parts = args.parts.split(',')
+    repeats = 1 if args.quick else args.repeats
+    results = {'metadata': metadata(args.seed)}
+
+    if 'startup' in parts:
+        results['startup'] = benchmark_startup(['numpy', 'model', 'initialize_model'], 3 if args.quick else 10)
+        for mode, parameters in [('loop', BASE_PARAMETERS),
+                                 ('vectorized', dict(BASE_PARAMETERS, vectorized_activation=True))]:
+            results['startup']['first_init_objects_' + mode] = benchmark_first_init(parameters, args.seed,
+                                                                                    3 if args.quick else 10)
+    if 'end_to_end' in parts:
+        results['end_to_end'] = benchmark_end_to_end(QUICK_GRID if args.quick else GRID, args.ticks, 1, args.seed)
+    if 'event_driven' in parts:
+        results['event_driven'] = benchmark_event_driven(QUICK_GRID if args.quick else GRID, args.ticks, 1, args.seed)
+    if 'orderbook' in parts:
+        results['orderbook'] = benchmark_orderbook(1000 if args.quick else 10000, repeats, args.seed)
+    if 'price_ladder' in parts:
+        results['price_ladder'] = {
+            str(tick_size): {'limit_order_book': benchmark_orderbook(n_orders, repeats, args.seed, tick_size),
+                             'price_ladder': benchmark_orderbook(n_orders, repeats, args.seed, tick_size, True)}
+            for tick_size in [0.01, 1.0] for n_orders in [1000 if args.quick else 10000]}
+    if 'kernels' in parts:
+        results['kernels'] = benchmark_kernels(100 if args.quick else 1000, repeats, args.seed)
+    if 'organise_data' in parts:
+        results['organise_data'] = benchmark_organise_data(4, args.ticks, repeats, args.seed)
+    if 'calibration' in parts:
+        results['calibration'] = benchmark_calibration(50 if args.quick else 1000, args.ticks, 1, args.seed)
+    if 'multi_asset' in parts:
+        results['multi_asset'] = benchmark_multi_asset(QUICK_MULTI_ASSET_GRID if args.quick else MULTI_ASSET_GRID,
+                                                       args.ticks, 1, args.seed)
+
+    results['metadata']['max_rss_kilobytes'] = max_rss_kilobytes()
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('Benchmark results written to', args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,359 @@
+"""
+Equivalence checks of accelerated engines against the reference ABM_model. Deterministic components (fundamental
+paths, order book replay, event-sourced balances, the price ladder order book, portfolio kernels) are compared
+exactly under fixed seeds. The full model is compared by distribution over many seeds: statistics of the price paths,
+the organise_data moments and the calibration loss of every engine are tested against those of the reference with
+two-sample Kolmogorov-Smirnov tests. The script exits with status 1 if a check fails, so it can run as a test before
+performance work is merged.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+import numpy as np
+from initialize_model import init_objects
+from model import ABM_model, simulate_outputs
+from objects.ensemble_analysis import EnsembleAnalysis
+from objects.event_log import OrderEventLog, read_event_log, replay_event_log, logged_trades
+from objects.trader import Trader, TraderVariables, TraderParameters, TraderExpectations
+from functions.fundamental import fundamental_paths, cached_fundamental_paths
+from functions.helpers import calculate_covariance_matrix, horizon_return_statistics
+from functions.portfolio_optimization import portfolio_optimization, mean_variance_stock_weights
+
+BASE_PARAMETERS = {'trader_sample_size': 10, 'n_traders': 50, 'init_stocks': 81, 'ticks': 200,
+                   'fundamental_value': 1112.2356754564078, 'std_fundamental': 0.036106530849401956,
+                   'base_risk_aversion': 0.7, 'spread_max': 0.004087, 'horizon': 212,
+                   'std_noise': 0.05149715506250338, 'w_random': 0.5, 'mean_reversion': 0.0,
+                   'fundamentalist_horizon_multiplier': 1.0, 'strat_share_chartists': 0.3,
+                   'mutation_intensity': 0.0, 'average_learning_ability': 0.0, 'trades_per_tick': 2}
+
+# parameters which switch the reference ABM_model to an accelerated engine
+ENGINES = {'vectorized': {'vectorized_activation': True},
+           'event_sourced': {'event_sourced_balances': True},
+           'event_driven': {'event_driven': True}}
+
+OUTPUTS = ['close_prices', 'volumes', 'fundamentals', 'moments']
+
+MOMENT_NAMES = ['autocorrelation_returns', 'autocorrelation_abs_returns', 'kurtosis', 'hurst']
+
+# statistics compared by default: volatility, mispricing and activity. Every extra statistic divides the significance
+# level further, with all 13 statistics and few seeds only gross differences are detected
+KEY_STATISTICS = ['std_returns', 'std_mispricing', 'mean_volume']
+
+
+def check(name, passed, **details):
+    """
+    :param name: string name of the check
+    :param passed: boolean result of the check
+    :return: dictionary with the name, result and details of the check
+    """
+    print('PASS' if passed else 'FAIL', name, {key: value for key, value in details.items() if not isinstance(value, list)})
+    return dict(name=name, passed=bool(passed), **details)
+
+
+def simulate(parameters, seed):
+    """Initialise and simulate the reference model once and return its objects"""
+    traders, orderbook, market_maker = init_objects(parameters, seed)
+    return ABM_model(traders, orderbook, market_maker, parameters, seed)
+
+
+def reference_fundamental_path(init_level, sigma, mean_reversion, ticks, seed):
+    """
+    Generate one fundamental path period by period, the sequential definition which fundamental_paths vectorizes
+    :return: np.Array of ticks + 1 fundamental values
+    """
+    shocks = np.random.default_rng(seed).normal(0, sigma, ticks)
+    path = [init_level]
+    for shock in shocks:
+        new = path[-1] + shock + mean_reversion * (np.log(init_level) - np.log(path[-1]))
+        if new <= 0 or np.isnan(new):
+            new = path[-1]
+        path.append(max(new, 0.1))
+    return np.array(path)
+
+
+def check_fundamental_paths(parameters, seeds):
+    """
+    Check that fundamental paths do not depend on which other seeds are generated in the same call, that the cache
+    and the simulated model use the same paths, and that the vectorized generation follows the sequential process
+    (exactly with mean reversion, up to rounding of the cumulative sum for the random walk)
+    :param parameters: dictionary of parameters
+    :param seeds: list of integer seeds
+    :return: list of check results
+    """
+    process = (parameters['fundamental_value'], parameters['std_fundamental'], parameters['mean_reversion'],
+               parameters['ticks'])
+    batch = fundamental_paths(*process, seeds=seeds)
+    single = np.array([fundamental_paths(*process, seeds=[seed])[0] for seed in seeds])
+    results = [check('fundamental_batch_independence', np.array_equal(batch, single))]
+
+    results.append(check('fundamental_cache', np.array_equal(cached_fundamental_paths(parameters, seeds), batch)))
+
+    simulated = np.array(simulate(parameters, seeds[0])[1].fundamental)
+    results.append(check('fundamental_simulated', np.array_equal(simulated, batch[0])))
+
+    for mean_reversion in [0.0, 0.1]:
+        process = process[:2] + (mean_reversion,) + process[3:]
+        vectorized = fundamental_paths(*process, seeds=seeds)
+        sequential = np.array([reference_fundamental_path(*process, seed=seed) for seed in seeds])
+        deviation = float(np.max(np.abs(vectorized / sequential - 1)))
+        passed = deviation == 0 if mean_reversion else deviation < 1e-12
+        results.append(check('fundamental_sequential_mean_reversion_{}'.format(mean_reversion), passed,
+                             max_relative_deviation=deviation))
+    return results
+
+
+def check_orderbook_replay(parameters, seed):
+    """
+    Check that replaying the logged order flow of a simulation into a fresh order book reproduces its trade tape,
+    close prices and resting orders
+    :param parameters: dictionary of parameters
+    :param seed: integer seed
+    :return: list of check results
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'events.bin')
+        traders, orderbook, market_maker = init_objects(parameters, seed)
+        with OrderEventLog(path) as event_log:
+            orderbook.event_log = event_log
+            traders, orderbook, market_maker = ABM_model(traders, orderbook, market_maker, parameters, seed)
+        events = read_event_log(path)
+
+    replayed, tape = replay_event_log(events, init_objects(parameters, seed)[1])
+    # ABM_model appends the first fundamental value to the close prices before the first tick
+    return [check('orderbook_replay_trades', np.array_equal(tape, logged_trades(events)), trades=len(tape)),
+            check('orderbook_replay_close_prices', replayed.tick_close_price == orderbook.tick_close_price[1:]),
+            check('orderbook_replay_resting_orders',
+                  [(o.order_id, o.price, o.volume) for o in replayed.bids + replayed.asks] ==
+                  [(o.order_id, o.price, o.volume) for o in orderbook.bids + orderbook.asks])]
+
+
+def check_event_sourced_balances(parameters, seed):
+    """
+    Check that a simulation with event-sourced balances has the same prices and trader histories as the reference
+    :param parameters: dictionary of parameters
+    :param seed: integer seed
+    :return: list of check results
+    """
+    traders, orderbook, _ = simulate(parameters, seed)
+    ledger_parameters = dict(parameters, event_sourced_balances=True)
+    ledger_traders, ledger_orderbook, _ = simulate(ledger_parameters, seed)
+    same_histories = all(list(trader.var.money) == list(ledger_trader.var.money) and
+                         list(trader.var.stocks) == list(ledger_trader.var.stocks) and
+                         list(trader.var.wealth) == list(ledger_trader.var.wealth)
+                         for trader, ledger_trader in zip(traders, ledger_traders))
+    return [check('event_sourced_close_prices', orderbook.tick_close_price == ledger_orderbook.tick_close_price),
+            check('event_sourced_histories', same_histories)]
+
+
+def check_price_ladder(parameters, seed, tick_size=0.01, ladder_width=None):
+    """
+    Check that a simulation on the price ladder order book has the same order flow, trades and resting orders as one
+    on the limit order book with the same tick size
+    :param parameters: dictionary of parameters
+    :param seed: integer seed
+    :param tick_size: float price grid of both order books
+    :param ladder_width: optional integer levels of the dense window of the ladder, a narrow window also checks the
+    levels outside of it and the moves of the window
+    :return: list of check results
+    """
+    books = []
+    with tempfile.TemporaryDirectory() as directory:
+        for price_ladder in [False, True]:
+            book_parameters = dict(parameters, tick_size=tick_size, price_ladder=price_ladder,
+                                   ladder_width=ladder_width)
+            path = os.path.join(directory, 'events_{}.bin'.format(price_ladder))
+            traders, orderbook, market_maker = init_objects(book_parameters, seed)
+            with OrderEventLog(path) as event_log:
+                orderbook.event_log = event_log
+                traders, orderbook, market_maker = ABM_model(traders, orderbook, market_maker, book_parameters, seed)
+            books.append((orderbook, read_event_log(path)))
+
+    (orderbook, events), (ladder, ladder_events) = books
+    name = 'price_ladder' if ladder_width is None else 'price_ladder_width_{}'.format(ladder_width)
+    return [check(name + '_events', np.array_equal(events, ladder_events), events=len(events),
+                  outside_levels=len(ladder.bid_outside) + len(ladder.ask_outside)),
+            check(name + '_close_prices', orderbook.tick_close_price == ladder.tick_close_price),
+            check(name + '_resting_orders',
+                  [(o.order_id, o.price, o.volume) for o in orderbook.bids + orderbook.asks] ==
+                  [(o.order_id, o.price, o.volume) for o in list(ladder.bids) + list(ladder.asks)]),
+            check(name + '_depth', all(np.array_equal(side, ladder_side, equal_nan=True)
+                                            for side, ladder_side in zip(orderbook.depth(), ladder.depth())))]
+
+
+def check_determinism(parameters, seed):
+    """
+    Check that two simulations with the same seed in one process are identical, e.g. that caches do not leak state
+    :param parameters: dictionary of parameters
+    :param seed: integer seed
+    :return: list of check results
+    """
+    first, second = [simulate(parameters, seed)[1] for _ in range(2)]
+    return [check('determinism', first.tick_close_price == second.tick_close_price and
+                  first.transaction_volumes_history == second.transaction_volumes_history)]
+
+
+def check_portfolio_kernels(parameters, n_traders, seed, tolerance=1e-9):
+    """
+    Check that the array kernels of vectorized_activation equal the per trader calculations of the reference
+    :param parameters: dictionary of parameters
+    :param n_traders: integer amount of random traders
+    :param seed: integer seed
+    :param tolerance: float largest accepted absolute deviation, the kernels round differently
+    :return: list of check results
+    """
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0, 0.01, parameters['horizon']).tolist()
+    horizons = rng.integers(2, parameters['horizon'] + 1, n_traders)
+    expected_returns = rng.normal(0, 0.01, n_traders)
+    risk_aversion = rng.uniform(0.1, 2., n_traders)
+
+    means, variances = horizon_return_statistics(returns, horizons, parameters['std_fundamental'])
+    reference_means = np.array([np.mean(returns[-horizon:]) for horizon in horizons])
+    reference_variances = []
+    reference_weights = []
+    for horizon, expected_return, aversion in zip(horizons, expected_returns, risk_aversion):
+        trader = Trader(0, TraderVariables(1., 0., 0., 0., 1000., 10, None, 1.),
+                        TraderParameters(horizon, aversion, 0., 0.), TraderExpectations(1.))
+        trader.var.covariance_matrix = calculate_covariance_matrix(returns[-horizon:], parameters['std_fundamental'])
+        trader.exp.returns['stocks'] = expected_return
+        reference_variances.append(trader.var.covariance_matrix['stocks']['stocks'])
+        reference_weights.append(portfolio_optimization(trader, 0)['stocks'])
+    weights = mean_variance_stock_weights(expected_returns, variances, risk_aversion)
+
+    return [check('kernel_horizon_means', np.allclose(means, reference_means, rtol=0, atol=tolerance),
+                  max_deviation=float(np.max(np.abs(means - reference_means)))),
+            check('kernel_horizon_variances', np.allclose(variances, reference_variances, rtol=0, atol=tolerance),
+                  max_deviation=float(np.max(np.abs(variances - np.array(reference_variances))))),
+            check('kernel_stock_weights', np.allclose(weights, reference_weights, rtol=0, atol=tolerance),
+                  max_deviation=float(np.max(np.abs(weights - np.array(reference_weights)))))]
+
+
+def simulate_statistics(seed_parameters):
+    """
+    Simulate one seed and return its projected outputs and calibration loss, picklable for a process pool
+    :param seed_parameters: list of integer seed and dictionary of parameters
+    :return: dictionary of outputs
+    """
+    from functions.indirect_calibration import quadratic_loss_function
+
+    seed, parameters = seed_parameters
+    record = simulate_outputs(parameters, seed, OUTPUTS)
+    record['loss'] = quadratic_loss_function(record['moments'], np.load('emp_moments.npy'),
+                                             np.load('distr_weighting_matrix.npy'))
+    return record
+
+
+def ensemble_statistics(records):
+    """
+    Summarise an ensemble of simulations into one value per seed for every compared statistic
+    :param records: list of dictionaries from simulate_statistics
+    :return: dictionary of statistic names and np.Arrays with a value per seed
+    """
+    ensemble = EnsembleAnalysis([record['close_prices'] for record in records],
+                                [record['volumes'] for record in records],
+                                [record['fundamentals'] for record in records])
+
+    # the close prices start with the initial price of the order book, the fundamentals with the first tick
+    prices = ensemble.prices.to_numpy()[-len(ensemble.fundamental):]
+    mispricing = np.log(prices / ensemble.fundamental.to_numpy())
+    statistics = {'mean_mispricing': np.nanmean(mispricing, axis=0),
+                  'std_mispricing': np.nanstd(mispricing, axis=0),
+                  'final_log_price': np.log(prices[-1]),
+                  'std_returns': ensemble.returns.std().to_numpy(),
+                  'autocorrelation_returns_lag_1': ensemble.autocorr_returns.iloc[1].to_numpy(),
+                  'autocorrelation_abs_returns_lag_1': ensemble.autocorr_abs_returns.iloc[1].to_numpy(),
+                  'mean_volatility': ensemble.volatility.mean().to_numpy(),
+                  'mean_volume': ensemble.volume.mean().to_numpy(),
+                  'loss': np.array([record['loss'] for record in records])}
+    for index, name in enumerate(MOMENT_NAMES):
+        statistics['moment_' + name] = np.array([record['moments'][index] for record in records])
+    return statistics
+
+
+def check_distributions(parameters, engine, seeds, alpha=0.01, processes=1, reference=None, statistics=None):
+    """
+    Compare the distribution over seeds of statistics of an engine with that of the reference model. The
+    significance level is divided by the amount of compared statistics (Bonferroni), an infinite loss counts as its
+    own value and statistics which are identical per seed pass.
+    :param parameters: dictionary of parameters of the reference model
+    :param engine: string key of ENGINES
+    :param seeds: list of integer seeds, the engine uses different seeds than the reference
+    :param alpha: float family-wise significance level
+    :param processes: integer amount of worker processes
+    :param reference: optional dictionary of reference statistics from an earlier call
+    :param statistics: optional list of names of the compared statistics, by default all statistics
+    :return: list of check results, dictionary of reference statistics
+    """
+    from scipy.stats import ks_2samp
+
+    engine_parameters = dict(parameters, **ENGINES[engine])
+    # independent samples, the same seeds would couple the random numbers of both ensembles
+    engine_seeds = [seed + len(seeds) for seed in seeds]
+    with Pool(processes) as pool:
+        if reference is None:
+            reference = ensemble_statistics(pool.map(simulate_statistics, [[seed, parameters] for seed in seeds]))
+        engine_statistics = ensemble_statistics(pool.map(simulate_statistics,
+                                                         [[seed, engine_parameters] for seed in engine_seeds]))
+
+    names = list(reference) if statistics is None else statistics
+    results = []
+    for name in names:
+        reference_values = np.nan_to_num(reference[name], nan=0., posinf=1e300)
+        values = np.nan_to_num(engine_statistics[name], nan=0., posinf=1e300)
+        p_value = float(ks_2samp(reference_values, values).pvalue)
+        results.append(check('distribution_{}_{}'.format(engine, name), p_value >= alpha / len(names),
+                             p_value=p_value, reference_mean=float(np.mean(reference_values)),
+                             engine_mean=float(np.mean(values))))
+    return results, reference
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--engines', default='vectorized,event_sourced',
+                        help='comma separated engines compared by distribution, keys of ENGINES')
+    parser.add_argument('--seeds', type=int, default=40, help='seeds per ensemble of the distributional tests')
+    parser.add_argument('--ticks', type=int, default=200, help='ticks per simulation')
+    parser.add_argument('--alpha', type=float, default=0.01, help='family-wise significance level per engine')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='worker processes of the ensembles')
+    parser.add_argument('--all_statistics', action='store_true',
+                        help='compare every statistic instead of KEY_STATISTICS, which needs more seeds')
+    parser.add_argument('--quick', action='store_true', help='fewer seeds and ticks')
+    parser.add_argument('--output', default=None, help='optional JSON file the results are written to')
+    args = parser.parse_args()
+
+    np.seterr(all='ignore')
+    start_time = time.time()
+    seeds = list(range(24 if args.quick else args.seeds))
+    parameters = dict(BASE_PARAMETERS, ticks=120 if args.quick else args.ticks)
+    statistics = None if args.all_statistics else KEY_STATISTICS
+
+    results = []
+    results += check_fundamental_paths(parameters, seeds)
+    results += check_orderbook_replay(parameters, seeds[0])
+    results += check_event_sourced_balances(parameters, seeds[0])
+    results += check_price_ladder(parameters, seeds[0])
+    results += check_price_ladder(parameters, seeds[0], ladder_width=200)
+    results += check_determinism(parameters, seeds[0])
+    results += check_portfolio_kernels(parameters, 200, seeds[0])
+
+    reference = None
+    for engine in args.engines.split(','):
+        engine_results, reference = check_distributions(parameters, engine, seeds, args.alpha, args.processes,
+                                                        reference, statistics)
+        results += engine_results
+
+    failed = [result['name'] for result in results if not result['passed']]
+    print('{} of {} checks passed in {:.1f} s'.format(len(results) - len(failed), len(results),
+                                                      time.time() - start_time))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump({'parameters': parameters, 'seeds': seeds, 'results': results}, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
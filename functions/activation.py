@@ -0,0 +1,88 @@
+import numpy as np
+from functions.helpers import horizon_return_covariances
+from functions.strategy_kernels import MarketSignals, strategy_expectations
+from functions.portfolio_optimization import mean_variance_stock_weights, batch_long_only_weights
+
+
+def batch_orders(population, active, mid_price, fundamental, historical_stock_returns, money, stocks, parameters):
+    """
+    Form expectations, optimize portfolios and determine order prices and volumes for a block of active traders.
+    This is the array version of the per trader expectation formation, portfolio optimization and order
+    sizing in ABM_model. Expectations are formed by the registered strategy kernels, see
+    functions.strategy_kernels.
+    :param population: object Population
+    :param active: np.Array of names of the active traders
+    :param mid_price: float current mid price
+    :param fundamental: float current fundamental value
+    :param historical_stock_returns: list of historical stock returns
+    :param money: np.Array of money of the active traders
+    :param stocks: np.Array of stocks of the active traders
+    :param parameters: dictionary of parameters
+    :return: np.Array of order prices, np.Array of integer order volumes (positive bids, negative asks)
+    """
+    signals = MarketSignals(mid_price, fundamental, historical_stock_returns, parameters["std_fundamental"])
+
+    # expectation formation
+    expected_returns = strategy_expectations(population, active, signals, parameters)
+    fcast_prices = mid_price * np.exp(expected_returns)
+
+    # portfolio optimization
+    variances = signals.horizon_statistics(population.horizon[active])[1]
+    stock_weights = mean_variance_stock_weights(expected_returns, variances, population.risk_aversion[active])
+
+    # determine price and volume
+    prices = np.random.normal(fcast_prices, population.spread[active])
+    position_changes = stock_weights * (stocks * prices + money) - stocks * prices
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volumes = np.trunc(position_changes / prices)
+    volumes[~np.isfinite(volumes)] = 0
+
+    return prices, volumes.astype(int)
+
+
+def batch_multi_asset_orders(population, active, mid_prices, fundamentals, historical_returns, money, stocks,
+                             parameters):
+    """
+    Form expectations per asset, choose long-only portfolios of all assets and determine order prices and volumes
+    for a block of active traders in a multi-asset market
+    :param population: object Population
+    :param active: np.Array of names of the active traders
+    :param mid_prices: np.Array of current mid prices per asset
+    :param fundamentals: np.Array of current fundamental values per asset
+    :param historical_returns: np.Array of historical returns with a row per period and a column per asset
+    :param money: np.Array of money of the active traders
+    :param stocks: np.Array of stocks of the active traders (traders, assets)
+    :param parameters: dictionary of parameters
+    :return: np.Array of order prices (traders, assets), np.Array of integer order volumes (traders, assets)
+    """
+    horizon = population.horizon[active]
+    chartist_component, covariances = horizon_return_covariances(historical_returns, horizon,
+                                                                 parameters["std_fundamental"])
+    fundamental_component = np.log(fundamentals / mid_prices)
+    noise_component = parameters['std_noise'] * np.random.randn(len(active), len(mid_prices))
+
+    # expectation formation
+    expected_returns = (
+            (population.weight_fundamentalist[active] / (horizon * parameters["fundamentalist_horizon_multiplier"]))[:, None] * fundamental_component +
+            population.weight_chartist[active][:, None] * chartist_component +
+            population.weight_random[active][:, None] * noise_component)
+    fcast_prices = mid_prices * np.exp(expected_returns)
+
+    # portfolio optimization
+    stock_weights = batch_long_only_weights(expected_returns, covariances, population.risk_aversion[active])
+
+    # determine price and volume
+    prices = np.random.normal(fcast_prices, population.spread[active][:, None])
+    wealth = money + (stocks * prices).sum(axis=1)
+    position_changes = stock_weights * wealth[:, None] - stocks * prices
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volumes = np.trunc(position_changes / prices)
+    volumes[~np.isfinite(volumes)] = 0
+
+    # sales only pay out when they are matched, so the bids of a trader are limited to its money
+    bid_costs = (np.maximum(volumes, 0) * prices).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        budget_share = np.where(bid_costs > money, money / bid_costs, 1.)
+    volumes = np.where(volumes > 0, np.floor(volumes * budget_share[:, None]), volumes)
+
+    return prices, volumes.astype(int)
@@ -0,0 +1,191 @@
+"""
+Local cache of the empirical reference data (Shiller S&P 500 data) and of the artifacts derived from it for the
+calibration: the model parameters taken from the data, the empirical moments, the bootstrapped moments and the
+weighting matrix.
+
+The data are downloaded once and stored as columns in a .npz file together with the hash of the downloaded file.
+Derived artifacts are stored in files keyed by that content hash and their settings, so they are only recomputed
+when the data or the settings change, and the calibration set-up works offline.
+"""
+import hashlib
+import io
+import json
+import os
+import random
+import urllib.request
+import numpy as np
+
+SHILLER_URL = 'http://www.econ.yale.edu/~shiller/data/ie_data.xls'
+HEADER_ROW = 7
+START_ROW = 1174 # first month of the reference period
+CACHE_DIR = 'data'
+DATA_FILE = 'shiller_data.npz'
+
+BLOCK_SIZE = 25
+BOOTSTRAPS = 100
+LAGS = 25
+HORIZON_SHARE = 0.35 # horizon relative to the length of the data, from the average churn ratio found by Cella, Ellul
+# and Giannetti (2013)
+
+# artifacts which have already been loaded or computed in this process, keyed by content hash and settings
+artifact_cache = {}
+
+
+def load_shiller_data(cache_dir=CACHE_DIR, source=SHILLER_URL, refresh=False):
+    """
+    Load the numeric columns of the Shiller data from the local cache, the source is only read if there is no
+    cache yet or if refresh is True
+    :param cache_dir: string directory of the cache
+    :param source: string url or file name of the Shiller Excel sheet
+    :param refresh: boolean whether to read the source again
+    :return: dictionary of column names and np.Arrays, string content hash of the source
+    """
+    file_name = os.path.join(cache_dir, DATA_FILE)
+    if refresh or not os.path.exists(file_name):
+        import pandas as pd
+
+        if os.path.exists(source):
+            with open(source, 'rb') as f:
+                content = f.read()
+        else:
+            content = urllib.request.urlopen(source).read()
+        sheet = pd.read_excel(io.BytesIO(content), header=HEADER_ROW)[:-3]
+
+        columns = {}
+        for name in sheet.columns:
+            values = pd.to_numeric(sheet[name], errors='coerce').to_numpy(dtype=float)
+            if not np.isnan(values).all():
+                columns[str(name)] = values
+        os.makedirs(cache_dir, exist_ok=True)
+        np.savez(file_name, names=np.array(list(columns)), values=np.array(list(columns.values())),
+                 content_hash=hashlib.sha256(content).hexdigest())
+
+    with np.load(file_name) as cached:
+        columns = dict(zip(cached['names'].tolist(), cached['values']))
+        return columns, str(cached['content_hash'])
+
+
+def reference_series(columns):
+    """
+    Select the reference period of the S&P 500 price
+    :param columns: dictionary of column names and np.Arrays from load_shiller_data
+    :return: pd.Series of prices, pd.Series of returns
+    """
+    import pandas as pd
+
+    p = pd.Series(columns['Price'][START_ROW:-1])
+    p_returns = pd.Series(columns['Price'][START_ROW:]).pct_change()[1:]
+    return p, p_returns
+
+
+def data_parameters(p, p_returns):
+    """
+    Model parameters which are derived from the reference data
+    :param p: pd.Series of prices
+    :param p_returns: pd.Series of returns
+    :return: dictionary with the ticks (length of the data), fundamental_value (average price, assuming efficient
+    markets), std_fundamental (standard deviation of returns) and horizon
+    """
+    return {'ticks': len(p), 'fundamental_value': float(p.mean()), 'std_fundamental': float(p_returns.std()),
+            'horizon': int(len(p) * HORIZON_SHARE)}
+
+
+def empirical_moments(p, p_returns, lags=LAGS):
+    """
+    Calculate the moments of the reference data which the calibration matches
+    :param p: pd.Series of prices
+    :param p_returns: pd.Series of returns
+    :param lags: integer amount of lags of the autocorrelations
+    :return: np.Array of the average autocorrelation of returns and of absolute returns, the kurtosis of returns and
+    the Hurst exponent of prices
+    """
+    from hurst import compute_Hc
+    from functions.stylizedfacts import autocorrelation_returns
+
+    return np.array([
+        autocorrelation_returns(p_returns, lags),
+        autocorrelation_returns(p_returns.abs(), lags),
+        p_returns.kurtosis(),
+        compute_Hc(p, kind='price', simplified=True)[0]
+    ])
+
+
+def bootstrap_moments(p, p_returns, block_size=BLOCK_SIZE, bootstraps=BOOTSTRAPS, seed=0, lags=LAGS):
+    """
+    Calculate the moments of block bootstrapped returns and prices
+    :param p: pd.Series of prices
+    :param p_returns: pd.Series of returns
+    :param block_size: integer length of the blocks
+    :param bootstraps: integer amount of bootstrapped series
+    :param seed: integer seed of the block sampling
+    :param lags: integer amount of lags of the autocorrelations
+    :return: np.Array (bootstraps, moments)
+    """
+    import pandas as pd
+    from hurst import compute_Hc
+    from functions.stylizedfacts import autocorrelation_returns
+
+    p_data_blocks = []
+    price_data_blocks = []
+    for x in range(0, len(p_returns[:-3]), block_size):
+        p_data_blocks.append(p_returns[x:x + block_size])
+        price_data_blocks.append(p[x:x + block_size])
+
+    rng = random.Random(seed)
+    moments = []
+    for _ in range(bootstraps):
+        rets = [j for block in [rng.choice(p_data_blocks) for _ in p_data_blocks] for j in block]
+        prices = [j for block in [rng.choice(price_data_blocks) for _ in price_data_blocks] for j in block]
+        moments.append([autocorrelation_returns(rets, lags),
+                        autocorrelation_returns(np.abs(rets), lags),
+                        pd.Series(rets).kurtosis(),
+                        compute_Hc(prices, kind='price', simplified=True)[0]])
+    return np.array(moments)
+
+
+def weighting_matrix(moments):
+    """
+    Inverse of the bootstrap estimate of the covariance matrix of the moments
+    :param moments: np.Array (bootstraps, moments)
+    :return: np.Array weighting matrix W
+    """
+    deviations = moments - np.nanmean(moments, axis=0)
+    return np.linalg.inv(deviations.T @ deviations / len(moments))
+
+
+def calibration_artifacts(cache_dir=CACHE_DIR, block_size=BLOCK_SIZE, bootstraps=BOOTSTRAPS, seed=0, lags=LAGS,
+                          refresh=False):
+    """
+    Return the empirical moments, bootstrapped moments and weighting matrix of the reference data. They are
+    computed once per content hash of the data and settings, and afterwards loaded from memory or the cache files.
+    :param cache_dir: string directory of the cache
+    :param block_size: integer length of the bootstrap blocks
+    :param bootstraps: integer amount of bootstrapped series
+    :param seed: integer seed of the block sampling
+    :param lags: integer amount of lags of the autocorrelations
+    :param refresh: boolean whether to read the source data again
+    :return: dictionary with 'emp_moments', 'bootstrap_moments' (bootstraps, moments), 'W', the 'parameters' of
+    data_parameters and 'content_hash'
+    """
+    columns, content_hash = load_shiller_data(cache_dir, refresh=refresh)
+    settings = {'content_hash': content_hash, 'start_row': START_ROW, 'block_size': block_size,
+                'bootstraps': bootstraps, 'seed': seed, 'lags': lags}
+    key = hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+    if key in artifact_cache:
+        return artifact_cache[key]
+
+    file_name = os.path.join(cache_dir, 'calibration_artifacts_{}.npz'.format(key))
+    p, p_returns = reference_series(columns)
+    if os.path.exists(file_name):
+        with np.load(file_name) as cached:
+            artifacts = {name: cached[name] for name in ['emp_moments', 'bootstrap_moments', 'W']}
+    else:
+        moments = bootstrap_moments(p, p_returns, block_size, bootstraps, seed, lags)
+        artifacts = {'emp_moments': empirical_moments(p, p_returns, lags), 'bootstrap_moments': moments,
+                     'W': weighting_matrix(moments)}
+        np.savez(file_name, **artifacts)
+
+    artifacts['parameters'] = data_parameters(p, p_returns)
+    artifacts['content_hash'] = content_hash
+    artifact_cache[key] = artifacts
+    return artifacts
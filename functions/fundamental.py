@@ -0,0 +1,102 @@
+"""Pre-generated paths of the exogenous fundamental value process"""
+
+import collections
+import os
+import numpy as np
+
+FUNDAMENTAL_FLOOR = 0.1
+
+# paths which have already been generated in this process, keyed by process parameters and seed, least recently
+# used first. At most MAX_CACHED_PATHS paths are kept, e.g. 1000 paths of 5000 ticks take 40 MB
+MAX_CACHED_PATHS = 1000
+path_cache = collections.OrderedDict()
+
+
+def fundamental_paths(init_level, sigma, mean_reversion, ticks, seeds):
+    """
+    Generate fundamental value paths for several seeds in one vectorized call.
+    Every period the value moves with a normal shock and is pulled back by mean_reversion * log(init / previous),
+    as in helpers.ornstein_uhlenbeck_evolve. Without mean reversion the process is a random walk.
+    Invalid values are replaced by the previous value and the value never falls below the floor of 0.1.
+    :param init_level: float initial and long term fundamental value
+    :param sigma: float standard deviation of the shocks
+    :param mean_reversion: float speed of mean reversion, 0.0 gives a random walk
+    :param ticks: integer amount of periods to generate
+    :param seeds: list of integer seeds, every seed has its own random number stream
+    :return: np.Array of shape (len(seeds), ticks + 1) with the init_level in the first column
+    """
+    shocks = np.array([np.random.default_rng(seed).normal(0, sigma, ticks) for seed in seeds]).reshape(len(seeds), ticks)
+    paths = np.empty((len(seeds), ticks + 1))
+    paths[:, 0] = init_level
+
+    if mean_reversion == 0.0:
+        # a random walk only depends on its history through the floor
+        paths[:, 1:] = init_level + np.cumsum(shocks, axis=1)
+        if paths.min() >= FUNDAMENTAL_FLOOR:
+            return paths
+
+    log_init_level = np.log(init_level)
+    for t in range(ticks):
+        previous = paths[:, t]
+        new = previous + shocks[:, t] + mean_reversion * (log_init_level - np.log(previous))
+        new = np.where((new <= 0) | np.isnan(new), previous, new)
+        paths[:, t + 1] = np.maximum(new, FUNDAMENTAL_FLOOR)
+
+    return paths
+
+
+def cached_fundamental_paths(parameters, seeds, cache_dir=None):
+    """
+    Return the fundamental paths for a parameter set, only generating the seeds which are not cached yet.
+    Paths only depend on the fundamental process parameters, so scenarios and parameter sets which share
+    these reuse the same paths. The least recently used paths are evicted beyond MAX_CACHED_PATHS.
+    :param parameters: dictionary of parameters
+    :param seeds: list of integer seeds
+    :param cache_dir: string optional directory in which paths are also stored as .npy files
+    :return: np.Array of shape (len(seeds), ticks + 1)
+    """
+    process = (float(parameters["fundamental_value"]), float(parameters["std_fundamental"]),
+               float(parameters["mean_reversion"]), int(parameters["ticks"]))
+
+    paths = {seed: path_cache.get(process + (seed,)) for seed in seeds}
+    missing = [seed for seed, path in paths.items() if path is None]
+    if cache_dir is not None:
+        for seed in list(missing):
+            file_name = os.path.join(cache_dir, cache_file_name(process, seed))
+            if os.path.exists(file_name):
+                paths[seed] = np.load(file_name)
+                missing.remove(seed)
+
+    if missing:
+        new_paths = fundamental_paths(*process, seeds=missing)
+        for seed, path in zip(missing, new_paths):
+            path.flags.writeable = False
+            paths[seed] = path
+            if cache_dir is not None:
+                os.makedirs(cache_dir, exist_ok=True)
+                np.save(os.path.join(cache_dir, cache_file_name(process, seed)), path)
+
+    for seed, path in paths.items():
+        path_cache[process + (seed,)] = path
+        path_cache.move_to_end(process + (seed,))
+    while len(path_cache) > MAX_CACHED_PATHS:
+        path_cache.popitem(last=False)
+
+    return np.array([paths[seed] for seed in seeds])
+
+
+def clear_path_cache():
+    """
+    Remove all fundamental paths from the cache of this process, e.g. between calibrations
+    :return: None
+    """
+    path_cache.clear()
+
+
+def cache_file_name(process, seed):
+    """
+    :param process: tuple of fundamental value, standard deviation, mean reversion and ticks
+    :param seed: integer seed
+    :return: string file name of a cached path
+    """
+    return 'fundamental_{}_{}_{}_{}_seed{}.npy'.format(*[repr(x) for x in process], seed)
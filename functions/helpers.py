@@ -1,23 +1,88 @@
 import numpy as np
 from numpy import log, polyfit, sqrt, std, subtract
-import pandas as pd
 import math
-import scipy.stats as stats
 
 
-def calculate_covariance_matrix(historical_stock_returns, base_historical_variance):
+def covariance_array(historical_stock_returns, base_historical_variance):
     """
-    Calculate the covariance matrix of a safe asset (money) provided stock returns
+    Calculate the covariance matrix of a safe asset (money) provided stock returns without Pandas
     :param historical_stock_returns: list of historical stock returns
-    :return: DataFrame of the covariance matrix of stocks and money (in practice just the variance).
+    :param base_historical_variance: float variance used if the price is stationary
+    :return: np.Array (2, 2) of the covariance matrix of stocks and money (in practice just the variance)
     """
-    assets = ['stocks', 'money']
     covariances = np.cov(np.array([historical_stock_returns, np.zeros(len(historical_stock_returns))]))
 
     if covariances.sum().sum() == 0.:
         # If the price is stationary, revert to base historical variance
         covariances[0][0] = base_historical_variance
-    return pd.DataFrame(covariances, index=assets, columns=assets)
+    return covariances
+
+
+def calculate_covariance_matrix(historical_stock_returns, base_historical_variance):
+    """
+    Calculate the covariance matrix of a safe asset (money) provided stock returns
+    :param historical_stock_returns: list of historical stock returns
+    :return: DataFrame of the covariance matrix of stocks and money (in practice just the variance).
+    """
+    import pandas as pd
+
+    assets = ['stocks', 'money']
+    return pd.DataFrame(covariance_array(historical_stock_returns, base_historical_variance), index=assets,
+                        columns=assets)
+
+
+def horizon_return_statistics(historical_stock_returns, horizons, base_historical_variance):
+    """
+    Calculate the mean and variance of the most recent returns for many horizons at once
+    :param historical_stock_returns: list of historical stock returns
+    :param horizons: np.Array of integer horizons
+    :param base_historical_variance: float variance used if the returns over a horizon are stationary
+    :return: np.Array of mean returns, np.Array of return variances per horizon
+    """
+    recent = np.array(historical_stock_returns[-int(horizons.max()):], dtype=float)[::-1]
+    observations = np.arange(1., len(recent) + 1)
+    means = np.cumsum(recent) / observations
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variances = (np.cumsum(recent ** 2) - observations * means ** 2) / (observations - 1)
+    variances = np.maximum(variances, 0.)
+
+    # if the price is stationary, revert to base historical variance (as calculate_covariance_matrix)
+    stationary = np.maximum.accumulate(recent) == np.minimum.accumulate(recent)
+    variances[stationary] = base_historical_variance
+
+    return means[horizons - 1], variances[horizons - 1]
+
+
+def horizon_return_covariances(historical_returns, horizons, base_historical_variance):
+    """
+    Calculate the mean returns and return covariance matrix of several assets over the most recent returns for
+    many horizons at once, the multi-asset version of horizon_return_statistics
+    :param historical_returns: np.Array of historical returns with a row per period and a column per asset
+    :param horizons: np.Array of integer horizons
+    :param base_historical_variance: float variance used for assets whose price is stationary over a horizon
+    :return: np.Array of mean returns (horizons, assets), np.Array of covariances (horizons, assets, assets)
+    """
+    recent = np.array(historical_returns[-int(horizons.max()):], dtype=float)[::-1]
+    observations = np.arange(1., len(recent) + 1)
+    means = np.cumsum(recent, axis=0) / observations[:, None]
+
+    # only the covariances of the horizons which occur are calculated
+    used, inverse = np.unique(horizons, return_inverse=True)
+    second_moments = np.cumsum(recent[:, :, None] * recent[:, None, :], axis=0)[used - 1]
+    used_means = means[used - 1]
+    used_observations = observations[used - 1][:, None, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariances = (second_moments - used_observations * used_means[:, :, None] * used_means[:, None, :]
+                       ) / (used_observations - 1)
+
+    # if the price of an asset is stationary, revert to base historical variance
+    stationary = (np.maximum.accumulate(recent) == np.minimum.accumulate(recent))[used - 1]
+    assets = np.arange(recent.shape[1])
+    variances = np.maximum(covariances[:, assets, assets], 0.)
+    variances[stationary] = base_historical_variance
+    covariances[:, assets, assets] = variances
+
+    return means[horizons - 1], covariances[inverse]
 
 
 def div0(numerator, denominator):
@@ -98,47 +163,15 @@ def hurst(ts):
 
 def organise_data(obs, burn_in_period=0):
     """
-    Extract data in manageable format from list of orderbooks
+    Extract data in manageable format from list of orderbooks, use EnsembleAnalysis directly to compute only the
+    statistics which are needed
     :param obs: object limit-orderbook
     :param burn_in_period: integer period of observations which is discarded
     :return: Pandas DataFrames of prices, returns, autocorrelation in returns, autocorr_abs_returns, volatility, volume, fundamentals
     """
-    window = 20
-    close_price = []
-    returns = []
-    autocorr_returns = []
-    autocorr_abs_returns = []
-    returns_volatility = []
-    volume = []
-    fundamentals = []
-    for ob in obs:  # record
-        # close price
-        close_price.append(ob.tick_close_price[burn_in_period:])
-        # returns
-        r = pd.Series(np.array(ob.tick_close_price[burn_in_period:])).pct_change()
-        returns.append(r)
-        # autocorrelation returns
-        ac_r = [r.autocorr(lag=lag) for lag in range(25)]
-        autocorr_returns.append(ac_r)
-        # autocorrelation absolute returns
-        absolute_returns = pd.Series(r).abs()
-        autocorr_abs_returns.append([absolute_returns.autocorr(lag=lag) for lag in range(25)])
-        # volatility of returns
-        roller_returns = r.rolling(window)
-        returns_volatility.append(roller_returns.std(ddof=0))
-        # volume
-        volume.append([sum(volumes) for volumes in ob.transaction_volumes_history][burn_in_period:])
-        # fundamentals
-        fundamentals.append(ob.fundamental[burn_in_period:])
-    mc_prices = pd.DataFrame(close_price).transpose()
-    mc_returns = pd.DataFrame(returns).transpose()
-    mc_autocorr_returns = pd.DataFrame(autocorr_returns).transpose()
-    mc_autocorr_abs_returns = pd.DataFrame(autocorr_abs_returns).transpose()
-    mc_volatility = pd.DataFrame(returns_volatility).transpose()
-    mc_volume = pd.DataFrame(volume).transpose()
-    mc_fundamentals = pd.DataFrame(fundamentals).transpose()
-
-    return mc_prices, mc_returns, mc_autocorr_returns, mc_autocorr_abs_returns, mc_volatility, mc_volume, mc_fundamentals
+    from objects.ensemble_analysis import EnsembleAnalysis
+
+    return EnsembleAnalysis.from_orderbooks(obs, burn_in_period).statistics()
 
 
 def hypothetical_series(starting_value, returns):
@@ -159,6 +192,8 @@ def get_specific_bootstraps_moments(full_series, bootstrap_number):
 
 
 def confidence_interval(data, av):
+    import scipy.stats as stats
+
     sample_stdev = np.std(data)
     sigma = sample_stdev/math.sqrt(len(data))
     return stats.t.interval(alpha = 0.95, df= 24, loc=av, scale=sigma)
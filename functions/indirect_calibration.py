@@ -1,6 +1,6 @@
 from model import *
 from initialize_model import init_objects
-from functions.helpers import organise_data
+from objects.ensemble_analysis import EnsembleAnalysis
 from functions.stylizedfacts import autocorrelation_returns
 
 
@@ -52,9 +52,7 @@ def model_performance(input_parameters):
         obs.append(orderbook)
 
     # store simulated stylized facts
-    mc_prices, mc_returns, \
-    mc_autocorr_returns, mc_autocorr_abs_returns, \
-    mc_volatility, mc_volume, mc_fundamentals = organise_data(obs)
+    mc_returns = EnsembleAnalysis.from_orderbooks(obs).returns
 
     means = []
     stds = []
@@ -95,9 +93,8 @@ def model_performance(input_parameters):
 # Improting necessary modules
 # ===========================================================================================================================================================================
 
-# Numpy/Scipy
+# Numpy (scipy.optimize is imported when an optimization starts)
 import numpy as np
-import scipy.optimize as sciopt
 
 
 # ===========================================================================================================================================================================
@@ -125,6 +122,8 @@ def constrNM(func, x0, LB, UB, args=(), xtol=0.0001, ftol=0.0001, maxiter=None,
         callback(callable) : Called after each iteration, as ``callback(xk)``, where xk is the current parameter vector.
     """
 
+    import scipy.optimize as sciopt
+
     # Check input
     if len(LB) != len(UB) or len(LB) != len(x0):
         raise ValueError('Input arrays have unequal size.')
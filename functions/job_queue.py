@@ -0,0 +1,206 @@
+"""
+Distribution of simulation tasks over worker processes on several hosts over TCP.
+
+The JobServer runs in the process of the calibration and hands out (function, argument) tasks to the workers
+which connect to it. Its map method is a drop-in replacement for multiprocessing.Pool.map. Tasks and results are
+pickled, so functions must be importable on the workers (e.g. model_calibration.simulate_a_seed). Anyone who can
+connect with the authkey can run code in the server and the workers, so the key is a required secret: it is passed
+explicitly or read from the environment variable ABM_JOB_AUTHKEY, and the server only listens on localhost unless
+another address is given. Only expose it on a trusted network.
+
+Start workers on a host (from the repository root) with:
+    ABM_JOB_AUTHKEY=<secret> python -m functions.job_queue <server host> <port> <number of workers>
+"""
+import itertools
+import multiprocessing
+import os
+import pickle
+import queue
+import sys
+import threading
+from multiprocessing.connection import Listener, Client
+
+AUTHKEY_VARIABLE = 'ABM_JOB_AUTHKEY'
+
+
+def job_authkey(authkey=None):
+    """
+    :param authkey: optional bytes or string key, by default the environment variable ABM_JOB_AUTHKEY
+    :return: bytes key of the job server
+    """
+    if authkey is None:
+        authkey = os.environ.get(AUTHKEY_VARIABLE)
+    if not authkey:
+        raise ValueError("the job server requires a secret authkey, pass it or set {}".format(AUTHKEY_VARIABLE))
+    return authkey.encode() if isinstance(authkey, str) else authkey
+
+
+class JobServer:
+    """
+    Accepts worker connections and sends every worker one task at a time. Results are collected as they complete.
+    Tasks of workers which die or time out are put back in the queue and handed to another worker.
+    """
+    def __init__(self, address=('127.0.0.1', 6000), authkey=None, task_timeout=None):
+        """
+        Initialize the job server and start accepting workers
+        :param address: tuple of host and port to listen on, e.g. ('0.0.0.0', 6000) for workers on other hosts, port 0
+        picks a free port
+        :param authkey: optional bytes key which workers need to connect, by default ABM_JOB_AUTHKEY
+        :param task_timeout: float seconds after which a worker without result is considered dead, None waits forever
+        """
+        self.listener = Listener(address, authkey=job_authkey(authkey))
+        self.address = self.listener.address
+        self.task_timeout = task_timeout
+        self.tasks = queue.Queue()
+        self.results = {}
+        self.condition = threading.Condition()
+        self.job_ids = itertools.count()
+        self.workers = 0
+        self.requeued = 0
+        self.closed = False
+        threading.Thread(target=self.accept_workers, daemon=True).start()
+
+    def accept_workers(self):
+        """Accept worker connections and serve each of them in its own thread"""
+        while not self.closed:
+            try:
+                connection = self.listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                continue
+            with self.condition:
+                self.workers += 1
+            threading.Thread(target=self.serve_worker, args=(connection,), daemon=True).start()
+
+    def serve_worker(self, connection):
+        """
+        Send tasks to a single worker until the server closes or the worker dies
+        :param connection: object multiprocessing Connection to the worker
+        """
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                connection.close()
+                return
+            with self.condition:
+                # the job failed and was abandoned, its remaining tasks are not run
+                abandoned = task[0] not in self.results
+            if abandoned:
+                continue
+            try:
+                connection.send(task)
+                if not connection.poll(self.task_timeout):
+                    raise EOFError("worker timed out")
+                status, value = connection.recv()
+            except (EOFError, OSError):
+                # the worker died, give the task to another worker
+                with self.condition:
+                    self.workers -= 1
+                    self.requeued += 1
+                self.tasks.put(task)
+                connection.close()
+                return
+            with self.condition:
+                # results of tasks which were in flight when their job failed are dropped
+                job_results = self.results.get(task[0])
+                if job_results is not None:
+                    job_results[task[1]] = (status, value)
+                self.condition.notify_all()
+
+    def imap_unordered(self, function, iterable):
+        """
+        Execute function for every argument on the workers
+        :param function: picklable function of a single argument
+        :param iterable: arguments
+        :return: generator of (index, result) tuples in order of completion
+        """
+        arguments = list(iterable)
+        job_id = next(self.job_ids)
+        with self.condition:
+            self.results[job_id] = {}
+        for index, argument in enumerate(arguments):
+            self.tasks.put((job_id, index, function, argument))
+
+        completed = set()
+        try:
+            while len(completed) < len(arguments):
+                with self.condition:
+                    self.condition.wait_for(lambda: len(self.results[job_id]) > len(completed))
+                    new = {index: result for index, result in self.results[job_id].items() if index not in completed}
+                for index, (status, value) in new.items():
+                    completed.add(index)
+                    if status == 'error':
+                        raise RuntimeError("task {} failed on worker: {}".format(index, value))
+                    yield index, value
+        finally:
+            with self.condition:
+                del self.results[job_id]
+
+    def map(self, function, iterable):
+        """
+        Execute function for every argument on the workers, drop-in replacement for Pool.map
+        :param function: picklable function of a single argument
+        :param iterable: arguments
+        :return: list of results in the order of the arguments
+        """
+        results = dict(self.imap_unordered(function, iterable))
+        return [results[index] for index in range(len(results))]
+
+    def close(self):
+        """Stop all workers and stop accepting new ones"""
+        self.closed = True
+        with self.condition:
+            workers = self.workers
+        for _ in range(workers):
+            self.tasks.put(None)
+        self.listener.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def run_worker(address, authkey=None):
+    """
+    Connect to a job server and execute its tasks until the server closes
+    :param address: tuple of host and port of the job server
+    :param authkey: optional bytes key of the job server, by default ABM_JOB_AUTHKEY
+    :return: None
+    """
+    connection = Client(tuple(address), authkey=job_authkey(authkey))
+    while True:
+        try:
+            task = connection.recv_bytes()
+        except EOFError:
+            return
+        # a task which cannot be unpickled here (e.g. a function defined in __main__ of the server) is an error
+        # of the task, not of the worker
+        try:
+            job_id, index, function, argument = pickle.loads(task)
+            result = ('ok', function(argument))
+        except Exception as error:
+            result = ('error', repr(error))
+        connection.send(result)
+
+
+def start_local_workers(address, n_workers, authkey=None):
+    """
+    Start worker processes on this host, e.g. as a local stand-in for a multi-host cluster
+    :param address: tuple of host and port of the job server
+    :param n_workers: integer amount of worker processes
+    :param authkey: optional bytes key of the job server, by default ABM_JOB_AUTHKEY
+    :return: list of multiprocessing Process objects
+    """
+    authkey = job_authkey(authkey)
+    workers = [multiprocessing.Process(target=run_worker, args=(address, authkey), daemon=True)
+               for _ in range(n_workers)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+if __name__ == '__main__':
+    host, port, n_workers = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    for worker in start_local_workers((host, port), n_workers):
+        worker.join()
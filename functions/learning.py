@@ -0,0 +1,43 @@
+import numpy as np
+from functions.strategy_kernels import MarketSignals, strategy_expectations
+from functions.portfolio_optimization import mean_variance_stock_weights
+
+
+def strategy_learning(population, wealth, price, fundamental, historical_stock_returns, parameters):
+    """
+    Strategy learning step of all traders at once. Every trader holds a hypothetical portfolio which follows a
+    candidate strategy: its current strategy weights mutated with parameters['mutation_intensity']. If the
+    hypothetical portfolio has become worth more than the actual portfolio since the previous step, the trader moves
+    its weights towards the candidate by its learning ability. Afterwards a new candidate is drawn and the
+    hypothetical portfolio is set to the portfolio the candidate would choose with the current wealth.
+    :param population: object Population
+    :param wealth: np.Array of current wealth per trader
+    :param price: float current price
+    :param fundamental: float current fundamental value
+    :param historical_stock_returns: list of historical stock returns
+    :param parameters: dictionary of parameters
+    :return: None
+    """
+    # evaluate the candidate strategies
+    population.hypothetical_wealth = population.hypothetical_money + population.hypothetical_stocks * price
+    improved = population.hypothetical_wealth > wealth
+    weights = population.strategy_weights()
+    learned = weights + population.learning_ability[:, None] * (population.candidate_weights - weights)
+    weights = np.where(improved[:, None], learned, weights)
+    population.set_strategy_weights(weights)
+    population.record()
+
+    # mutate the weights into new candidate strategies which sum to one
+    candidates = np.maximum(weights + parameters['mutation_intensity'] * np.random.randn(*weights.shape), 0.)
+    totals = candidates.sum(axis=1)
+    candidates = np.where(totals[:, None] > 0, candidates / np.where(totals > 0, totals, 1.)[:, None], weights)
+    population.candidate_weights = candidates
+
+    # invest the current wealth as the candidate strategies would
+    signals = MarketSignals(price, fundamental, historical_stock_returns, parameters["std_fundamental"])
+    expected_returns = strategy_expectations(population, np.arange(population.size), signals, parameters, candidates)
+    variances = signals.horizon_statistics(population.horizon)[1]
+    stock_weights = mean_variance_stock_weights(expected_returns, variances, population.risk_aversion)
+
+    population.hypothetical_stocks = stock_weights * wealth / price
+    population.hypothetical_money = wealth - population.hypothetical_stocks * price
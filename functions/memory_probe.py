@@ -0,0 +1,146 @@
+"""Opt-in memory instrumentation of a simulation, sampled every few ticks and per simulation phase"""
+import json
+import sys
+import tracemalloc
+
+# allocations of the tracing machinery itself are not reported
+TRACE_FILTERS = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+                 tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>')]
+
+
+class MemoryProbe:
+    """
+    Records a time series of the amount of resting orders, the lengths of the history lists of the traders and the
+    order book, the traced memory and its top allocation sites. Samples are taken every interval ticks and at the
+    phases of a run (e.g. after initialisation, simulation and projection).
+    """
+    def __init__(self, interval=10, top_sites=10, trace=True):
+        """
+        Initialize the memory probe
+        :param interval: integer amount of ticks between samples
+        :param top_sites: integer amount of allocation sites per sample
+        :param trace: boolean whether allocations are traced with tracemalloc, which slows down the simulation
+        """
+        self.interval = interval
+        self.top_sites = top_sites
+        self.trace = trace
+        self.samples = []
+        self.started_tracing = False
+        self.previous_snapshot = None
+
+    def start(self):
+        """Start tracing allocations, unless they are already traced (e.g. by a benchmark)"""
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    def stop(self):
+        """Stop tracing allocations if this probe started it"""
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+        self.previous_snapshot = None
+
+    def sample_tick(self, tick, traders, orderbook, market_maker):
+        """
+        Take a sample if tick is a multiple of the interval
+        :param tick: integer tick of the simulation, starting at 0
+        :return: None
+        """
+        if tick % self.interval == 0:
+            self.sample('tick', traders, orderbook, market_maker, tick)
+
+    def sample(self, phase, traders, orderbook, market_maker, tick=None):
+        """
+        Record the memory use of the simulated objects
+        :param phase: string name of the phase of the run, e.g. 'init' or 'tick'
+        :param traders: list of Trader objects
+        :param orderbook: object Order book
+        :param market_maker: object MarketMaker
+        :param tick: integer tick of the simulation or None
+        :return: dictionary sample
+        """
+        record = {'phase': phase, 'tick': tick,
+                  'resting_orders': {'bids': len(orderbook.bids), 'asks': len(orderbook.asks)},
+                  'orderbook_history_lengths': list_lengths([orderbook]),
+                  'trader_history_lengths': list_lengths([trader.var for trader in traders]),
+                  'market_maker_history_lengths': list_lengths([market_maker.var]),
+                  'max_rss_kilobytes': max_rss_kilobytes()}
+
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces(TRACE_FILTERS)
+            record.update({'traced_bytes': current, 'traced_peak_bytes': peak,
+                           'top_sites': site_statistics(snapshot.statistics('lineno')[:self.top_sites])})
+            # allocation growth since the previous sample shows which sites grow in this phase
+            if self.previous_snapshot is not None:
+                record['growth_sites'] = site_statistics(
+                    snapshot.compare_to(self.previous_snapshot, 'lineno')[:self.top_sites])
+            self.previous_snapshot = snapshot
+
+        self.samples.append(record)
+        return record
+
+    def report(self):
+        """
+        :return: dictionary with the settings of the probe and its samples
+        """
+        return {'interval': self.interval, 'top_sites': self.top_sites, 'trace': self.trace, 'samples': self.samples}
+
+    def write(self, path):
+        """
+        Write the report as JSON
+        :param path: string file name
+        :return: None
+        """
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=1)
+
+    def __repr__(self):
+        """
+        :return: String representation of the memory probe
+        """
+        return 'MemoryProbe_{}'.format(self.interval)
+
+
+def max_rss_kilobytes():
+    """
+    :return: integer peak resident set size of the process in kilobytes or None where the resource module does not
+    exist (Windows)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports ru_maxrss in bytes, Linux in kilobytes
+    return max_rss // 1024 if sys.platform == 'darwin' else max_rss
+
+
+def list_lengths(objects):
+    """
+    :param objects: list of objects of the same class
+    :return: dictionary of the summed length of every list attribute of the objects
+    """
+    lengths = {}
+    for obj in objects:
+        for name, value in vars(obj).items():
+            if isinstance(value, list):
+                lengths[name] = lengths.get(name, 0) + len(value)
+    return lengths
+
+
+def site_statistics(statistics):
+    """
+    :param statistics: list of tracemalloc Statistic or StatisticDiff objects
+    :return: list of dictionaries with the file and line, size and count of every allocation site
+    """
+    sites = []
+    for statistic in statistics:
+        frame = statistic.traceback[0]
+        site = {'site': '{}:{}'.format(frame.filename, frame.lineno), 'bytes': statistic.size,
+                'count': statistic.count}
+        if hasattr(statistic, 'size_diff'):
+            site.update({'bytes_diff': statistic.size_diff, 'count_diff': statistic.count_diff})
+        sites.append(site)
+    return sites
@@ -0,0 +1,103 @@
+"""
+Multi-fidelity screening of calibration candidates.
+
+Every candidate parameter vector is first evaluated on a reduced configuration of the model (fewer traders, fewer
+seeds, fewer ticks), which costs a fraction of a full evaluation. The pairs of low and high fidelity losses of the
+candidates which were evaluated at both fidelities are used to fit a linear relation between them. A candidate is
+only promoted to full fidelity while the relation has not been learned yet, when the low fidelity loss does not
+predict the high fidelity loss (low correlation), or when its predicted loss minus a margin of residual standard
+deviations could beat the best full fidelity loss so far. Other candidates get their predicted loss.
+"""
+import numpy as np
+
+
+def reduced_parameters(parameters, fidelity):
+    """
+    Model parameters of a fidelity
+    :param parameters: dictionary of full fidelity parameters
+    :param fidelity: dictionary of parameters which are overridden, e.g. n_traders and ticks, and the amount of seeds
+    :return: dictionary of parameters
+    """
+    return dict(parameters, **{key: value for key, value in fidelity.items() if key != 'seeds'})
+
+
+class MultiFidelityObjective:
+    """
+    Objective function which screens candidates with a low fidelity loss and only evaluates promising candidates
+    with the high fidelity loss
+    """
+    def __init__(self, low_fidelity, high_fidelity, min_pairs=5, margin=1., min_correlation=0.5):
+        """
+        Initialize the multi-fidelity objective
+        :param low_fidelity: function of the parameter vector which returns the low fidelity loss
+        :param high_fidelity: function of the parameter vector which returns the high fidelity loss
+        :param min_pairs: integer amount of candidates evaluated at both fidelities before candidates are screened
+        :param margin: float amount of residual standard deviations by which a candidate may be predicted to be worse
+        than the best high fidelity loss and still be promoted
+        :param min_correlation: float correlation of the losses below which every candidate is promoted
+        """
+        self.low_fidelity = low_fidelity
+        self.high_fidelity = high_fidelity
+        self.min_pairs = min_pairs
+        self.margin = margin
+        self.min_correlation = min_correlation
+        self.pairs = []
+        self.history = []
+        self.best_loss = np.inf
+        self.best_parameters = None
+
+    def fit(self):
+        """
+        Fit the high fidelity loss as a linear function of the low fidelity loss on the promoted candidates
+        :return: float intercept, float slope, float residual standard deviation, float correlation or None if there
+        are fewer than min_pairs pairs with finite losses
+        """
+        pairs = np.array([pair for pair in self.pairs if np.all(np.isfinite(pair))]).reshape(-1, 2)
+        if len(pairs) < max(self.min_pairs, 3) or np.ptp(pairs[:, 0]) == 0 or np.ptp(pairs[:, 1]) == 0:
+            return None
+        slope, intercept = np.polyfit(pairs[:, 0], pairs[:, 1], 1)
+        residuals = pairs[:, 1] - (intercept + slope * pairs[:, 0])
+        correlation = np.corrcoef(pairs[:, 0], pairs[:, 1])[0, 1]
+        return intercept, slope, np.std(residuals, ddof=2), correlation
+
+    def __call__(self, parameters):
+        """
+        :param parameters: list of parameters
+        :return: float high fidelity loss of promoted candidates, predicted high fidelity loss of other candidates
+        """
+        low_loss = self.low_fidelity(parameters)
+        model = self.fit()
+        predicted = None
+        promote = True
+        if model is not None and model[3] >= self.min_correlation:
+            intercept, slope, residual_std, correlation = model
+            # a degenerate low fidelity run is not worth a full evaluation once the losses are related
+            predicted = intercept + slope * low_loss if np.isfinite(low_loss) else np.inf
+            promote = predicted - self.margin * residual_std <= self.best_loss
+
+        if promote:
+            loss = self.high_fidelity(parameters)
+            self.pairs.append((low_loss, loss))
+            if loss < self.best_loss:
+                self.best_loss, self.best_parameters = loss, [float(value) for value in parameters]
+        else:
+            loss = predicted
+        self.history.append({'parameters': [float(value) for value in parameters], 'low_fidelity_loss': low_loss,
+                             'predicted_loss': predicted, 'promoted': promote, 'loss': loss})
+        return loss
+
+    @property
+    def promoted(self):
+        """integer amount of candidates evaluated at full fidelity"""
+        return len(self.pairs)
+
+    @property
+    def screened(self):
+        """integer amount of candidates evaluated at low fidelity only"""
+        return len(self.history) - len(self.pairs)
+
+    def __repr__(self):
+        """
+        :return: String representation of the multi-fidelity objective
+        """
+        return 'MultiFidelityObjective_promoted={}_screened={}'.format(self.promoted, self.screened)
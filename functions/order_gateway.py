@@ -0,0 +1,418 @@
+"""
+Order gateway for trading agents outside of the simulation process, e.g. reinforcement learning policies served by
+another process, over asyncio Unix or TCP sockets.
+
+Clients send frames of orders, cancels and queries. The gateway runs its event loop in a background thread and
+queues the received frames. ABM_model applies them at fixed points of every turn: after the simulated traders have
+submitted their orders and before matching, so external orders are matched in the same turn like those of any
+trader. Every frame is answered with a frame of acknowledgements. After matching the gateway pushes the fills and the
+top of the book to every client, and after the end of a tick it reports the orders which expired.
+
+A frame is a little-endian uint32 amount of records followed by the records: MESSAGE records from clients and
+REPORT records to clients. The gateway does not check the money or stocks of external agents, clients track their
+own position from the fills. In lockstep mode the model waits every turn until each connected client has sent a
+frame, so a simulation does not run ahead of its external agents. A client which does not send a frame within the
+timeout of a turn is disconnected, as is a client which announces a frame of more than MAX_FRAME_RECORDS records.
+Orders priced outside of a band around the mid price are rejected, so a client cannot place far-off orders.
+"""
+import asyncio
+import itertools
+import math
+import os
+import struct
+import threading
+import types
+
+# message types sent by clients
+ORDER, CANCEL, QUERY = range(1, 4)
+# report types sent to clients
+ACK, REJECT, FILL, CANCELLED, EXPIRED, BOOK = range(1, 7)
+
+FRAME = struct.Struct('<I')
+# type, client order id (request id of a query), price, signed volume: positive for bids and negative for asks
+MESSAGE = struct.Struct('<B7xQdq')
+# type, tick, turn, client order id (request id of a query, 0 for pushes), price (best bid of BOOK), best ask of
+# BOOK (nan otherwise), signed volume (resting volume of ACK, CANCELLED and EXPIRED)
+REPORT = struct.Struct('<B3xII4xQddq')
+# largest accepted amount of records per frame, a larger count is treated as a corrupt or hostile stream
+MAX_FRAME_RECORDS = 65536
+
+
+def pack_frame(records, record_struct):
+    """
+    :param records: list of tuples of record fields
+    :param record_struct: struct.Struct of the records, MESSAGE or REPORT
+    :return: bytes of the frame
+    """
+    return FRAME.pack(len(records)) + b''.join(record_struct.pack(*record) for record in records)
+
+
+async def read_frame(reader, record_struct, max_records=MAX_FRAME_RECORDS):
+    """
+    Read a frame from a stream
+    :param reader: object asyncio.StreamReader
+    :param record_struct: struct.Struct of the records, MESSAGE or REPORT
+    :param max_records: integer largest accepted amount of records
+    :return: list of tuples of record fields
+    """
+    count, = FRAME.unpack(await reader.readexactly(FRAME.size))
+    if count > max_records:
+        raise ValueError("frame of {} records exceeds the maximum of {}".format(count, max_records))
+    return list(record_struct.iter_unpack(await reader.readexactly(count * record_struct.size)))
+
+
+class GatewayClient:
+    """
+    Connection of an external agent. Its orders are owned by GatewayOwner objects, which carry the name of the
+    client: -2, -3, ... so that they do not collide with the traders and the market maker in the event log.
+    """
+    def __init__(self, gateway, name, writer):
+        """
+        Initialize the client
+        :param gateway: object OrderGateway
+        :param name: integer negative name of the external agent
+        :param writer: object asyncio.StreamWriter of the connection
+        """
+        self.gateway = gateway
+        self.name = name
+        self.writer = writer
+        self.open_orders = {}
+        self.reports = []
+        self.pending = 0
+        self.connected = True
+
+    def __repr__(self):
+        """
+        :return: String representation of the client
+        """
+        return 'GatewayClient_{}'.format(self.name)
+
+
+class GatewayOwner:
+    """
+    Owner of a single order of an external agent. The order book and the model treat it like a trader: it is
+    notified of the fills of its order by buy and sell, which it reports to its client.
+    """
+    def __init__(self, client, client_order_id, volume):
+        """
+        Initialize the owner
+        :param client: object GatewayClient
+        :param client_order_id: integer id of the order chosen by the client
+        :param volume: integer unsigned volume of the order
+        """
+        self.client = client
+        self.client_order_id = client_order_id
+        self.name = client.name
+        self.var = types.SimpleNamespace(active_orders=[])
+        self.remaining = volume
+        self.order = None
+
+    def signed_remaining(self):
+        """
+        :return: integer resting volume, negative for asks
+        """
+        return self.remaining if self.order.order_type == 'b' else -self.remaining
+
+    def buy(self, amount, price, *args, **kwargs):
+        """Report a fill of `amount` stocks bought for a total of `price`"""
+        self.fill(amount)
+
+    def sell(self, amount, price, *args, **kwargs):
+        """Report a fill of `amount` stocks sold for a total of `price`"""
+        self.fill(-amount)
+
+    def fill(self, volume):
+        """
+        Report a fill at the last transaction price of the order book
+        :param volume: integer signed filled volume, negative for asks
+        :return: None
+        """
+        gateway = self.client.gateway
+        self.remaining -= abs(volume)
+        self.client.reports.append((FILL, gateway.tick, gateway.turn, self.client_order_id,
+                                    gateway.orderbook.transaction_prices[-1], math.nan, volume))
+        if self.remaining == 0:
+            self.client.open_orders.pop(self.client_order_id, None)
+
+    def __repr__(self):
+        """
+        :return: String representation of the owner
+        """
+        return 'GatewayOwner_{}_{}'.format(self.name, self.client_order_id)
+
+
+class OrderGateway:
+    """
+    Asyncio server which connects external agents to the order book of a running ABM_model
+    """
+    def __init__(self, path=None, address=('127.0.0.1', 0), lockstep=False, timeout=5., price_band=0.5):
+        """
+        Initialize the order gateway, start it with start()
+        :param path: optional string path of a Unix socket, by default the gateway listens on TCP
+        :param address: tuple of host and port of the TCP socket, port 0 picks a free port
+        :param lockstep: boolean whether every turn waits for a frame of each connected client
+        :param timeout: float seconds a lockstep turn waits for clients at most, clients which have not sent a frame
+        by then are disconnected. None waits forever
+        :param price_band: float largest accepted relative deviation of an order price from the mid price, None
+        accepts any positive price
+        """
+        self.path = path
+        self.address = address
+        self.lockstep = lockstep
+        self.timeout = timeout
+        self.price_band = price_band
+        self.clients = []
+        self.inbox = []
+        self.condition = threading.Condition()
+        self.names = itertools.count(2)
+        self.loop = None
+        self.thread = None
+        self.server = None
+
+        # state of the model at the current apply point, used by the owners to report fills
+        self.orderbook = None
+        self.tick = 0
+        self.turn = 0
+
+        self.frames = 0
+        self.messages = 0
+        self.dropped = 0
+
+    def start(self):
+        """
+        Start the event loop in a background thread and listen for clients
+        :return: object OrderGateway
+        """
+        self.loop = asyncio.new_event_loop()
+        listening = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(self.listen())
+            listening.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        listening.wait()
+        return self
+
+    async def listen(self):
+        """Open the server socket"""
+        if self.path is not None:
+            self.server = await asyncio.start_unix_server(self.handle_client, path=self.path)
+        else:
+            self.server = await asyncio.start_server(self.handle_client, *self.address)
+            self.address = self.server.sockets[0].getsockname()[:2]
+
+    async def handle_client(self, reader, writer):
+        """
+        Queue the frames of a client until it disconnects
+        :param reader: object asyncio.StreamReader
+        :param writer: object asyncio.StreamWriter
+        """
+        with self.condition:
+            client = GatewayClient(self, -next(self.names), writer)
+            self.clients.append(client)
+            self.condition.notify_all()
+        try:
+            while True:
+                messages = await read_frame(reader, MESSAGE)
+                with self.condition:
+                    if not client.connected:
+                        break
+                    self.inbox.append((client, messages))
+                    client.pending += 1
+                    self.condition.notify_all()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            with self.condition:
+                self.disconnect(client)
+            writer.close()
+
+    def disconnect(self, client):
+        """
+        Mark a client as disconnected, its open orders are cancelled at the next apply point. The caller holds the
+        condition.
+        :param client: object GatewayClient
+        :return: None
+        """
+        if client.connected:
+            client.connected = False
+            self.inbox.append((client, None))
+            self.condition.notify_all()
+
+    def wait_for_clients(self, n_clients, timeout=None):
+        """
+        Block until an amount of clients is connected
+        :param n_clients: integer amount of clients
+        :param timeout: float seconds to wait at most, None waits forever
+        :return: boolean whether the clients connected
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: sum(client.connected for client in self.clients) >= n_clients,
+                                           timeout)
+
+    def connected_clients(self):
+        """
+        :return: list of connected GatewayClient objects
+        """
+        with self.condition:
+            return [client for client in self.clients if client.connected]
+
+    def apply(self, orderbook):
+        """
+        Apply the queued frames of all clients to the order book and acknowledge them, called by the model every
+        turn after the simulated traders submitted their orders
+        :param orderbook: object Order book
+        :return: None
+        """
+        self.orderbook, self.tick, self.turn = orderbook, orderbook.current_tick, orderbook.current_turn
+        with self.condition:
+            if self.lockstep and not self.condition.wait_for(
+                    lambda: all(client.pending for client in self.clients if client.connected), self.timeout):
+                # a stalled client would hold up every turn of the simulation
+                for client in self.clients:
+                    if client.connected and not client.pending:
+                        self.disconnect(client)
+                        self.dropped += 1
+                        self.loop.call_soon_threadsafe(client.writer.close)
+            inbox, self.inbox = self.inbox, []
+            for client, messages in inbox:
+                if messages is not None:
+                    client.pending -= 1
+
+        for client, messages in inbox:
+            if messages is None:
+                for owner in client.open_orders.values():
+                    orderbook.cancel_order(owner.order)
+                client.open_orders = {}
+                continue
+            self.frames += 1
+            self.messages += len(messages)
+            for kind, order_id, price, volume in messages:
+                client.reports.append(self.handle_message(client, kind, order_id, price, volume))
+            self.flush(client)
+
+    def handle_message(self, client, kind, order_id, price, volume):
+        """
+        Apply a single message of a client
+        :param client: object GatewayClient
+        :param kind: integer message type ORDER, CANCEL or QUERY
+        :param order_id: integer client order id or request id of a query
+        :param price: float price of an order
+        :param volume: integer signed volume of an order
+        :return: tuple of REPORT fields answering the message
+        """
+        orderbook = self.orderbook
+        if kind == ORDER:
+            if volume == 0 or not self.valid_price(price) or order_id in client.open_orders:
+                return REJECT, self.tick, self.turn, order_id, price, math.nan, volume
+            owner = GatewayOwner(client, order_id, abs(volume))
+            if volume > 0:
+                owner.order = orderbook.add_bid(price, volume, owner)
+            else:
+                owner.order = orderbook.add_ask(price, -volume, owner)
+            client.open_orders[order_id] = owner
+            return ACK, self.tick, self.turn, order_id, owner.order.price, math.nan, volume
+        if kind == CANCEL:
+            owner = client.open_orders.pop(order_id, None)
+            if owner is None:
+                return REJECT, self.tick, self.turn, order_id, price, math.nan, volume
+            orderbook.cancel_order(owner.order)
+            return CANCELLED, self.tick, self.turn, order_id, owner.order.price, math.nan, owner.signed_remaining()
+        if kind == QUERY:
+            return self.book_report(order_id)
+        return REJECT, self.tick, self.turn, order_id, price, math.nan, volume
+
+    def valid_price(self, price):
+        """
+        :param price: float price of an order
+        :return: boolean whether the price is positive, finite and within the band around the mid price
+        """
+        if not math.isfinite(price) or price <= 0:
+            return False
+        if self.price_band is None:
+            return True
+        mid_price = (self.orderbook.highest_bid_price + self.orderbook.lowest_ask_price) / 2
+        return abs(price / mid_price - 1) <= self.price_band
+
+    def book_report(self, request_id=0):
+        """
+        :param request_id: integer id of the query, 0 for pushes
+        :return: tuple of REPORT fields of the top of the book
+        """
+        return (BOOK, self.tick, self.turn, request_id, self.orderbook.highest_bid_price,
+                self.orderbook.lowest_ask_price, 0)
+
+    def publish(self, orderbook, traded_traders):
+        """
+        Push the fills of the turn and the top of the book to every client, called by the model after matching
+        :param orderbook: object Order book
+        :param traded_traders: set of traders who traded this tick, external agents are removed from it because they
+        are not part of the wealth distribution of the traders
+        :return: None
+        """
+        traded_traders.difference_update([owner for owner in traded_traders if isinstance(owner, GatewayOwner)])
+        self.orderbook = orderbook
+        book = self.book_report()
+        for client in self.connected_clients():
+            client.reports.append(book)
+            self.flush(client)
+
+    def end_tick(self, orderbook):
+        """
+        Report the orders which expired at the end of a tick, called by the model after cleanse_book
+        :param orderbook: object Order book
+        :return: None
+        """
+        expired_tick = orderbook.current_tick - 1
+        for client in self.connected_clients():
+            for order_id, owner in list(client.open_orders.items()):
+                if owner.order.tick + orderbook.order_expiration == expired_tick:
+                    del client.open_orders[order_id]
+                    client.reports.append((EXPIRED, expired_tick, self.turn, order_id, owner.order.price, math.nan,
+                                           owner.signed_remaining()))
+            self.flush(client)
+
+    def flush(self, client):
+        """
+        Send the collected reports of a client as one frame from the event loop thread
+        :param client: object GatewayClient
+        :return: None
+        """
+        if client.reports and client.connected:
+            self.loop.call_soon_threadsafe(client.writer.write, pack_frame(client.reports, REPORT))
+        client.reports = []
+
+    async def shutdown(self):
+        """Stop accepting clients and close all connections"""
+        self.server.close()
+        for client in self.clients:
+            client.writer.close()
+        await self.server.wait_closed()
+
+    def close(self):
+        """Close the connections, stop the event loop and remove the Unix socket"""
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        """
+        :return: String representation of the order gateway
+        """
+        return 'OrderGateway_{}_clients={}'.format(self.path or self.address, len(self.connected_clients()))
@@ -0,0 +1,127 @@
+"""Projection of a simulated model onto the outputs a caller needs"""
+import numpy as np
+
+
+def close_prices(traders, orderbook, market_maker):
+    """
+    Close price of every tick, starting with the initial price of the order book
+    :param traders: list of simulated Trader objects
+    :param orderbook: object simulated Order book
+    :param market_maker: object simulated MarketMaker
+    :return: np.Array of close prices
+    """
+    return np.array(orderbook.tick_close_price)
+
+
+def returns(traders, orderbook, market_maker):
+    """
+    Simple returns of the close prices
+    :param traders: list of simulated Trader objects
+    :param orderbook: object simulated Order book
+    :param market_maker: object simulated MarketMaker
+    :return: np.Array of returns
+    """
+    prices = np.array(orderbook.tick_close_price)
+    return prices[1:] / prices[:-1] - 1
+
+
+def volumes(traders, orderbook, market_maker):
+    """
+    Total traded volume of every tick
+    :param traders: list of simulated Trader objects
+    :param orderbook: object simulated Order book
+    :param market_maker: object simulated MarketMaker
+    :return: np.Array of volumes
+    """
+    return np.array([sum(volumes) for volumes in orderbook.transaction_volumes_history])
+
+
+def fundamentals(traders, orderbook, market_maker):
+    """
+    Fundamental value of every tick
+    :param traders: list of simulated Trader objects
+    :param orderbook: object simulated Order book
+    :param market_maker: object simulated MarketMaker
+    :return: np.Array of fundamental values
+    """
+    return np.array(orderbook.fundamental)
+
+
+def final_wealth(traders, orderbook, market_maker):
+    """
+    Wealth of every trader valued at the last close price
+    :param traders: list of simulated Trader objects
+    :param orderbook: object simulated Order book
+    :param market_maker: object simulated MarketMaker
+    :return: np.Array of wealth per trader
+    """
+    return np.array([t.var.money[-1] + t.var.stocks[-1] * orderbook.tick_close_price[-1] for t in traders])
+
+
+def gini(traders, orderbook, market_maker):
+    """
+    Recorded Gini coefficients of the wealth of the traders
+    :param traders: list of simulated Trader objects
+    :param orderbook: object simulated Order book
+    :param market_maker: object simulated MarketMaker
+    :return: np.Array of Gini coefficients
+    """
+    return np.array(orderbook.wealth_distribution.gini_history)
+
+
+def market_maker_profit(traders, orderbook, market_maker):
+    """
+    Cumulative profit (wealth gain since the start) of the market maker per period
+    :param traders: list of simulated Trader objects
+    :param orderbook: object simulated Order book
+    :param market_maker: object simulated MarketMaker
+    :return: np.Array of profits
+    """
+    return np.array(market_maker.profit)
+
+
+def moments(traders, orderbook, market_maker):
+    """
+    Calibration moments of the close prices, see functions.stylizedfacts.calibration_moments
+    :param traders: list of simulated Trader objects
+    :param orderbook: object simulated Order book
+    :param market_maker: object simulated MarketMaker
+    :return: np.Array of moments
+    """
+    from functions.stylizedfacts import calibration_moments
+    return calibration_moments(orderbook.tick_close_price)
+
+
+OUTPUTS = {'close_prices': close_prices, 'returns': returns, 'volumes': volumes, 'fundamentals': fundamentals,
+           'final_wealth': final_wealth, 'gini': gini, 'market_maker_profit': market_maker_profit,
+           'moments': moments}
+
+
+def project_run(traders, orderbook, market_maker, outputs):
+    """
+    Extract the requested outputs of a simulated model as a compact, picklable record
+    :param traders: list of simulated Trader objects
+    :param orderbook: object simulated Order book
+    :param market_maker: object simulated MarketMaker
+    :param outputs: list of output names, keys of OUTPUTS
+    :return: dictionary of output names and np.Arrays
+    """
+    unknown = [name for name in outputs if name not in OUTPUTS]
+    if unknown:
+        raise ValueError("unknown outputs {}".format(unknown))
+    return {name: OUTPUTS[name](traders, orderbook, market_maker) for name in outputs}
+
+
+def release_run(traders, orderbook, market_maker):
+    """
+    Break the reference cycles between orders and their owners, so that the objects of a simulated model are
+    freed as soon as the caller drops them instead of at the next garbage collection
+    :param traders: list of simulated Trader objects
+    :param orderbook: object simulated Order book
+    :param market_maker: object simulated MarketMaker
+    :return: None
+    """
+    for trader in traders + [market_maker]:
+        trader.var.active_orders = []
+    market_maker.bid, market_maker.ask = None, None
+    orderbook.clear()
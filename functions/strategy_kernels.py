@@ -0,0 +1,123 @@
+"""
+Registry of vectorized strategy kernels. A kernel calculates the expected return of one strategy for a block of
+traders from the market signals and their parameters (e.g. horizons). The expected return of a trader is the sum of
+the kernels of its strategies weighted by its weight_<strategy> variables, so a new agent type is added by
+registering a kernel and giving traders a weight for it (e.g. with parameters['strategy_shares']), without changing
+the model loop.
+"""
+import numpy as np
+from functions.helpers import horizon_return_statistics
+
+# kernel function and name of the trader weight variable per strategy
+STRATEGY_KERNELS = {}
+STRATEGY_WEIGHTS = {}
+
+
+def strategy_kernel(name, weight):
+    """
+    Decorator which registers a function kernel(signals, population, traders, parameters) -> np.Array of expected
+    returns of the traders, an np.Array of names which indexes the arrays of the Population
+    :param name: string name of the strategy
+    :param weight: string name of the trader variable which holds the weight of the strategy
+    :return: decorator
+    """
+    def register(kernel):
+        STRATEGY_KERNELS[name] = kernel
+        STRATEGY_WEIGHTS[name] = weight
+        return kernel
+    return register
+
+
+class MarketSignals:
+    """
+    Market state at which traders form expectations. The mean and variance of the recent returns are calculated
+    once for all horizons up to the longest requested horizon and shared by all kernels.
+    """
+    def __init__(self, price, fundamental, historical_stock_returns, base_historical_variance):
+        """
+        Initialize the market signals
+        :param price: float current (mid) price
+        :param fundamental: float current fundamental value
+        :param historical_stock_returns: list of historical stock returns
+        :param base_historical_variance: float variance used if the returns over a horizon are stationary
+        """
+        self.price = price
+        self.fundamental = fundamental
+        self.historical_stock_returns = historical_stock_returns
+        self.base_historical_variance = base_historical_variance
+        self.means = np.empty(0)
+        self.variances = np.empty(0)
+
+    def horizon_statistics(self, horizons):
+        """
+        :param horizons: np.Array of integer horizons
+        :return: np.Array of mean returns, np.Array of return variances per horizon
+        """
+        if len(horizons) and horizons.max() > len(self.means):
+            self.means, self.variances = horizon_return_statistics(self.historical_stock_returns,
+                                                                   np.arange(1, horizons.max() + 1),
+                                                                   self.base_historical_variance)
+        return self.means[horizons - 1], self.variances[horizons - 1]
+
+    def __repr__(self):
+        """
+        :return: String representation of the market signals
+        """
+        return 'MarketSignals_{}'.format(self.price)
+
+
+@strategy_kernel('fundamentalist', 'weight_fundamentalist')
+def fundamentalist(signals, population, traders, parameters):
+    """Expect the price to close the gap with the fundamental value over the (scaled) horizon"""
+    return np.log(signals.fundamental / signals.price) / (population.horizon[traders] *
+                                                          parameters["fundamentalist_horizon_multiplier"])
+
+
+@strategy_kernel('chartist', 'weight_chartist')
+def chartist(signals, population, traders, parameters):
+    """Expect the average return over the horizon to continue"""
+    return signals.horizon_statistics(population.horizon[traders])[0]
+
+
+@strategy_kernel('noise', 'weight_random')
+def noise(signals, population, traders, parameters):
+    """Random expectation with standard deviation parameters['std_noise']"""
+    return parameters['std_noise'] * np.random.randn(len(traders))
+
+
+@strategy_kernel('mean_reversion', 'weight_mean_reversion')
+def mean_reversion(signals, population, traders, parameters):
+    """Expect the average return over the horizon to reverse"""
+    return -signals.horizon_statistics(population.horizon[traders])[0]
+
+
+@strategy_kernel('momentum', 'weight_momentum')
+def momentum(signals, population, traders, parameters):
+    """Expect the average return over the momentum lookback of the trader to continue, regardless of its horizon"""
+    return signals.horizon_statistics(population.momentum_lookback[traders])[0]
+
+
+def strategy_expectations(population, active, signals, parameters, weights=None):
+    """
+    Expected returns of a block of traders: the weighted sum of the kernels of their strategies. Every kernel of a
+    strategy of the population is evaluated once for the whole block, so a random kernel draws one number per
+    trader whatever the weights and the random stream does not depend on them. Zero weights add nothing.
+    :param population: object Population
+    :param active: np.Array of names of the traders
+    :param signals: object MarketSignals
+    :param parameters: dictionary of parameters
+    :param weights: optional np.Array (traders, strategies) of weights in the order of population.weight_names,
+    by default the current strategy weights of the traders
+    :return: np.Array of expected returns
+    """
+    if weights is None:
+        weights = population.strategy_weights(active)
+    expected_returns = np.zeros(len(active))
+    for strategy, kernel in STRATEGY_KERNELS.items():
+        if STRATEGY_WEIGHTS[strategy] not in population.weight_names:
+            continue
+        column = weights[:, population.weight_names.index(STRATEGY_WEIGHTS[strategy])]
+        users = np.flatnonzero(column)
+        component = kernel(signals, population, active, parameters)
+        expected_returns[users] += column[users] * component[users]
+    return expected_returns
@@ -170,3 +170,23 @@ def between_interval(interval, value):
         return True
     else:
         return False
+
+
+def calibration_moments(prices, lags=25):
+    """
+    Calculate the moments which are used to calibrate the model: average autocorrelation of returns and of
+    absolute returns, kurtosis of returns and the Hurst exponent of prices
+    :param prices: list of (close) prices
+    :param lags: the lags over which the autocorrelations are calculated
+    :return: np.Array of moments
+    """
+    from hurst import compute_Hc
+
+    prices = pd.Series(np.array(prices))
+    returns = prices.pct_change()
+    return np.array([
+        autocorrelation_returns(returns[1:], lags),
+        autocorrelation_returns(returns[1:].abs(), lags),
+        returns[1:].kurtosis(),
+        compute_Hc(prices[1:], kind='price', simplified=True)[0]
+    ])
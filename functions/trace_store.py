@@ -0,0 +1,163 @@
+"""
+Append-only store of the objective evaluations of a calibration, so an interrupted calibration can be resumed.
+
+Every evaluation is written as one JSON line with the parameter vector, the moments and cost of every seed, the
+simulation time and the optimizer state, and flushed to disk before the optimizer continues. The optimizers of the
+calibration are deterministic given the objective values, so a restarted calibration with the same configuration
+follows the same path: evaluations which are found in the store are replayed instead of simulated and the
+calibration continues where it was interrupted.
+"""
+import hashlib
+import json
+import os
+import time
+import numpy as np
+
+
+def file_digest(path):
+    """
+    :param path: string path of a file
+    :return: string SHA-1 digest of the content of the file
+    """
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def configuration_key(configuration):
+    """
+    :param configuration: dictionary of everything which determines the objective besides the parameter vector,
+    e.g. the fixed model parameters, seeds and empirical moments
+    :return: string key of the configuration
+    """
+    return hashlib.sha1(json.dumps(configuration, sort_keys=True).encode()).hexdigest()
+
+
+def read_trace(path):
+    """
+    Read all complete records of a trace file, a line which was cut off by a crash is skipped
+    :param path: string path of the JSON lines file
+    :return: list of dictionaries
+    """
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+class TraceStore:
+    """
+    Append-only JSON lines file of the evaluations and iterations of calibrations. Records of other configurations in
+    the same file are kept but not replayed.
+    """
+    def __init__(self, path, configuration):
+        """
+        Open the store and load the evaluations of the configuration which were completed earlier
+        :param path: string path of the JSON lines file
+        :param configuration: dictionary of everything which determines the objective besides the parameter vector
+        """
+        self.path = path
+        self.configuration = configuration_key(configuration)
+        self.evaluations = {}
+        self.stored_iterations = 0
+        for record in read_trace(path):
+            if record.get('configuration') != self.configuration:
+                continue
+            if record['type'] == 'evaluation':
+                self.evaluations[tuple(record['parameters'])] = record
+            elif record['type'] == 'iteration':
+                self.stored_iterations = max(self.stored_iterations, record['iteration'])
+        self.iterations = 0
+        self.evaluation_count = len(self.evaluations)
+        self.replayed = 0
+        self.truncate_partial_line()
+        self.file = open(path, 'a')
+
+    def truncate_partial_line(self):
+        """Cut off a last line without line end, which a crash during a write leaves behind"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            content = f.read()
+            if content and not content.endswith(b'\n'):
+                f.truncate(content.rfind(b'\n') + 1)
+
+    def append(self, record):
+        """
+        Write a record and force it to disk
+        :param record: dictionary which can be serialised to JSON
+        :return: None
+        """
+        record = dict(record, configuration=self.configuration, time=time.time())
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def lookup(self, parameters):
+        """
+        :param parameters: list of floats, the parameter vector of an evaluation
+        :return: dictionary of the stored evaluation or None if it has not been completed
+        """
+        record = self.evaluations.get(tuple(float(value) for value in parameters))
+        if record is not None:
+            self.replayed += 1
+        return record
+
+    def record_evaluation(self, parameters, seeds, moments, costs, seconds):
+        """
+        Store a completed evaluation of the objective
+        :param parameters: list of floats, the parameter vector
+        :param seeds: list of integer seeds
+        :param moments: list of simulated moments per seed
+        :param costs: list of float costs per seed
+        :param seconds: float time the evaluation took
+        :return: dictionary of the stored evaluation
+        """
+        self.evaluation_count += 1
+        record = {'type': 'evaluation', 'evaluation': self.evaluation_count,
+                  'parameters': [float(value) for value in parameters], 'seeds': list(seeds),
+                  'moments': [[float(moment) for moment in seed_moments] for seed_moments in moments],
+                  'costs': [float(cost) for cost in costs], 'cost': float(np.mean(costs)),
+                  'seconds': seconds}
+        self.append(record)
+        self.evaluations[tuple(record['parameters'])] = record
+        return record
+
+    def record_iteration(self, parameters):
+        """
+        Store the state of the optimizer after an iteration, iterations which were stored before a restart are not
+        stored again when they are replayed
+        :param parameters: list of floats, the best parameter vector of the iteration
+        :return: None
+        """
+        self.iterations += 1
+        if self.iterations > self.stored_iterations:
+            self.append({'type': 'iteration', 'iteration': self.iterations,
+                         'parameters': [float(value) for value in parameters],
+                         'evaluations': self.evaluation_count})
+
+    def best(self):
+        """
+        :return: dictionary of the stored evaluation with the lowest cost or None if there is none
+        """
+        return min(self.evaluations.values(), key=lambda record: record['cost'], default=None)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        """
+        :return: String representation of the trace store
+        """
+        return 'TraceStore_{}_evaluations={}'.format(self.path, len(self.evaluations))
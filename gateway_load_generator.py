@@ -0,0 +1,163 @@
+"""
+Local load generator of the order gateway (functions/order_gateway.py). A simulation runs with a lockstep
+OrderGateway while asyncio clients trade with it: after every top of book push each client sends one frame which
+cancels its resting orders, places new orders around the mid price and queries the book. The round trip latency of a
+frame (sent until its acknowledgements arrive) and the messages per second handled by the gateway are reported. A
+frame is applied at the next apply point of the model, so the latency includes the turn of the simulated traders.
+
+    python gateway_load_generator.py --clients 4 --orders 20 --ticks 200
+    python gateway_load_generator.py --socket /tmp/abm_gateway.sock
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import threading
+import time
+import numpy as np
+from initialize_model import init_objects
+from model import ABM_model
+from benchmark_model import BASE_PARAMETERS
+from functions.order_gateway import (OrderGateway, MESSAGE, REPORT, ORDER, CANCEL, QUERY, ACK, REJECT, FILL,
+                                     CANCELLED, EXPIRED, BOOK, pack_frame, read_frame)
+
+
+async def run_client(gateway, n_orders, seed, spread):
+    """
+    Trade with the gateway until it closes the connection
+    :param gateway: object OrderGateway to connect to
+    :param n_orders: integer amount of new orders per frame
+    :param seed: integer seed of the orders of the client
+    :param spread: float standard deviation of the order prices relative to the mid price
+    :return: dictionary of latencies in seconds and counts of reports
+    """
+    if gateway.path is not None:
+        reader, writer = await asyncio.open_unix_connection(gateway.path)
+    else:
+        reader, writer = await asyncio.open_connection(*gateway.address)
+    rng = random.Random(seed)
+    order_ids = itertools.count(1)
+    resting = {}
+    latencies = []
+    counts = {'messages': 0, 'fills': 0, 'rejects': 0, 'expired': 0}
+    sent_at = {}
+
+    def send(bid, ask):
+        messages = [(CANCEL, order_id, 0., 0) for order_id in resting]
+        if bid is not None:
+            mid_price = (bid + ask) / 2
+            for _ in range(n_orders):
+                side = rng.choice([1, -1])
+                messages.append((ORDER, next(order_ids), mid_price * (1 + rng.gauss(0, spread)),
+                                 side * rng.randint(1, 5)))
+        query_id = next(order_ids)
+        messages.append((QUERY, query_id, 0., 0))
+        counts['messages'] += len(messages)
+        sent_at[query_id] = time.perf_counter()
+        writer.write(pack_frame(messages, MESSAGE))
+
+    send(None, None)
+    try:
+        while True:
+            reports = await read_frame(reader, REPORT)
+            received_at = time.perf_counter()
+            push = None
+            for kind, tick, turn, order_id, price, ask, volume in reports:
+                if kind == ACK:
+                    resting[order_id] = abs(volume)
+                elif kind == FILL:
+                    counts['fills'] += 1
+                    resting[order_id] = resting.get(order_id, 0) - abs(volume)
+                    if resting[order_id] <= 0:
+                        del resting[order_id]
+                elif kind in (CANCELLED, EXPIRED, REJECT):
+                    resting.pop(order_id, None)
+                    counts['rejects'] += kind == REJECT
+                    counts['expired'] += kind == EXPIRED
+                elif kind == BOOK and order_id in sent_at:
+                    # the answer to the query arrives in the frame which acknowledges the whole sent frame
+                    latencies.append(received_at - sent_at.pop(order_id))
+                elif kind == BOOK:
+                    push = price, ask
+            if push is not None:
+                send(*push)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    writer.close()
+    return dict(counts, latencies=latencies)
+
+
+def simulate(gateway, parameters, seed, n_clients, result):
+    """
+    Run the model with the gateway once all clients are connected and close the gateway afterwards
+    :param gateway: object OrderGateway
+    :param parameters: dictionary of parameters
+    :param seed: integer seed
+    :param n_clients: integer amount of clients
+    :param result: dictionary in which the simulated order book and simulation time are stored
+    :return: None
+    """
+    try:
+        gateway.wait_for_clients(n_clients)
+        traders, orderbook, market_maker = init_objects(parameters, seed)
+        start_time = time.perf_counter()
+        ABM_model(traders, orderbook, market_maker, parameters, seed, gateway=gateway)
+        result['seconds'] = time.perf_counter() - start_time
+        result['orderbook'] = orderbook
+    finally:
+        gateway.close()
+
+
+async def run_clients(gateway, n_clients, n_orders, seed, spread):
+    return await asyncio.gather(*[run_client(gateway, n_orders, seed + client, spread) for client in range(n_clients)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=4, help='amount of external agents')
+    parser.add_argument('--orders', type=int, default=10, help='new orders per client per turn')
+    parser.add_argument('--spread', type=float, default=0.002, help='relative standard deviation of order prices')
+    parser.add_argument('--ticks', type=int, default=100, help='ticks of the simulation')
+    parser.add_argument('--n_traders', type=int, default=BASE_PARAMETERS['n_traders'], help='simulated traders')
+    parser.add_argument('--trades_per_tick', type=int, default=2, help='turns per tick')
+    parser.add_argument('--socket', default=None, help='path of a Unix socket, by default TCP on localhost')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='optional JSON file the results are written to')
+    args = parser.parse_args()
+
+    np.seterr(all='ignore')
+    parameters = dict(BASE_PARAMETERS, ticks=args.ticks, n_traders=args.n_traders,
+                      trades_per_tick=args.trades_per_tick)
+    gateway = OrderGateway(path=args.socket, lockstep=True).start()
+    result = {}
+    model_thread = threading.Thread(target=simulate, args=(gateway, parameters, args.seed, args.clients, result))
+    model_thread.start()
+    start_time = time.perf_counter()
+    clients = asyncio.run(run_clients(gateway, args.clients, args.orders, args.seed, args.spread))
+    elapsed = time.perf_counter() - start_time
+    model_thread.join()
+
+    latencies = np.array([latency for client in clients for latency in client['latencies']]) * 1e6
+    report = {'transport': 'unix' if args.socket else 'tcp', 'clients': args.clients, 'orders': args.orders,
+              'ticks': args.ticks, 'turns': args.ticks * args.trades_per_tick, 'seconds': elapsed,
+              'simulation_seconds': result.get('seconds'), 'frames': gateway.frames, 'messages': gateway.messages,
+              'messages_per_second': gateway.messages / elapsed, 'frames_per_second': gateway.frames / elapsed,
+              'dropped_clients': gateway.dropped,
+              'fills': sum(client['fills'] for client in clients),
+              'rejects': sum(client['rejects'] for client in clients),
+              'expired': sum(client['expired'] for client in clients)}
+    if len(latencies):
+        report.update({'latency_mean_microseconds': float(latencies.mean()),
+                       'latency_p50_microseconds': float(np.percentile(latencies, 50)),
+                       'latency_p99_microseconds': float(np.percentile(latencies, 99)),
+                       'latency_max_microseconds': float(latencies.max())})
+    for key, value in report.items():
+        print('{:28s} {}'.format(key, round(value, 2) if isinstance(value, float) else value))
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,12 @@
 from objects.trader import *
 from objects.orderbook import *
+from objects.market_maker import MarketMaker
+from objects.price_ladder import PriceLadderOrderBook
+from objects.ledger import Clock
 import random
 import numpy as np
-from functions.helpers import calculate_covariance_matrix, div0
+from functions.helpers import covariance_array, div0
+from functions.strategy_kernels import STRATEGY_WEIGHTS
 
 
 def init_objects(parameters, seed):
@@ -18,25 +22,44 @@ def init_objects(parameters, seed):
     traders = []
     n_traders = parameters["n_traders"]
 
-    weight_f = (1 - parameters['strat_share_chartists']) * (1 - parameters['w_random'])
-    weight_c = parameters['strat_share_chartists'] * (1 - parameters['w_random'])
+    # additional strategies of functions.strategy_kernels take their share from the fundamentalist, chartist and
+    # random strategies, e.g. {'mean_reversion': 0.1}
+    extra_shares = parameters.get('strategy_shares', {})
+    unknown = [name for name in extra_shares if name not in STRATEGY_WEIGHTS]
+    if unknown:
+        raise ValueError("unknown strategies {}".format(unknown))
+    core_share = 1 - sum(extra_shares.values())
+
+    weight_f = core_share * (1 - parameters['strat_share_chartists']) * (1 - parameters['w_random'])
+    weight_c = core_share * parameters['strat_share_chartists'] * (1 - parameters['w_random'])
 
     f_points = int(weight_f * 100 * n_traders)
     c_points = int(weight_c * 100 * n_traders)
-    r_points = int(parameters['w_random'] * 100 * n_traders)
+    r_points = int(core_share * parameters['w_random'] * 100 * n_traders)
 
     # create list of strategy points, shuffle it and divide in equal parts
     strat_points = ['f' for f in range(f_points)] + ['c' for c in range(c_points)] + ['r' for r in range(r_points)]
+    for name, share in extra_shares.items():
+        strat_points += [name for _ in range(int(share * 100 * n_traders))]
     random.shuffle(strat_points)
     agent_points = np.array_split(strat_points, n_traders)
 
     max_horizon = parameters['horizon'] * 2  # this is the max horizon of an agent if 100% fundamentalist
     historical_stock_returns = np.random.normal(0, parameters["std_fundamental"], max_horizon)
 
+    # initialize co_variance_matrix, which is the same for all traders. It is a NumPy array so that runs which never
+    # optimize per trader do not import Pandas, the per trader loop of ABM_model replaces it by a DataFrame
+    init_covariance_matrix = covariance_array(historical_stock_returns, parameters["std_fundamental"])
+
+    # money, stocks and wealth of the traders are either appended every tick or only logged when they trade
+    clock = Clock(parameters['fundamental_value']) if parameters.get('event_sourced_balances', False) else None
+
     for idx in range(n_traders):
         weight_fundamentalist = list(agent_points[idx]).count('f') / float(len(agent_points[idx]))
         weight_chartist = list(agent_points[idx]).count('c') / float(len(agent_points[idx]))
         weight_random = list(agent_points[idx]).count('r') / float(len(agent_points[idx]))
+        extra_weights = {STRATEGY_WEIGHTS[name]: list(agent_points[idx]).count(name) / float(len(agent_points[idx]))
+                         for name in extra_shares}
 
         init_stocks = int(np.random.uniform(0, parameters["init_stocks"]))
         init_money = np.random.uniform(0, (parameters["init_stocks"] * parameters['fundamental_value']))
@@ -46,12 +69,9 @@ def init_objects(parameters, seed):
         else:
             c_share_strat = 0.0
 
-        # initialize co_variance_matrix
-        init_covariance_matrix = calculate_covariance_matrix(historical_stock_returns, parameters["std_fundamental"])
-
         lft_vars = TraderVariables(weight_fundamentalist, weight_chartist, weight_random, c_share_strat,
                                    init_money, init_stocks, init_covariance_matrix,
-                                   parameters['fundamental_value'])
+                                   parameters['fundamental_value'], clock, extra_weights)
 
         # determine heterogeneous horizon and risk aversion based on
         individual_horizon = np.random.randint(10, parameters['horizon'])
@@ -61,22 +81,89 @@ def init_objects(parameters, seed):
 
         lft_params = TraderParameters(individual_horizon, individual_risk_aversion,
                                       individual_learning_ability, parameters['spread_max'])
+        # heterogeneous lookback around parameters['momentum_lookback'], only drawn if there are momentum traders
+        if 'momentum' in extra_shares:
+            lft_params.momentum_lookback = np.random.randint(1, 2 * parameters.get('momentum_lookback', 5))
         lft_expectations = TraderExpectations(parameters['fundamental_value'])
         traders.append(Trader(idx, lft_vars, lft_params, lft_expectations))
 
-    # Add market maker with 100k money and 1k stocks
+    market_maker = init_market_maker(parameters, 0)
+    orderbook = init_orderbook(parameters, historical_stock_returns)
+
+    return traders, orderbook, market_maker
+
+
+def init_market_maker(parameters, name):
+    """
+    Init a market maker with 100k money and 1k stocks
+    :param parameters: dictionary of parameters
+    :param name: integer name of the market maker
+    :return: object MarketMaker
+    """
     mm_tradervariables = TraderVariables(weight_fundamentalist=0, weight_chartist=0, weight_random=0,
                                          c_share_strat=0, money=100000, stocks=1000, covariance_matrix=0,
                                          init_price=parameters['fundamental_value'])
     mm_traderparams = TraderParameters(ref_horizon=0, risk_aversion=0, learning_ability=0.0, max_spread=10000)
     mm_traderexp = TraderExpectations(parameters['fundamental_value'])
-    market_maker = Trader(0, mm_tradervariables, mm_traderparams, mm_traderexp)
+    return MarketMaker(name, mm_tradervariables, mm_traderparams, mm_traderexp,
+                       quote_rule=parameters.get('mm_quote_rule', 'best'),
+                       quote_volume=parameters.get('mm_quote_volume', 1),
+                       half_spread=parameters.get('mm_half_spread', parameters['spread_max'] / 2),
+                       inventory_skew=parameters.get('mm_inventory_skew', 0.0))
 
-    orderbook = LimitOrderBook(parameters['fundamental_value'], parameters["std_fundamental"],
-                               max_horizon,
-                               parameters['ticks'])
 
-    # initialize order-book returns for initial variance calculations
+def init_orderbook(parameters, historical_stock_returns):
+    """
+    Init an order book with a history of returns for the initial variance calculations. Orders expire after
+    parameters['order_expiration'] ticks, by default the length of the simulation. If parameters['tick_size'] is
+    set, order prices are rounded to that grid, and if parameters['price_ladder'] is also True the book is a
+    PriceLadderOrderBook with an optional dense window of parameters['ladder_width'] levels.
+    :param parameters: dictionary of parameters
+    :param historical_stock_returns: np.Array of initial returns
+    :return: object LimitOrderBook
+    """
+    arguments = (parameters['fundamental_value'], parameters["std_fundamental"], len(historical_stock_returns),
+                 parameters.get('order_expiration', parameters['ticks']))
+    if parameters.get('price_ladder', False):
+        if parameters.get('tick_size') is None:
+            raise ValueError("a price_ladder order book requires parameters['tick_size']")
+        orderbook = PriceLadderOrderBook(*arguments, tick_size=parameters['tick_size'],
+                                         ladder_width=parameters.get('ladder_width'))
+    else:
+        orderbook = LimitOrderBook(*arguments, tick_size=parameters.get('tick_size'))
     orderbook.returns = list(historical_stock_returns)
+    return orderbook
 
-    return traders, orderbook, market_maker
+
+def init_multi_asset_objects(parameters, seed):
+    """
+    Init objects for the multi-asset version of the model. The traders of init_objects hold a portfolio of
+    parameters['n_assets'] stocks and money, and every asset has its own order book and market maker.
+    :param parameters: dictionary of parameters
+    :param seed: integer seed
+    :return: list of Trader objects, list of order books, list of market makers (one per asset)
+    """
+    traders, orderbook, market_maker = init_objects(parameters, seed)
+    n_assets = parameters['n_assets']
+
+    orderbooks = [orderbook]
+    market_makers = [market_maker]
+    for asset in range(1, n_assets):
+        historical_stock_returns = np.random.normal(0, parameters["std_fundamental"], len(orderbook.returns))
+        market_makers.append(init_market_maker(parameters, asset))
+        orderbooks.append(init_orderbook(parameters, historical_stock_returns))
+
+    # stocks become an array with a position per asset, money is scaled so that the money share stays the same,
+    # balances are plain lists
+    for trader in traders:
+        stocks = np.array([trader.var.stocks[0]] + [int(np.random.uniform(0, parameters["init_stocks"]))
+                                                     for _ in range(n_assets - 1)])
+        money = trader.var.money[0] * n_assets
+        wealth = money + stocks.sum() * parameters['fundamental_value']
+        trader.var.stocks, trader.var.hypothetical_stocks = [stocks], [stocks.copy()]
+        trader.var.money, trader.var.hypothetical_money = [money], [money]
+        trader.var.wealth, trader.var.hypothetical_wealth = [wealth], [wealth]
+        trader.var.covariance_matrix = None
+        trader.var.clock = None
+
+    return traders, orderbooks, market_makers
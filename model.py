@@ -1,48 +1,107 @@
+import os
 import random
 import numpy as np
 from functions.portfolio_optimization import *
-from functions.helpers import calculate_covariance_matrix, div0, ornstein_uhlenbeck_evolve
+from functions.helpers import calculate_covariance_matrix, div0
+from functions.fundamental import cached_fundamental_paths
+from functions.activation import batch_orders, batch_multi_asset_orders
+from functions.learning import strategy_learning
+from functions.strategy_kernels import MarketSignals, strategy_expectations
+from functions.memory_probe import MemoryProbe
+from functions.projection import project_run, release_run
+from initialize_model import init_objects
+from objects.wealth_distribution import WealthDistribution
+from objects.population import Population
+from objects.scheduler import EventScheduler, CLOSE, QUOTE, ACTIVATION
 
 
-def ABM_model(traders, orderbook, market_maker, parameters, seed=1):
+def ABM_model(traders, orderbook, market_maker, parameters, seed=1, fundamental_path=None, memory_probe=None,
+              gateway=None):
     """
     The main model function of distribution model where trader stocks are tracked.
     :param traders: list of Agent objects
     :param orderbook: object Order book
     :param parameters: dictionary of parameters
     :param seed: integer seed to initialise the random number generators
+    :param fundamental_path: optional np.Array of ticks + 1 fundamental values, e.g. shared between scenarios
+    :param memory_probe: optional functions.memory_probe.MemoryProbe which samples the memory use every few ticks
+    :param gateway: optional started functions.order_gateway.OrderGateway through which external agents trade
     :return: list of simulated Agent objects, object simulated Order book
+
+    If parameters['vectorized_activation'] is True, the expectations and orders of all active traders are
+    calculated as arrays. This makes it feasible to activate the whole population (trader_sample_size equal to
+    n_traders) every turn. In that mode trader.exp.returns and trader.var.covariance_matrix are not updated.
+
+    If parameters['strategy_learning'] is True, all traders update their strategy weights every tick by learning
+    and mutation, see functions.learning.strategy_learning. The final weights and hypothetical portfolios of the
+    traders are written at the end of the simulation, their full histories only if
+    parameters['record_learning_history'] is True.
+
+    Traders with additional strategies (parameters['strategy_shares'] in init_objects) form their expectations with
+    the registered strategy kernels (see functions.strategy_kernels), which requires vectorized_activation.
+
+    If parameters['event_sourced_balances'] was True in init_objects, the money, stocks and wealth of the traders
+    are only logged when they trade (see objects.ledger), so the cost of a tick does not grow with the population.
+
+    If a gateway is given, the orders of external agents are applied every turn after the simulated traders have
+    submitted their orders and before matching. Fills and the top of the book are pushed after matching and expired
+    orders are reported after the book is cleansed.
     """
     random.seed(seed)
     np.random.seed(seed)
-    fundamental = [parameters["fundamental_value"]]
+    if fundamental_path is None:
+        fundamental_path = cached_fundamental_paths(parameters, [seed])[0]
+    fundamental_path = np.asarray(fundamental_path).tolist()
+    fundamental = [fundamental_path[0]]
     orderbook.tick_close_price.append(fundamental[-1])
 
-    traders_by_wealth = [t for t in traders]
-    initial_mm_wealth = market_maker.var.wealth[0]
+    wealth_distribution = WealthDistribution.from_traders(traders, orderbook.tick_close_price[-1])
+
+    clock = traders[0].var.clock if traders else None
+
+    vectorized_activation = parameters.get('vectorized_activation', False)
+    learning = parameters.get('strategy_learning', False)
+    if parameters.get('strategy_shares') and not vectorized_activation:
+        raise ValueError("additional strategies in strategy_shares require vectorized_activation")
+    if vectorized_activation or learning:
+        population = Population(traders, parameters.get('record_learning_history', False))
 
     for tick in range(parameters['horizon'] + 1, parameters["ticks"] + parameters['horizon'] + 1): # for init history
         if tick == parameters['horizon'] + 1:
             print('Start of simulation ', seed)
 
-        # update money and stocks history for agents
-        for trader in traders:
-            trader.var.money.append(trader.var.money[-1])
-            trader.var.stocks.append(trader.var.stocks[-1])
-            trader.var.wealth.append(trader.var.money[-1] + trader.var.stocks[-1] * orderbook.tick_close_price[-1])
+        if memory_probe is not None:
+            memory_probe.sample_tick(tick - parameters['horizon'] - 1, traders, orderbook, market_maker)
+
+        # update money and stocks history for agents, event-sourced histories only need a new period
+        if clock is not None:
+            clock.advance(orderbook.tick_close_price[-1])
+        else:
+            for trader in traders:
+                trader.var.money.append(trader.var.money[-1])
+                trader.var.stocks.append(trader.var.stocks[-1])
+                trader.var.wealth.append(trader.var.money[-1] + trader.var.stocks[-1] * orderbook.tick_close_price[-1])
+
+        # update money, stocks and profit history of the market maker
+        market_maker.update_history(orderbook.tick_close_price[-1])
 
-        #TODO Jakob and / or Adrien update variables of the market maker here (similar to above)
+        # record the wealth distribution, only traders who traded last tick change rank
+        wealth_distribution.set_price(orderbook.tick_close_price[-1])
+        wealth_distribution.record()
+        traded_traders = set()
 
-        # sort the traders by wealth to
-        traders_by_wealth.sort(key=lambda x: x.var.wealth[-1], reverse=True)
+        # the fundamental value follows its pre-generated path
+        fundamental.append(fundamental_path[len(fundamental)])
 
-        # evolve the fundamental value via random walk process
-        fundamental.append(max(
-            ornstein_uhlenbeck_evolve(parameters["fundamental_value"], fundamental[-1], parameters["std_fundamental"],
-                                      parameters['mean_reversion'], seed), 0.1))
+        # traders learn from the performance of their hypothetical strategy portfolios
+        if learning:
+            strategy_learning(population, wealth_distribution.wealth(), orderbook.tick_close_price[-1],
+                              fundamental[-1], orderbook.returns, parameters)
 
         # allow for multiple trades in one day
         for turn in range(parameters["trades_per_tick"]):
+            orderbook.current_turn = turn
+
             # select random sample of active traders
             active_traders = random.sample(traders, int((parameters['trader_sample_size'])))
 
@@ -50,73 +109,410 @@ def ABM_model(traders, orderbook, market_maker, parameters, seed=1):
             fundamental_component = np.log(fundamental[-1] / mid_price)
 
             orderbook.returns[-1] = (mid_price - orderbook.tick_close_price[-2]) / orderbook.tick_close_price[-2]
-            chartist_component = np.cumsum(orderbook.returns[:-len(orderbook.returns) - 1:-1]
-                                           ) / np.arange(1., float(len(orderbook.returns) + 1))
-
-            # Market maker quotes best ask and bid whenever money/inventory permits
-            # TODO Jakob / Adrien make the market maker use stock / money / wealth data over time (see traders)
-            inventory = market_maker.var.stocks[0]
-            inventory_value = mid_price*inventory
-            cash = market_maker.var.money[0]
-            wealth = cash + inventory_value
-            print(f"Market maker has money {cash} and stocks {inventory}")
-            print(f"Stocks are worth {inventory_value} and thus MM's wealth is {wealth}")
-            print(f"Profit margin thus far is {round(wealth/initial_mm_wealth-1,2)*100}%")
-
-            if cash > 0:
-                bid = orderbook.add_bid(orderbook.highest_bid_price, 1, market_maker)
-                market_maker.var.active_orders.append(bid)
-            if inventory > 0:
-                ask = orderbook.add_ask(orderbook.lowest_ask_price, 1, market_maker)
-                market_maker.var.active_orders.append(ask)
 
-            for trader in active_traders:
-                # Cancel any active orders
-                if trader.var.active_orders:
-                    for order in trader.var.active_orders:
-                        orderbook.cancel_order(order)
-                    trader.var.active_orders = []
-
-                # Update trader specific expectations
-                noise_component = parameters['std_noise'] * np.random.randn()
-
-                # Expectation formation
-                trader.exp.returns['stocks'] = (
-                        trader.var.weight_fundamentalist[-1] * np.divide(1, float(trader.par.horizon) * parameters["fundamentalist_horizon_multiplier"]) * fundamental_component +
-                        trader.var.weight_chartist[-1] * chartist_component[trader.par.horizon - 1] +
-                        trader.var.weight_random[-1] * noise_component)
-                fcast_price = mid_price * np.exp(trader.exp.returns['stocks'])
-                trader.var.covariance_matrix = calculate_covariance_matrix(orderbook.returns[-trader.par.horizon:],
-                                                                           parameters["std_fundamental"])
-
-                # employ portfolio optimization algo
-                ideal_trader_weights = portfolio_optimization(trader, tick)
-
-                # Determine price and volume
-                trader_price = np.random.normal(fcast_price, trader.par.spread)
-                position_change = (ideal_trader_weights['stocks'] * (trader.var.stocks[-1] * trader_price + trader.var.money[-1])
-                          ) - (trader.var.stocks[-1] * trader_price)
-                volume = int(div0(position_change, trader_price))
-
-                # Trade:
-                if volume > 0:
-                    bid = orderbook.add_bid(trader_price, volume, trader)
-                    trader.var.active_orders.append(bid)
-                elif volume < 0:
-                    ask = orderbook.add_ask(trader_price, -volume, trader)
-                    trader.var.active_orders.append(ask)
+            # Market maker replaces its bid and ask whenever money/inventory permits
+            market_maker.quote(orderbook, mid_price)
+
+            if vectorized_activation:
+                # expectations, portfolios, prices and volumes of all active traders are calculated at once
+                for trader in active_traders:
+                    cancel_orders(orderbook, trader)
+                trader_prices, volumes = batch_orders(population, np.array([trader.name for trader in active_traders]),
+                                                      mid_price, fundamental[-1], orderbook.returns,
+                                                      np.array([trader.var.money[-1] for trader in active_traders]),
+                                                      np.array([trader.var.stocks[-1] for trader in active_traders]),
+                                                      parameters)
+                for trader, trader_price, volume in zip(active_traders, trader_prices, volumes):
+                    submit_order(orderbook, trader, trader_price, volume)
+            else:
+                chartist_component = np.cumsum(orderbook.returns[:-len(orderbook.returns) - 1:-1]
+                                               ) / np.arange(1., float(len(orderbook.returns) + 1))
+
+                for trader in active_traders:
+                    # Cancel any active orders
+                    cancel_orders(orderbook, trader)
+
+                    # learned weights live in the population, the histories of the traders are written at the end
+                    if learning:
+                        weight_fundamentalist = population.weight_fundamentalist[trader.name]
+                        weight_chartist = population.weight_chartist[trader.name]
+                        weight_random = population.weight_random[trader.name]
+                    else:
+                        weight_fundamentalist = trader.var.weight_fundamentalist[-1]
+                        weight_chartist = trader.var.weight_chartist[-1]
+                        weight_random = trader.var.weight_random[-1]
+
+                    # Update trader specific expectations
+                    noise_component = parameters['std_noise'] * np.random.randn()
+
+                    # Expectation formation
+                    trader.exp.returns['stocks'] = (
+                            weight_fundamentalist * np.divide(1, float(trader.par.horizon) * parameters["fundamentalist_horizon_multiplier"]) * fundamental_component +
+                            weight_chartist * chartist_component[trader.par.horizon - 1] +
+                            weight_random * noise_component)
+                    fcast_price = mid_price * np.exp(trader.exp.returns['stocks'])
+                    trader.var.covariance_matrix = calculate_covariance_matrix(orderbook.returns[-trader.par.horizon:],
+                                                                               parameters["std_fundamental"])
+
+                    # employ portfolio optimization algo
+                    ideal_trader_weights = portfolio_optimization(trader, tick)
+
+                    # Determine price and volume
+                    trader_price = np.random.normal(fcast_price, trader.par.spread)
+                    position_change = (ideal_trader_weights['stocks'] * (trader.var.stocks[-1] * trader_price + trader.var.money[-1])
+                              ) - (trader.var.stocks[-1] * trader_price)
+                    volume = int(div0(position_change, trader_price))
+
+                    # Trade:
+                    submit_order(orderbook, trader, trader_price, volume)
+
+            # external agents trade at the same point of every turn
+            if gateway is not None:
+                gateway.apply(orderbook)
 
             # Match orders in the order-book
-            while True:
-                matched_orders = orderbook.match_orders()
-                if matched_orders is None:
-                    break
-                # execute trade
-                matched_orders[3].owner.sell(matched_orders[1], matched_orders[0] * matched_orders[1])
-                matched_orders[2].owner.buy(matched_orders[1], matched_orders[0] * matched_orders[1])
+            execute_matches(orderbook, market_maker, traded_traders)
+            if gateway is not None:
+                gateway.publish(orderbook, traded_traders)
+
+        for trader in traded_traders:
+            wealth_distribution.update(trader.name, trader.var.money[-1], trader.var.stocks[-1])
 
         # Clear and update order-book history
         orderbook.cleanse_book()
         orderbook.fundamental = fundamental
+        orderbook.wealth_distribution = wealth_distribution
+        if gateway is not None:
+            gateway.end_tick(orderbook)
+
+    if learning:
+        population.update_traders(traders)
+
+    if orderbook.event_log is not None:
+        orderbook.event_log.flush()
 
     return traders, orderbook, market_maker
+
+
+def event_driven_ABM_model(traders, orderbook, market_maker, parameters, seed=1, fundamental_path=None,
+                           memory_probe=None):
+    """
+    Continuous time version of ABM_model. Instead of activating a sample of traders every turn, every trader is
+    activated at the arrival times of its own Poisson process and the market maker requotes at the arrival times of
+    another one. Activations, quotes and tick closes are processed in time order from an EventScheduler. Orders are
+    matched as soon as they are submitted and the book is cleansed at the end of every tick. The mid price return
+    and the market signals of the strategy kernels are only recalculated when the best bid or ask changed since
+    they were last calculated, so the cost of a simulation grows with the amount of events instead of ticks x turns.
+    :param traders: list of Agent objects
+    :param orderbook: object Order book
+    :param market_maker: object MarketMaker
+    :param parameters: dictionary of parameters
+    :param seed: integer seed to initialise the random number generators
+    :param fundamental_path: optional np.Array of ticks + 1 fundamental values
+    :param memory_probe: optional functions.memory_probe.MemoryProbe which samples the memory use every few ticks
+    :return: list of simulated Agent objects, object simulated Order book, object simulated MarketMaker
+
+    parameters['activation_rate'] is the expected amount of activations per trader per tick, by default the
+    trader_sample_size * trades_per_tick / n_traders activations of ABM_model. parameters['quote_rate'] is the
+    expected amount of quotes of the market maker per tick, by default trades_per_tick. Expectations and orders are
+    formed as with vectorized_activation, so trader.exp.returns and trader.var.covariance_matrix are not updated.
+    Strategy learning and event-sourced balances work as in ABM_model. The amount of processed events is stored
+    in orderbook.processed_events.
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    if fundamental_path is None:
+        fundamental_path = cached_fundamental_paths(parameters, [seed])[0]
+    fundamental_path = np.asarray(fundamental_path).tolist()
+    fundamental = [fundamental_path[0]]
+    orderbook.tick_close_price.append(fundamental[-1])
+
+    wealth_distribution = WealthDistribution.from_traders(traders, orderbook.tick_close_price[-1])
+    traded_traders = set()
+
+    clock = traders[0].var.clock if traders else None
+    learning = parameters.get('strategy_learning', False)
+    population = Population(traders, parameters.get('record_learning_history', False))
+
+    activation_rate = parameters.get('activation_rate', parameters['trader_sample_size'] *
+                                     parameters['trades_per_tick'] / len(traders))
+    quote_rate = parameters.get('quote_rate', parameters['trades_per_tick'])
+
+    def start_tick(tick):
+        if memory_probe is not None:
+            memory_probe.sample_tick(tick, traders, orderbook, market_maker)
+
+        # update money and stocks history for agents, event-sourced histories only need a new period
+        if clock is not None:
+            clock.advance(orderbook.tick_close_price[-1])
+        else:
+            for trader in traders:
+                trader.var.money.append(trader.var.money[-1])
+                trader.var.stocks.append(trader.var.stocks[-1])
+                trader.var.wealth.append(trader.var.money[-1] + trader.var.stocks[-1] * orderbook.tick_close_price[-1])
+
+        market_maker.update_history(orderbook.tick_close_price[-1])
+
+        wealth_distribution.set_price(orderbook.tick_close_price[-1])
+        wealth_distribution.record()
+        traded_traders.clear()
+
+        fundamental.append(fundamental_path[len(fundamental)])
+
+        if learning:
+            strategy_learning(population, wealth_distribution.wealth(), orderbook.tick_close_price[-1],
+                              fundamental[-1], orderbook.returns, parameters)
+
+    scheduler = EventScheduler()
+    scheduler.schedule(0., QUOTE)
+    scheduler.schedule_poisson_all(activation_rate, ACTIVATION, list(range(len(traders))))
+    scheduler.schedule(1., CLOSE)
+
+    print('Start of simulation ', seed)
+    start_tick(0)
+
+    # best bid and ask for which the signals were last calculated
+    signal_quotes = None
+    while scheduler:
+        time, kind, target = scheduler.pop()
+
+        if kind == CLOSE:
+            for trader in traded_traders:
+                wealth_distribution.update(trader.name, trader.var.money[-1], trader.var.stocks[-1])
+            orderbook.cleanse_book()
+            signal_quotes = None
+            if time >= parameters['ticks']:
+                break
+            start_tick(int(time))
+            scheduler.schedule(time + 1., CLOSE)
+            continue
+
+        quotes = (orderbook.highest_bid_price, orderbook.lowest_ask_price)
+        if quotes != signal_quotes:
+            signal_quotes = quotes
+            mid_price = np.mean(quotes)
+            orderbook.returns[-1] = (mid_price - orderbook.tick_close_price[-2]) / orderbook.tick_close_price[-2]
+            signals = MarketSignals(mid_price, fundamental[-1], orderbook.returns, parameters["std_fundamental"])
+
+        if kind == QUOTE:
+            market_maker.quote(orderbook, mid_price)
+            scheduler.schedule_poisson(quote_rate, QUOTE)
+        else:
+            trader = traders[target]
+            cancel_orders(orderbook, trader)
+
+            # expectation formation, portfolio optimization and order as in batch_orders
+            active = np.array([target])
+            expected_return = strategy_expectations(population, active, signals, parameters)[0]
+            fcast_price = mid_price * np.exp(expected_return)
+            stock_weight = mean_variance_stock_weights(expected_return,
+                                                       signals.horizon_statistics(population.horizon[active])[1][0],
+                                                       population.risk_aversion[target])
+            trader_price = np.random.normal(fcast_price, population.spread[target])
+            position_change = (stock_weight * (trader.var.stocks[-1] * trader_price + trader.var.money[-1])
+                               ) - (trader.var.stocks[-1] * trader_price)
+            volume = int(div0(position_change, trader_price))
+
+            submit_order(orderbook, trader, trader_price, volume)
+            scheduler.schedule_poisson(activation_rate, ACTIVATION, target)
+
+        # continuous double auction, an order is matched as soon as it arrives
+        execute_matches(orderbook, market_maker, traded_traders)
+
+    orderbook.fundamental = fundamental
+    orderbook.wealth_distribution = wealth_distribution
+    orderbook.processed_events = scheduler.processed
+
+    if learning:
+        population.update_traders(traders)
+
+    if orderbook.event_log is not None:
+        orderbook.event_log.flush()
+
+    return traders, orderbook, market_maker
+
+
+def multi_asset_ABM_model(traders, orderbooks, market_makers, parameters, seed=1):
+    """
+    Multi-asset version of the model: every asset has its own order book and market maker, and traders choose a
+    long-only portfolio of all assets and money based on the covariance of the asset returns over their horizon.
+    Expectations and portfolios of the active traders are calculated as arrays (as with vectorized_activation),
+    trader.var.stocks holds an np.Array with a position per asset.
+    :param traders: list of Trader objects from init_multi_asset_objects
+    :param orderbooks: list of Order book objects, one per asset
+    :param market_makers: list of MarketMaker objects, one per asset
+    :param parameters: dictionary of parameters, parameters['n_assets'] is the amount of assets
+    :param seed: integer seed to initialise the random number generators
+    :return: list of simulated Trader objects, list of simulated Order books, list of simulated market makers
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    n_assets = len(orderbooks)
+
+    # every asset has its own fundamental value path
+    fundamental_paths = cached_fundamental_paths(parameters, [seed * n_assets + asset for asset in range(n_assets)]).tolist()
+    for orderbook, fundamental_path in zip(orderbooks, fundamental_paths):
+        orderbook.tick_close_price.append(fundamental_path[0])
+        orderbook.fundamental = [fundamental_path[0]]
+
+    population = Population(traders)
+    # all orders of a trader which may still be in the books, per trader name
+    open_orders = [[] for _ in traders]
+
+    for tick in range(parameters['horizon'] + 1, parameters["ticks"] + parameters['horizon'] + 1):
+        if tick == parameters['horizon'] + 1:
+            print('Start of simulation ', seed)
+
+        close_prices = np.array([orderbook.tick_close_price[-1] for orderbook in orderbooks])
+
+        # update money and stocks history for agents
+        for trader in traders:
+            trader.var.money.append(trader.var.money[-1])
+            trader.var.stocks.append(trader.var.stocks[-1].copy())
+            trader.var.wealth.append(trader.var.money[-1] + trader.var.stocks[-1] @ close_prices)
+
+        for market_maker, close_price in zip(market_makers, close_prices):
+            market_maker.update_history(close_price)
+
+        for orderbook, fundamental_path in zip(orderbooks, fundamental_paths):
+            orderbook.fundamental.append(fundamental_path[len(orderbook.fundamental)])
+
+        for turn in range(parameters["trades_per_tick"]):
+            active_traders = random.sample(traders, int((parameters['trader_sample_size'])))
+
+            mid_prices = np.array([np.mean([orderbook.highest_bid_price, orderbook.lowest_ask_price])
+                                   for orderbook in orderbooks])
+            for orderbook, mid_price, market_maker in zip(orderbooks, mid_prices, market_makers):
+                orderbook.current_turn = turn
+                orderbook.returns[-1] = (mid_price - orderbook.tick_close_price[-2]) / orderbook.tick_close_price[-2]
+                market_maker.quote(orderbook, mid_price)
+
+            for trader in active_traders:
+                for order in open_orders[trader.name]:
+                    orderbooks[order.asset].cancel_order(order)
+                open_orders[trader.name] = []
+
+            historical_returns = np.array([orderbook.returns[-int(population.horizon.max()):]
+                                           for orderbook in orderbooks]).T
+            fundamentals = np.array([orderbook.fundamental[-1] for orderbook in orderbooks])
+            trader_prices, volumes = batch_multi_asset_orders(population,
+                                                              np.array([trader.name for trader in active_traders]),
+                                                              mid_prices, fundamentals, historical_returns,
+                                                              np.array([trader.var.money[-1] for trader in active_traders]),
+                                                              np.array([trader.var.stocks[-1] for trader in active_traders]),
+                                                              parameters)
+
+            for row, asset in zip(*np.nonzero(volumes)):
+                trader = active_traders[row]
+                if volumes[row, asset] > 0:
+                    order = orderbooks[asset].add_bid(trader_prices[row, asset], volumes[row, asset], trader)
+                else:
+                    order = orderbooks[asset].add_ask(trader_prices[row, asset], -volumes[row, asset], trader)
+                order.asset = asset
+                open_orders[trader.name].append(order)
+
+            # Match orders in every order-book
+            for asset, (orderbook, market_maker) in enumerate(zip(orderbooks, market_makers)):
+                while True:
+                    matched_orders = orderbook.match_orders()
+                    if matched_orders is None:
+                        break
+                    price, volume, bid, ask = matched_orders
+                    # market makers only trade their own asset and hold a single stock position
+                    ask.owner.sell(volume, price * volume, asset=None if ask.owner is market_maker else asset)
+                    bid.owner.buy(volume, price * volume, asset=None if bid.owner is market_maker else asset)
+
+        for orderbook in orderbooks:
+            orderbook.cleanse_book()
+
+    return traders, orderbooks, market_makers
+
+
+def simulate_outputs(parameters, seed, outputs, fundamental_path=None):
+    """
+    Initialise and simulate the model, and only return the requested outputs instead of the simulated objects.
+    The record is cheap to send from a worker process to its parent.
+    :param parameters: dictionary of parameters
+    :param seed: integer seed
+    :param outputs: list of output names, see functions.projection.OUTPUTS
+    :param fundamental_path: optional np.Array of ticks + 1 fundamental values
+    :return: dictionary of output names and np.Arrays
+
+    If parameters['memory_probe_interval'] is set, the memory use is sampled every that many ticks and after every
+    phase of the run, and written to memory_report_seed<seed>.json in parameters['memory_report_dir'].
+    If parameters['event_driven'] is True, the run is simulated with event_driven_ABM_model.
+    """
+    memory_probe = None
+    if parameters.get('memory_probe_interval'):
+        memory_probe = MemoryProbe(parameters['memory_probe_interval'])
+        memory_probe.start()
+
+    traders, orderbook, market_maker = init_objects(parameters, seed)
+    if memory_probe is not None:
+        memory_probe.sample('init', traders, orderbook, market_maker)
+    model = event_driven_ABM_model if parameters.get('event_driven', False) else ABM_model
+    traders, orderbook, market_maker = model(traders, orderbook, market_maker, parameters, seed, fundamental_path,
+                                             memory_probe)
+    if memory_probe is not None:
+        memory_probe.sample('simulated', traders, orderbook, market_maker)
+    record = project_run(traders, orderbook, market_maker, outputs)
+    if memory_probe is not None:
+        memory_probe.sample('projected', traders, orderbook, market_maker)
+    release_run(traders, orderbook, market_maker)
+
+    if memory_probe is not None:
+        memory_probe.sample('released', traders, orderbook, market_maker)
+        memory_probe.stop()
+        memory_probe.write(os.path.join(parameters.get('memory_report_dir', '.'),
+                                        'memory_report_seed{}.json'.format(seed)))
+    return record
+
+
+def execute_matches(orderbook, market_maker, traded_traders):
+    """
+    Match orders in the order book until the highest bid is below the lowest ask and settle the trades
+    :param orderbook: object Order book
+    :param market_maker: object MarketMaker
+    :param traded_traders: set to which the traders (excluding the market maker) who traded are added
+    :return: None
+    """
+    while True:
+        matched_orders = orderbook.match_orders()
+        if matched_orders is None:
+            break
+        # execute trade
+        matched_orders[3].owner.sell(matched_orders[1], matched_orders[0] * matched_orders[1])
+        matched_orders[2].owner.buy(matched_orders[1], matched_orders[0] * matched_orders[1])
+        for order in matched_orders[2:]:
+            if order.owner is not market_maker:
+                traded_traders.add(order.owner)
+
+
+def cancel_orders(orderbook, trader):
+    """
+    Cancel all active orders of a trader
+    :param orderbook: object Order book
+    :param trader: object Trader
+    :return: None
+    """
+    if trader.var.active_orders:
+        for order in trader.var.active_orders:
+            orderbook.cancel_order(order)
+        trader.var.active_orders = []
+
+
+def submit_order(orderbook, trader, price, volume):
+    """
+    Submit a bid (positive volume) or ask (negative volume) for a trader
+    :param orderbook: object Order book
+    :param trader: object Trader
+    :param price: float order price
+    :param volume: integer signed order volume
+    :return: None
+    """
+    if volume > 0:
+        bid = orderbook.add_bid(price, volume, trader)
+        trader.var.active_orders.append(bid)
+    elif volume < 0:
+        ask = orderbook.add_ask(price, -volume, trader)
+        trader.var.active_orders.append(ask)
@@ -1,9 +1,11 @@
 from functions.indirect_calibration import *
 import time
 from multiprocessing import Pool
+from functions.job_queue import JobServer
+from functions.trace_store import TraceStore, file_digest
 import json
 import numpy as np
-from hurst import compute_Hc
+from functions.stylizedfacts import calibration_moments
 
 np.seterr(all='ignore')
 
@@ -14,6 +16,8 @@ LATIN_NUMBER = 0
 NRUNS = 4
 BURN_IN = 0
 CORES = NRUNS # set the amount of cores equal to the amount of runs
+JOB_SERVER_ADDRESS = None # e.g. ('0.0.0.0', 6000) to distribute the runs over workers on several hosts, server and workers need the secret ABM_JOB_AUTHKEY (see functions/job_queue.py)
+TRACE_PATH = 'calibration_trace.jsonl' # every evaluation is stored here, a restarted calibration replays them
 
 problem = {
   'num_vars': 3,
@@ -38,37 +42,16 @@ params = {'trader_sample_size': 10, 'n_traders': 1000, 'init_stocks': 81, 'ticks
               'trades_per_tick': 1}
 
 
-def simulate_a_seed(seed_params):
-    """Simulates the model for a single seed and outputs the associated cost"""
+def simulate_seed_moments(seed_params):
+    """Simulates the model for a single seed and outputs the simulated moments and the associated cost"""
     seed = seed_params[0]
     params = seed_params[1]
 
-    obs = []
-    # run model with parameters
-    traders, orderbook, market_maker = init_objects(params, seed)
-    traders, orderbook, market_maker = ABM_model(traders, orderbook, market_maker, params, seed)
-    obs.append(orderbook)
+    # run model with parameters and only keep the close prices
+    close_prices = simulate_outputs(params, seed, ['close_prices'])['close_prices']
 
     # store simulated stylized facts
-    mc_prices, mc_returns, mc_autocorr_returns, mc_autocorr_abs_returns, mc_volatility, mc_volume, mc_fundamentals = organise_data(
-        obs, burn_in_period=BURN_IN)
-
-    rets_autocor = []
-    rets_abs_autocors = []
-    kurts = []
-    hursts = []
-    for col in mc_returns:
-        rets_autocor.append(autocorrelation_returns(mc_returns[col][1:], 25))
-        rets_abs_autocors.append(autocorrelation_returns(mc_returns[col][1:].abs(), 25))
-        kurts.append(mc_returns[col][1:].kurtosis())
-        hursts.append(compute_Hc(mc_prices[col][1:], kind='price', simplified=True)[0])
-
-    stylized_facts_sim = np.array([
-        np.mean(rets_autocor),
-        np.mean(rets_abs_autocors),
-        np.mean(kurts),
-        np.mean(hursts)
-    ])
+    stylized_facts_sim = calibration_moments(close_prices[BURN_IN:])
 
     W = np.load('distr_weighting_matrix.npy')  # if this doesn't work, use: np.identity(len(stylized_facts_sim))
 
@@ -76,13 +59,30 @@ def simulate_a_seed(seed_params):
 
     # calculate the cost
     cost = quadratic_loss_function(stylized_facts_sim, empirical_moments, W)
-    return cost
+    return list(stylized_facts_sim), cost
+
+
+def simulate_a_seed(seed_params):
+    """Simulates the model for a single seed and outputs the associated cost"""
+    return simulate_seed_moments(seed_params)[1]
 
 
 def pool_handler():
-    p = Pool(CORES) # argument is how many process happening in parallel
+    if JOB_SERVER_ADDRESS is None:
+        p = Pool(CORES) # argument is how many process happening in parallel
+    else:
+        p = JobServer(JOB_SERVER_ADDRESS) # workers on other hosts connect to this address
     list_of_seeds = [x for x in range(NRUNS)]
 
+    # workers on other hosts import the function from this module, not from the __main__ of this process
+    import model_calibration
+    simulate_seed = model_calibration.simulate_seed_moments
+
+    # evaluations of an interrupted run with the same configuration are replayed from the trace
+    trace = TraceStore(TRACE_PATH, {'params': params, 'names': problem['names'], 'seeds': list_of_seeds,
+                                    'burn_in': BURN_IN, 'emp_moments': file_digest('emp_moments.npy'),
+                                    'weighting_matrix': file_digest('distr_weighting_matrix.npy')})
+
     def model_performance(input_parameters):
         """
         Simple function calibrate uncertain model parameters
@@ -104,18 +104,29 @@ def pool_handler():
               'trades_per_tick': 1}
         params.update(uncertain_parameters)
 
+        stored = trace.lookup(new_input_params)
+        if stored is not None:
+            return stored['cost']
+
+        evaluation_start = time.time()
         list_of_seeds_params = [[seed, params] for seed in list_of_seeds]
 
-        costs = p.map(simulate_a_seed, list_of_seeds_params) # first argument is function to execute, second argument is tuple of all inputs TODO uncomment this
+        results = p.map(simulate_seed, list_of_seeds_params) # first argument is function to execute, second argument is tuple of all inputs TODO uncomment this
+        moments, costs = [list(result) for result in zip(*results)]
+        record = trace.record_evaluation(new_input_params, list_of_seeds, moments, costs,
+                                         time.time() - evaluation_start)
 
-        return np.mean(costs)
+        return record['cost']
 
-    output = constrNM(model_performance, init_parameters, LB, UB, maxiter=2, full_output=True)
+    output = constrNM(model_performance, init_parameters, LB, UB, maxiter=2, full_output=True,
+                      callback=lambda xk: trace.record_iteration(transformX(xk, LB, UB)))
+    trace.close()
 
     with open('estimated_params.json', 'w') as f:
         json.dump(list(output['xopt']), f)
 
     print('All outputs are: ', output)
+    print('Evaluations replayed from the trace: ', trace.replayed)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,70 @@
+"""
+Multi-fidelity calibration. Candidate parameters of the constrained Nelder-Mead optimization are screened on a
+reduced configuration of the model (LOW_FIDELITY) and only promising candidates are simulated with the full
+configuration of model_calibration (see functions/multi_fidelity.py). The relation between low and high fidelity
+losses is learned during the calibration.
+"""
+import json
+import os
+import time
+from multiprocessing import Pool
+import numpy as np
+import model_calibration
+from model_calibration import problem, latin_hyper_cube, LATIN_NUMBER, LB, UB, NRUNS, JOB_SERVER_ADDRESS
+from functions.indirect_calibration import constrNM
+from functions.job_queue import JobServer
+from functions.multi_fidelity import MultiFidelityObjective, reduced_parameters
+
+np.seterr(all='ignore')
+
+# INPUT PARAMETERS
+CORES = os.cpu_count()
+LOW_FIDELITY = {'n_traders': 100, 'ticks': 302, 'seeds': 2} # reduced configuration used to screen candidates
+HIGH_FIDELITY = {'seeds': NRUNS} # the configuration of model_calibration
+MIN_PAIRS = 5 # candidates evaluated at both fidelities before the low fidelity loss is used to screen
+MARGIN = 1.0 # residual standard deviations by which a promoted candidate may be predicted worse than the best
+MIN_CORRELATION = 0.5 # below this correlation of the losses every candidate is promoted
+MAXITER = 50
+
+
+def fidelity_loss(input_parameters, fidelity, pool):
+    """
+    Average cost of the model over the seeds of a fidelity for a set of uncertain parameters
+    :param input_parameters: list of input parameters
+    :param fidelity: dictionary of overridden parameters and amount of seeds
+    :param pool: object Pool or JobServer
+    :return: average cost
+    """
+    params = reduced_parameters(model_calibration.params, fidelity)
+    params.update(dict(zip(problem['names'], input_parameters)))
+    costs = pool.map(model_calibration.simulate_a_seed, [[seed, params] for seed in range(fidelity['seeds'])])
+    return np.mean(costs)
+
+
+def pool_handler():
+    if JOB_SERVER_ADDRESS is None:
+        pool = Pool(CORES)
+    else:
+        pool = JobServer(JOB_SERVER_ADDRESS)
+
+    objective = MultiFidelityObjective(lambda x: fidelity_loss(x, LOW_FIDELITY, pool),
+                                       lambda x: fidelity_loss(x, HIGH_FIDELITY, pool),
+                                       min_pairs=MIN_PAIRS, margin=MARGIN, min_correlation=MIN_CORRELATION)
+    output = constrNM(objective, latin_hyper_cube[LATIN_NUMBER], LB, UB, maxiter=MAXITER, full_output=True)
+
+    # the optimum of the optimizer may rest on a predicted loss, the estimate is the best full fidelity candidate
+    with open('estimated_params.json', 'w') as f:
+        json.dump(objective.best_parameters, f)
+
+    model = objective.fit()
+    print('All outputs are: ', output)
+    print('Best full fidelity cost', objective.best_loss, 'parameters', objective.best_parameters)
+    print('Candidates promoted', objective.promoted, 'screened', objective.screened)
+    if model is not None:
+        print('Loss correlation', model[3], 'fit: high = {} + {} * low'.format(model[0], model[1]))
+
+
+if __name__ == '__main__':
+    start_time = time.time()
+    pool_handler()
+    print("The simulations took", time.time() - start_time, "to run")
@@ -0,0 +1,152 @@
+"""
+Concurrent multi-start calibration. A constrained Nelder-Mead optimization is started from every row of the Latin
+hypercube. All starts share one worker pool. After every rung the worst starts are dropped (successive halving)
+and the evaluation budget of the next rung grows, so the compute of dropped starts goes to the survivors.
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+import numpy as np
+from scipy.optimize import minimize
+import model_calibration
+from model_calibration import problem, latin_hyper_cube, LB, UB, NRUNS, JOB_SERVER_ADDRESS
+from functions.indirect_calibration import transformX, transformX0
+from functions.job_queue import JobServer
+
+np.seterr(all='ignore')
+
+# INPUT PARAMETERS
+CORES = os.cpu_count()
+RUNG_EVALUATIONS = 10 # objective evaluations per start in the first rung
+ELIMINATION_RATE = 2 # after every rung only 1 / ELIMINATION_RATE of the starts survive
+MAX_EVALUATIONS = 200 # maximum objective evaluations of a single start
+XTOL = 0.0001
+FTOL = 0.0001
+
+
+class EvaluationBudgetExhausted(Exception):
+    """
+    Raised by the objective of a start which has used all of its MAX_EVALUATIONS objective evaluations
+    """
+
+
+class Start:
+    """
+    State of a single Nelder-Mead optimization which can be continued rung after rung
+    """
+    def __init__(self, index, init_parameters):
+        """
+        Initialize the start from a row of the Latin hypercube
+        :param index: integer row of the Latin hypercube
+        :param init_parameters: list of initial parameters
+        """
+        self.index = index
+        self.x = transformX0(init_parameters, LB, UB)
+        self.simplex = None
+        self.cost = np.inf
+        self.evaluations = 0
+        self.converged = False
+        self.evaluated = {}
+
+    def parameters(self):
+        """
+        :return: list of the best parameters found by this start
+        """
+        return list(transformX(self.x, LB, UB))
+
+
+def model_performance(input_parameters, pool):
+    """
+    Average cost of the model over all seeds for a set of uncertain parameters
+    :param input_parameters: list of input parameters
+    :param pool: object Pool or JobServer shared by all starts
+    :return: average cost
+    """
+    params = model_calibration.params.copy()
+    params.update(dict(zip(problem['names'], input_parameters)))
+    costs = pool.map(model_calibration.simulate_a_seed, [[seed, params] for seed in range(NRUNS)])
+    return np.mean(costs)
+
+
+def run_rung(start, pool, max_evaluations):
+    """
+    Continue the Nelder-Mead optimization of a start from its last simplex for a limited amount of evaluations
+    :param start: object Start
+    :param pool: object Pool or JobServer
+    :param max_evaluations: integer maximum amount of new objective evaluations
+    :return: object Start
+    """
+    def objective(x):
+        # the vertices of a continued simplex have been evaluated in the previous rung
+        key = tuple(x)
+        if key not in start.evaluated:
+            if start.evaluations >= MAX_EVALUATIONS:
+                raise EvaluationBudgetExhausted
+            start.evaluated[key] = model_performance(transformX(x, LB, UB), pool)
+            start.evaluations += 1
+        return start.evaluated[key]
+
+    # the vertices of a continued simplex count towards maxfev but are not evaluated again
+    cached_vertices = len(start.x) + 1 if start.simplex is not None else 0
+    try:
+        result = minimize(objective, start.x, method='Nelder-Mead',
+                          options={'maxfev': max_evaluations + cached_vertices, 'initial_simplex': start.simplex,
+                                   'xatol': XTOL, 'fatol': FTOL})
+    except EvaluationBudgetExhausted:
+        # a shrink step evaluates all vertices at once and can overshoot maxfev, the start stops at its best point
+        key = min(start.evaluated, key=start.evaluated.get)
+        start.x, start.cost, start.converged = np.array(key), start.evaluated[key], True
+        return start
+    start.x, start.cost, start.simplex = result.x, result.fun, result.final_simplex[0]
+    start.converged = result.status == 0 or start.evaluations >= MAX_EVALUATIONS
+    return start
+
+
+def successive_halving(starts, pool):
+    """
+    Run all starts concurrently and drop the worst ones after every rung until a single converged start remains
+    :param starts: list of Start objects
+    :param pool: object Pool or JobServer
+    :return: object Start with the lowest cost
+    """
+    survivors = starts
+    budget = RUNG_EVALUATIONS
+    rung = 0
+    while True:
+        running = [start for start in survivors if not start.converged]
+        with ThreadPoolExecutor(max_workers=max(len(running), 1)) as executor:
+            list(executor.map(lambda start: run_rung(start, pool, min(budget, MAX_EVALUATIONS - start.evaluations)),
+                              running))
+
+        survivors.sort(key=lambda start: start.cost)
+        print('Rung', rung, 'costs', [(start.index, round(float(start.cost), 4)) for start in survivors])
+        if all(start.converged for start in survivors):
+            return survivors[0]
+
+        survivors = survivors[:max(1, len(survivors) // ELIMINATION_RATE)]
+        budget *= ELIMINATION_RATE
+        rung += 1
+
+
+def pool_handler():
+    if JOB_SERVER_ADDRESS is None:
+        pool = Pool(CORES)
+    else:
+        pool = JobServer(JOB_SERVER_ADDRESS)
+
+    starts = [Start(index, init_parameters) for index, init_parameters in enumerate(latin_hyper_cube)]
+    best = successive_halving(starts, pool)
+
+    with open('estimated_params.json', 'w') as f:
+        json.dump(best.parameters(), f)
+
+    print('Best start', best.index, 'cost', best.cost, 'parameters', best.parameters())
+    print('Total objective evaluations', sum(start.evaluations for start in starts))
+
+
+if __name__ == '__main__':
+    start_time = time.time()
+    pool_handler()
+    print("The simulations took", time.time() - start_time, "to run")
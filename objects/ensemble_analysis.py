@@ -0,0 +1,121 @@
+"""Lazily computed statistics of an ensemble of simulation runs"""
+
+from functools import cached_property
+import numpy as np
+
+
+class EnsembleAnalysis:
+    """
+    Wraps the raw close price, volume and fundamental series of a number of runs. Every statistic is a Pandas
+    DataFrame with a column per run, which is computed on first access and memoized, so a caller only pays for the
+    statistics it uses.
+    """
+    def __init__(self, close_prices, volumes, fundamentals, burn_in_period=0, window=20, lags=25):
+        """
+        Initialize the ensemble analysis from the series of every run
+        :param close_prices: list of close price series per run
+        :param volumes: list of total traded volume series per run
+        :param fundamentals: list of fundamental value series per run
+        :param burn_in_period: integer period of observations which is discarded
+        :param window: integer amount of returns of the rolling volatility
+        :param lags: integer amount of lags (starting at 0) of the autocorrelations
+        """
+        self.close_prices = [list(series)[burn_in_period:] for series in close_prices]
+        self.volumes = [list(series)[burn_in_period:] for series in volumes]
+        self.fundamentals = [list(series)[burn_in_period:] for series in fundamentals]
+        self.window = window
+        self.lags = lags
+
+    @classmethod
+    def from_orderbooks(cls, obs, burn_in_period=0, **kwargs):
+        """
+        Initialize the ensemble analysis from the order books of simulated runs
+        :param obs: list of limit-orderbooks
+        :param burn_in_period: integer period of observations which is discarded
+        :return: object EnsembleAnalysis
+        """
+        return cls([ob.tick_close_price for ob in obs],
+                   [[sum(volumes) for volumes in ob.transaction_volumes_history] for ob in obs],
+                   [ob.fundamental for ob in obs], burn_in_period, **kwargs)
+
+    @cached_property
+    def return_series(self):
+        """list of Pandas Series of returns per run"""
+        import pandas as pd
+
+        return [pd.Series(np.array(prices)).pct_change() for prices in self.close_prices]
+
+    @cached_property
+    def prices(self):
+        """DataFrame of close prices"""
+        import pandas as pd
+
+        return pd.DataFrame(self.close_prices).transpose()
+
+    @cached_property
+    def returns(self):
+        """DataFrame of returns"""
+        import pandas as pd
+
+        return pd.DataFrame(self.return_series).transpose()
+
+    @cached_property
+    def autocorr_returns(self):
+        """DataFrame of the autocorrelation of returns per lag"""
+        import pandas as pd
+
+        return pd.DataFrame([[r.autocorr(lag=lag) for lag in range(self.lags)]
+                             for r in self.return_series]).transpose()
+
+    @cached_property
+    def autocorr_abs_returns(self):
+        """DataFrame of the autocorrelation of absolute returns per lag"""
+        import pandas as pd
+
+        return pd.DataFrame([[r.abs().autocorr(lag=lag) for lag in range(self.lags)]
+                             for r in self.return_series]).transpose()
+
+    @cached_property
+    def volatility(self):
+        """DataFrame of the rolling standard deviation of returns"""
+        import pandas as pd
+
+        return pd.DataFrame([r.rolling(self.window).std(ddof=0) for r in self.return_series]).transpose()
+
+    @cached_property
+    def volume(self):
+        """DataFrame of the total traded volume"""
+        import pandas as pd
+
+        return pd.DataFrame(self.volumes).transpose()
+
+    @cached_property
+    def fundamental(self):
+        """DataFrame of the fundamental values"""
+        import pandas as pd
+
+        return pd.DataFrame(self.fundamentals).transpose()
+
+    def computed(self):
+        """
+        :return: list of names of the statistics which have been computed
+        """
+        return [name for name in ['return_series', 'prices', 'returns', 'autocorr_returns', 'autocorr_abs_returns',
+                                  'volatility', 'volume', 'fundamental'] if name in self.__dict__]
+
+    def statistics(self):
+        """
+        :return: Pandas DataFrames of prices, returns, autocorrelation in returns, autocorr_abs_returns, volatility,
+        volume, fundamentals in the order of organise_data
+        """
+        return self.prices, self.returns, self.autocorr_returns, self.autocorr_abs_returns, self.volatility, \
+            self.volume, self.fundamental
+
+    def __len__(self):
+        return len(self.close_prices)
+
+    def __repr__(self):
+        """
+        :return: String representation of the ensemble analysis
+        """
+        return 'EnsembleAnalysis_runs={}_computed={}'.format(len(self), self.computed())
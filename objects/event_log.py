@@ -0,0 +1,167 @@
+"""
+Compact binary log of the order flow of a LimitOrderBook and its deterministic replay.
+
+Every event is a fixed size little-endian record of event type, side, turn, tick, order id, owner id, price and
+volume, so a log can be read back as a single NumPy structured array. The market maker has owner id -1.
+"""
+import struct
+import types
+import numpy as np
+from objects.market_maker import MarketMaker
+from objects.orderbook import ADD, CANCEL, MATCH, END_TICK
+
+MAGIC = b'RLABMEV1'
+
+EVENT_NAMES = ['add', 'cancel', 'match', 'expire', 'end_tick']
+
+# sides
+BID, ASK = 0, 1
+
+RECORD = struct.Struct('<BBHIqidq')
+EVENT_DTYPE = np.dtype([('event', '<u1'), ('side', '<u1'), ('turn', '<u2'), ('tick', '<u4'), ('order_id', '<i8'),
+                        ('owner', '<i4'), ('price', '<f8'), ('volume', '<i8')])
+
+TAPE_DTYPE = np.dtype([('tick', '<u4'), ('turn', '<u2'), ('price', '<f8'), ('volume', '<i8'),
+                       ('bid_id', '<i8'), ('ask_id', '<i8')])
+
+
+def owner_id(owner):
+    """
+    :param owner: object Trader or MarketMaker which owns an order
+    :return: integer id of the owner in the event log
+    """
+    return -1 if isinstance(owner, MarketMaker) else owner.name
+
+
+class OrderEventLog:
+    """
+    Buffered writer of order book events. Attach it to a book with orderbook.event_log = OrderEventLog(path).
+    """
+    def __init__(self, path, buffer_size=1 << 20):
+        """
+        Initialize the event log and write its header
+        :param path: string file name of the log
+        :param buffer_size: integer size in bytes of the write buffer
+        """
+        self.path = path
+        self.file = open(path, 'wb', buffering=buffer_size)
+        self.file.write(MAGIC)
+        self.events = 0
+
+    def write(self, event, order, tick, turn, price, volume):
+        """
+        Append a single event to the log
+        :param event: integer event type, e.g. ADD
+        :param order: object Order the event applies to, None for END_TICK
+        :param tick: integer tick of the event
+        :param turn: integer turn of the event within the tick
+        :param price: float order or transaction price
+        :param volume: integer order or transaction volume
+        :return: None
+        """
+        if order is None:
+            side, order_id, owner = 0, -1, -1
+        else:
+            side, order_id, owner = (BID if order.order_type == 'b' else ASK), order.order_id, owner_id(order.owner)
+        self.file.write(RECORD.pack(event, side, turn, tick, order_id, owner, price, int(volume)))
+        self.events += 1
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self):
+        """
+        :return: String representation of the event log
+        """
+        return 'OrderEventLog_{}'.format(self.path)
+
+
+def read_event_log(path):
+    """
+    Read an event log
+    :param path: string file name of the log
+    :return: np.Array with dtype EVENT_DTYPE
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{} is not an order event log".format(path))
+    return np.fromfile(path, dtype=EVENT_DTYPE, offset=len(MAGIC))
+
+
+def logged_trades(events):
+    """
+    Trade tape as recorded in an event log, every trade is logged as a MATCH of the bid followed by one of the ask
+    :param events: np.Array with dtype EVENT_DTYPE
+    :return: np.Array with dtype TAPE_DTYPE
+    """
+    matches = events[events['event'] == MATCH]
+    bids, asks = matches[0::2], matches[1::2]
+    tape = np.empty(len(bids), dtype=TAPE_DTYPE)
+    for name in ['tick', 'turn', 'price', 'volume']:
+        tape[name] = bids[name]
+    tape['bid_id'] = bids['order_id']
+    tape['ask_id'] = asks['order_id']
+    return tape
+
+
+def replay_event_log(events, orderbook):
+    """
+    Rebuild the book and trade tape from the logged order flow without simulating the traders.
+    Logged matches and expiries are not applied, the book matches and cleanses itself: orders are matched when the
+    log shows a match and at the end of every turn, and the book is cleansed at the end of every tick. Replaying a
+    log into a LimitOrderBook reproduces the original run; other matching engines can be compared with
+    logged_trades.
+    :param events: np.Array with dtype EVENT_DTYPE or string file name of the log
+    :param orderbook: object empty order book as the original was initialised, e.g. from init_objects
+    :return: object replayed order book, np.Array trade tape with dtype TAPE_DTYPE
+    """
+    if isinstance(events, str):
+        events = read_event_log(events)
+
+    owners = {}
+    orders = {}
+    tape = []
+
+    def match(tick, turn):
+        while True:
+            matched_orders = orderbook.match_orders()
+            if matched_orders is None:
+                return
+            price, volume, bid, ask = matched_orders
+            tape.append((tick, turn, price, volume, bid.order_id, ask.order_id))
+
+    current = None
+    for event, side, turn, tick, order_id, owner, price, volume in events.tolist():
+        if (tick, turn) != current:
+            # orders of a turn are matched before the next turn starts
+            if current is not None:
+                match(*current)
+            current = (tick, turn)
+
+        if event == ADD:
+            if owner not in owners:
+                owners[owner] = types.SimpleNamespace(name=owner, var=types.SimpleNamespace(active_orders=[]))
+            add = orderbook.add_bid if side == BID else orderbook.add_ask
+            order = add(price, volume, owners[owner])
+            order.order_id = order_id
+            orders[order_id] = order
+        elif event == CANCEL:
+            orderbook.cancel_order(orders.pop(order_id))
+        elif event == MATCH:
+            match(tick, turn)
+        elif event == END_TICK:
+            match(tick, turn)
+            orderbook.cleanse_book()
+            current = None
+
+    return orderbook, np.array(tape, dtype=TAPE_DTYPE)
+
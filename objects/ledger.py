@@ -0,0 +1,191 @@
+"""
+Event-sourced money, stocks and wealth histories of traders.
+
+Instead of appending the money, stocks and wealth of every trader every tick, a balance is stored as its current
+value plus a change log of (period, balance after the change) entries which is only written when a trade settles.
+Logging the balance instead of the difference keeps rebuilt histories identical to appended lists. All histories
+share a Clock which the model advances once per tick. Histories behave like the lists they replace: history[-1] is
+the current value, history[-1] += x logs a change, and history[t] or history[a:b] rebuild past values.
+"""
+import bisect
+import numpy as np
+
+
+class Clock:
+    """Current period shared by the balance histories of all traders and the price at the start of every period"""
+    def __init__(self, price):
+        """
+        Initialize the clock at period 0
+        :param price: float initial price at which wealth is valued
+        """
+        self.period = 0
+        self.prices = [price]
+
+    def advance(self, price):
+        """
+        Start a new period
+        :param price: float price at the start of the new period
+        :return: None
+        """
+        self.period += 1
+        self.prices.append(price)
+
+    def __repr__(self):
+        """
+        :return: String representation of the clock
+        """
+        return 'Clock_{}'.format(self.period)
+
+
+class BalanceHistory:
+    """
+    History of a balance (money or stocks) per period, stored as initial value, current value and change log of the
+    balance at the end of every period in which it changed
+    """
+    def __init__(self, initial, clock):
+        """
+        Initialize the balance history
+        :param initial: float or integer balance in period 0
+        :param clock: object Clock
+        """
+        self.clock = clock
+        self.initial = initial
+        self.current = initial
+        self.periods = []
+        self.balances = []
+
+    def __len__(self):
+        return self.clock.period + 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.to_array()[index].tolist()
+        period = index + len(self) if index < 0 else index
+        if period == self.clock.period:
+            return self.current
+        if not 0 <= period < len(self):
+            raise IndexError("balance history index out of range")
+        changes = bisect.bisect_right(self.periods, period)
+        return self.balances[changes - 1] if changes else self.initial
+
+    def __setitem__(self, index, value):
+        if index not in (-1, self.clock.period):
+            raise IndexError("only the balance of the current period can be changed")
+        if value != self.current:
+            if self.periods and self.periods[-1] == self.clock.period:
+                self.balances[-1] = value
+            else:
+                self.periods.append(self.clock.period)
+                self.balances.append(value)
+        self.current = value
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def to_array(self, start=0, stop=None):
+        """
+        Rebuild the balances of a range of periods
+        :param start: integer first period
+        :param stop: integer period after the last period, None for the current period
+        :return: np.Array of balances
+        """
+        stop = len(self) if stop is None else stop
+        return history_matrix([self], start, stop)[0]
+
+    def __repr__(self):
+        """
+        :return: String representation of the balance history
+        """
+        return 'BalanceHistory_{}'.format(self.current)
+
+
+class WealthHistory:
+    """
+    Wealth per period, derived from the money and stocks histories: the money and stocks at the end of the previous
+    period valued at the price at the start of the period
+    """
+    def __init__(self, money, stocks, initial):
+        """
+        Initialize the wealth history
+        :param money: object BalanceHistory
+        :param stocks: object BalanceHistory
+        :param initial: float wealth in period 0
+        """
+        self.money = money
+        self.stocks = stocks
+        self.initial = initial
+
+    def __len__(self):
+        return len(self.money)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.to_array()[index].tolist()
+        period = index + len(self) if index < 0 else index
+        if not 0 <= period < len(self):
+            raise IndexError("wealth history index out of range")
+        if period == 0:
+            return self.initial
+        return self.money[period - 1] + self.stocks[period - 1] * self.money.clock.prices[period]
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def to_array(self, start=0, stop=None):
+        """
+        Rebuild the wealth of a range of periods
+        :param start: integer first period
+        :param stop: integer period after the last period, None for the current period
+        :return: np.Array of wealth
+        """
+        stop = len(self) if stop is None else stop
+        return wealth_matrix([self], start, stop)[0]
+
+    def __repr__(self):
+        """
+        :return: String representation of the wealth history
+        """
+        return 'WealthHistory_{}'.format(self[-1])
+
+
+def history_matrix(histories, start=0, stop=None):
+    """
+    Rebuild the balances of many histories with the same clock at once
+    :param histories: list of BalanceHistory objects
+    :param start: integer first period
+    :param stop: integer period after the last period, None for the current period
+    :return: np.Array of balances (histories, periods)
+    """
+    stop = histories[0].clock.period + 1 if stop is None else stop
+    rows = np.repeat(np.arange(len(histories)), [len(history.periods) for history in histories])
+    periods = np.array([period for history in histories for period in history.periods], dtype=int)
+    balances = np.array([balance for history in histories for balance in history.balances])
+    initial = np.array([history.initial for history in histories])
+    inside = periods < stop
+
+    # the logged balances are carried forward to the periods without changes
+    matrix = np.empty((len(histories), stop), dtype=np.result_type(initial, balances))
+    logged = np.zeros((len(histories), stop), dtype=bool)
+    matrix[:, 0], logged[:, 0] = initial, True
+    matrix[rows[inside], periods[inside]] = balances[inside]
+    logged[rows[inside], periods[inside]] = True
+    last_logged = np.maximum.accumulate(np.where(logged, np.arange(stop), 0), axis=1)
+    return matrix[np.arange(len(histories))[:, None], last_logged][:, start:stop]
+
+
+def wealth_matrix(histories, start=0, stop=None):
+    """
+    Rebuild the wealth of many wealth histories with the same clock at once
+    :param histories: list of WealthHistory objects
+    :param start: integer first period
+    :param stop: integer period after the last period, None for the current period
+    :return: np.Array of wealth (histories, periods)
+    """
+    clock = histories[0].money.clock
+    stop = clock.period + 1 if stop is None else stop
+    money = history_matrix([history.money for history in histories], 0, stop)
+    stocks = history_matrix([history.stocks for history in histories], 0, stop)
+    wealth = np.empty(money.shape)
+    wealth[:, 0] = [history.initial for history in histories]
+    wealth[:, 1:] = money[:, :-1] + stocks[:, :-1] * np.array(clock.prices[1:stop])
+    return wealth[:, start:stop]
@@ -0,0 +1,97 @@
+from objects.trader import Trader
+
+
+def best_quotes(market_maker, orderbook, mid_price):
+    """
+    Join the current highest bid and lowest ask
+    :param market_maker: object MarketMaker
+    :param orderbook: object Order book
+    :param mid_price: float current mid price
+    :return: float bid price, float ask price
+    """
+    return orderbook.highest_bid_price, orderbook.lowest_ask_price
+
+
+def inventory_skew_quotes(market_maker, orderbook, mid_price):
+    """
+    Quote symmetrically around the mid price and shift both quotes down when the inventory is above its target
+    (and up when below), so that the market maker trades back towards its target inventory
+    :param market_maker: object MarketMaker
+    :param orderbook: object Order book
+    :param mid_price: float current mid price
+    :return: float bid price, float ask price
+    """
+    inventory_deviation = (market_maker.var.stocks[-1] - market_maker.target_inventory) / max(market_maker.target_inventory, 1)
+    center = mid_price * (1 - market_maker.inventory_skew * inventory_deviation)
+    return center * (1 - market_maker.half_spread), center * (1 + market_maker.half_spread)
+
+
+QUOTE_RULES = {'best': best_quotes, 'inventory_skew': inventory_skew_quotes}
+
+
+class MarketMaker(Trader):
+    """
+    Trader which continuously quotes a bid and an ask. Every turn its previous quotes are replaced, so it never has
+    more than one bid and one ask in the book. Its inventory, money, wealth and profit are tracked over time.
+    """
+    def __init__(self, name, variables, parameters, expectations, quote_rule='best', quote_volume=1,
+                 half_spread=0.001, inventory_skew=0.0):
+        """
+        Initialize market maker class
+        :param name: integer number which will be the name of the market maker
+        :param variables: object TraderVariables
+        :param parameters: object TraderParameters
+        :param expectations: object TraderExpectations
+        :param quote_rule: string key of QUOTE_RULES which determines the quoted prices
+        :param quote_volume: integer volume of both quotes
+        :param half_spread: float relative distance of the quotes to their center (inventory_skew rule)
+        :param inventory_skew: float relative quote shift per relative inventory deviation (inventory_skew rule)
+        """
+        super().__init__(name, variables, parameters, expectations)
+        if quote_rule not in QUOTE_RULES:
+            raise ValueError("unknown quote_rule")
+        self.quote_rule = quote_rule
+        self.quote_volume = quote_volume
+        self.half_spread = half_spread
+        self.inventory_skew = inventory_skew
+        self.target_inventory = variables.stocks[0]
+        self.bid = None
+        self.ask = None
+        self.profit = [0.0]
+
+    def __repr__(self):
+        """
+        :return: String representation of the market maker
+        """
+        return 'MarketMaker' + str(self.name)
+
+    def quote(self, orderbook, mid_price):
+        """
+        Replace the previous quotes by a new bid and ask whenever money and inventory permit
+        :param orderbook: object Order book
+        :param mid_price: float current mid price
+        :return: None
+        """
+        # quotes which have been (partially) filled are no longer in the book, cancelling those has no effect
+        for order in [self.bid, self.ask]:
+            if order is not None:
+                orderbook.cancel_order(order)
+        self.bid, self.ask = None, None
+
+        bid_price, ask_price = QUOTE_RULES[self.quote_rule](self, orderbook, mid_price)
+        if self.var.money[-1] >= bid_price * self.quote_volume:
+            self.bid = orderbook.add_bid(bid_price, self.quote_volume, self)
+        if self.var.stocks[-1] >= self.quote_volume:
+            self.ask = orderbook.add_ask(ask_price, self.quote_volume, self)
+        self.var.active_orders = [order for order in [self.bid, self.ask] if order is not None]
+
+    def update_history(self, price):
+        """
+        Start a new period in the money, stocks, wealth and profit history
+        :param price: float price at which the inventory is valued
+        :return: None
+        """
+        self.var.money.append(self.var.money[-1])
+        self.var.stocks.append(self.var.stocks[-1])
+        self.var.wealth.append(self.var.money[-1] + self.var.stocks[-1] * price)
+        self.profit.append(self.var.wealth[-1] - self.var.wealth[0])
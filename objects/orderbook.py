@@ -1,9 +1,13 @@
 """Limit orderbook updated from Schasfoort & Stockermans 2017"""
 
 import bisect
+import itertools
 import operator
 import numpy as np
 
+# event types of the optional order event log, see objects.event_log
+ADD, CANCEL, MATCH, EXPIRE, END_TICK = range(5)
+
 
 class LimitOrderBook:
     """
@@ -14,17 +18,19 @@ class LimitOrderBook:
     1. A bids book which contains orders of type 'bid'
     2. An asks book which contains orders of type 'ask'
     """
-    def __init__(self, last_price, spread_max, max_return_interval, order_expiration):
+    def __init__(self, last_price, spread_max, max_return_interval, order_expiration, tick_size=None):
         """
         Initialize order-book class
         :param last_price: float initial price
         :param spread_max: float initial spread used to initialize highest bid and ask
         :param max_return_interval: integer length of initial returns series
         :param order_expiration: integer amount of periods after which orders are deleted from the book
+        :param tick_size: optional float price grid, order prices are rounded to the nearest multiple
         """
         self.bids = []
         self.asks = []
         self.order_expiration = order_expiration
+        self.tick_size = tick_size
         self.highest_bid_price = last_price - (spread_max / 2)
         self.lowest_ask_price = last_price + (spread_max / 2)
         self.tick_close_price = [np.mean([self.highest_bid_price, self.lowest_ask_price])]
@@ -44,6 +50,21 @@ class LimitOrderBook:
         self.sentiment = []
         self.sentiment_history = []
 
+        # aggregated volume per price level and the sorted (low-high) price levels of both books
+        self.bid_depth = {}
+        self.ask_depth = {}
+        self.bid_levels = []
+        self.ask_levels = []
+
+        # optional objects.event_log.OrderEventLog, the model sets the current turn, ticks end at cleanse_book
+        self.event_log = None
+        self.order_ids = itertools.count()
+        self.current_tick = 0
+        self.current_turn = 0
+
+        # resting orders per tick at whose end they expire, so cleansing only touches the expiring orders
+        self.expiry_buckets = {}
+
     def add_bid(self, price, volume, agent):
         """
         Add a bid to the (price low-high, age young-old) sorted bids book
@@ -52,8 +73,14 @@ class LimitOrderBook:
         :param agent: object agent which issues the bid
         :return: object bid
         """
-        bid = Order(order_type='b', owner=agent, price=price, volume=volume)
+        if self.tick_size is not None:
+            price = self.round_price(price)
+        bid = Order(order_type='b', owner=agent, price=price, volume=volume, order_id=next(self.order_ids))
         bisect.insort_left(self.bids, bid)
+        self.update_depth('b', price, volume)
+        self.register_expiry(bid)
+        if self.event_log is not None:
+            self.event_log.write(ADD, bid, self.current_tick, self.current_turn, price, volume)
         self.update_bid_ask_spread('bid')
         return bid
 
@@ -65,20 +92,98 @@ class LimitOrderBook:
         :param agent: object agent which issues the ask
         :return: object ask
         """
-        ask = Order(order_type='a', owner=agent, price=price, volume=volume)
+        if self.tick_size is not None:
+            price = self.round_price(price)
+        ask = Order(order_type='a', owner=agent, price=price, volume=volume, order_id=next(self.order_ids))
         bisect.insort_right(self.asks, ask)
+        self.update_depth('a', price, volume)
+        self.register_expiry(ask)
+        if self.event_log is not None:
+            self.event_log.write(ADD, ask, self.current_tick, self.current_turn, price, volume)
         self.update_bid_ask_spread('ask')
         return ask
 
+    def price_tick(self, price):
+        """
+        :param price: float price
+        :return: integer number of the nearest tick of the price grid
+        """
+        return int(round(price / self.tick_size))
+
+    def round_price(self, price):
+        """
+        :param price: float price
+        :return: float nearest price on the grid of tick_size
+        """
+        return self.price_tick(price) * self.tick_size
+
     def cancel_order(self, order):
         """
-        Removes a particular order from the order book
+        Removes a particular order from the order book, orders which are no longer in the book are ignored
+        :param order: class Order
+        :return: None
+        """
+        if self.remove_order(order):
+            self.unregister_expiry(order)
+            if self.event_log is not None:
+                self.event_log.write(CANCEL, order, self.current_tick, self.current_turn, order.price, order.volume)
+
+    def remove_order(self, order):
+        """
+        Remove a resting order from its book and from the depth
+        :param order: class Order
+        :return: boolean whether the order was in the book
+        """
+        book = self.bids if order.order_type == 'b' else self.asks
+        # orders are sorted by price, so only orders with the same price have to be compared
+        index = bisect.bisect_left(book, order)
+        while index < len(book) and book[index].price == order.price:
+            if book[index] is order:
+                del book[index]
+                self.update_depth(order.order_type, order.price, -order.volume)
+                return True
+            index += 1
+        return False
+
+    def clear(self):
+        """
+        Remove all resting orders from the book, its depth and the expiry buckets without recording events, e.g. to
+        release a simulated book
+        :return: None
+        """
+        del self.bids[:]
+        del self.asks[:]
+        self.bid_depth.clear()
+        self.ask_depth.clear()
+        del self.bid_levels[:]
+        del self.ask_levels[:]
+        self.expiry_buckets.clear()
+
+    def register_expiry(self, order):
+        """
+        Add a new order to the bucket of the tick at whose end it expires, after order_expiration cleanses
+        :param order: class Order
+        :return: None
+        """
+        order.tick = self.current_tick
+        self.expiry_buckets.setdefault(self.current_tick + self.order_expiration, {})[order] = None
+
+    def unregister_expiry(self, order):
+        """
+        Remove an order which left the book from its expiry bucket
         :param order: class Order
         :return: None
         """
-        for book in [self.bids, self.asks]:
-            if order in book:
-                book.remove(order)
+        bucket = self.expiry_buckets.get(order.tick + self.order_expiration)
+        if bucket is not None:
+            bucket.pop(order, None)
+
+    def order_age(self, order):
+        """
+        :param order: class Order
+        :return: integer amount of times the book has been cleansed since the order was added
+        """
+        return self.current_tick - order.tick
 
     def cleanse_book(self):
         """
@@ -99,12 +204,11 @@ class LimitOrderBook:
         self.sentiment_history.append(self.sentiment)
         self.sentiment = []
 
-        # increase the age of all orders by 1
-        for book in [self.bids, self.asks]:
-            for order in book:
-                order.age += 1
-                if order.age > self.order_expiration:
-                    book.remove(order)
+        # remove the orders which reach an age above order_expiration, only they are touched
+        for order in self.expiry_buckets.pop(self.current_tick, {}):
+            self.remove_order(order)
+            if self.event_log is not None:
+                self.event_log.write(EXPIRE, order, self.current_tick, self.current_turn, order.price, order.volume)
 
         # update current highest bid and lowest ask
         for order_type in ['bid', 'ask']:
@@ -116,6 +220,11 @@ class LimitOrderBook:
         # update returns
         self.returns.append((self.tick_close_price[-1] - self.tick_close_price[-2]) / self.tick_close_price[-2])
 
+        if self.event_log is not None:
+            self.event_log.write(END_TICK, None, self.current_tick, self.current_turn, self.tick_close_price[-1], 0)
+        self.current_tick += 1
+        self.current_turn = 0
+
     def match_orders(self):
         """
         Return a price, volume, bid and ask and delete them from the order book if volume of either reaches zero
@@ -132,11 +241,17 @@ class LimitOrderBook:
             price = winning_ask.price
             # The volume is the minimum of the bid and ask
             min_index, volume = min(enumerate([winning_bid.volume, winning_ask.volume]), key=operator.itemgetter(1))
+            if self.event_log is not None:
+                for order in [winning_bid, winning_ask]:
+                    self.event_log.write(MATCH, order, self.current_tick, self.current_turn, price, volume)
+            self.update_depth('b', winning_bid.price, -volume)
+            self.update_depth('a', winning_ask.price, -volume)
             # both bid and ask are then reduced by that volume, if 0, then removed
             if winning_bid.volume == winning_ask.volume:
                 # notify owner it no longer has an order in the market
                 for order in [winning_bid, winning_ask]:
                     order.owner.var.active_orders = []
+                    self.unregister_expiry(order)
                 # remove these elements from list
                 del self.bids[-1]
                 del self.asks[0]
@@ -150,11 +265,13 @@ class LimitOrderBook:
                 # delete the empty bid or ask
                 if min_index == 0:
                     self.bids[-1].owner.var.active_orders = []
+                    self.unregister_expiry(self.bids[-1])
                     del self.bids[-1]
                     # update current highest bid
                     self.update_bid_ask_spread('bid')
                 else:
                     self.asks[0].owner.var.active_orders = []
+                    self.unregister_expiry(self.asks[0])
                     del self.asks[0]
                     # update current lowest ask
                     self.update_bid_ask_spread('ask')
@@ -163,6 +280,61 @@ class LimitOrderBook:
 
             return price, volume, winning_bid, winning_ask
 
+    def update_depth(self, order_type, price, volume):
+        """
+        Change the aggregated volume of a price level, levels without volume are removed
+        :param order_type: string 'b' or 'a'
+        :param price: float price of the level
+        :param volume: integer volume added to the level, negative to remove volume
+        :return: None
+        """
+        depth, levels = (self.bid_depth, self.bid_levels) if order_type == 'b' else (self.ask_depth, self.ask_levels)
+        if price in depth:
+            depth[price] += volume
+            if depth[price] <= 0:
+                del depth[price]
+                del levels[bisect.bisect_left(levels, price)]
+        elif volume > 0:
+            depth[price] = volume
+            bisect.insort(levels, price)
+
+    def depth(self, levels=5):
+        """
+        Aggregated volume of the best price levels of both books, missing levels have price nan and volume 0
+        :param levels: integer amount of price levels per side
+        :return: np.Arrays of length levels: bid prices (high-low), bid volumes, ask prices (low-high), ask volumes
+        """
+        bid_prices = np.full(levels, np.nan)
+        ask_prices = np.full(levels, np.nan)
+        bid_volumes = np.zeros(levels)
+        ask_volumes = np.zeros(levels)
+
+        best_bids = self.bid_levels[:-levels - 1:-1]
+        best_asks = self.ask_levels[:levels]
+        bid_prices[:len(best_bids)] = best_bids
+        ask_prices[:len(best_asks)] = best_asks
+        bid_volumes[:len(best_bids)] = [self.bid_depth[price] for price in best_bids]
+        ask_volumes[:len(best_asks)] = [self.ask_depth[price] for price in best_asks]
+        return bid_prices, bid_volumes, ask_prices, ask_volumes
+
+    def cumulative_depth(self, levels=5):
+        """
+        :param levels: integer amount of price levels per side
+        :return: np.Arrays of length levels: cumulative bid volume and cumulative ask volume from the best price out
+        """
+        bid_prices, bid_volumes, ask_prices, ask_volumes = self.depth(levels)
+        return np.cumsum(bid_volumes), np.cumsum(ask_volumes)
+
+    def order_imbalance(self, levels=5):
+        """
+        :param levels: integer amount of price levels per side
+        :return: float (bid volume - ask volume) / (bid volume + ask volume) of the best levels, 0 for an empty book
+        """
+        bid_volume, ask_volume = [cumulative[-1] for cumulative in self.cumulative_depth(levels)]
+        if bid_volume + ask_volume == 0:
+            return 0.0
+        return (bid_volume - ask_volume) / (bid_volume + ask_volume)
+
     def update_bid_ask_spread(self, order_type):
         """
         Update the current highest bid or lowest ask and store previous values
@@ -190,12 +362,13 @@ class LimitOrderBook:
 
 class Order:
     """The order class can represent both bid or ask type orders"""
-    def __init__(self, order_type, owner, price, volume):
+    def __init__(self, order_type, owner, price, volume, order_id=None):
         self.order_type = order_type
         self.owner = owner
         self.price = price
         self.volume = volume
-        self.age = 0
+        self.tick = None
+        self.order_id = order_id
 
     def __lt__(self, other):
         """Allows comparison to other orders based on price"""
@@ -205,4 +378,4 @@ class Order:
         """
         :return: String representation of the order
         """
-        return 'Order_p={}_t={}_o={}_a={}'.format(self.price, self.order_type, self.owner, self.age)
+        return 'Order_p={}_t={}_o={}_tick={}'.format(self.price, self.order_type, self.owner, self.tick)
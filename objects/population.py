@@ -0,0 +1,91 @@
+import numpy as np
+
+
+class Population:
+    """
+    Holds the parameters and strategy weights of all traders as arrays, indexed by trader name,
+    so that expectations and orders can be calculated for a block of traders at once
+    """
+    def __init__(self, traders, record_history=False):
+        """
+        Initialize the population arrays from the trader objects
+        :param traders: list of Trader objects, position in the list equals the trader name
+        :param record_history: boolean whether the strategy weights and hypothetical portfolios are recorded every
+        learning step, otherwise only their final values are written to the traders
+        """
+        self.size = len(traders)
+        # one array per weight_<strategy> history of the traders, e.g. weight_fundamentalist
+        self.weight_names = [name for name in vars(traders[0].var) if name.startswith('weight_')]
+        for name in self.weight_names:
+            setattr(self, name, np.array([getattr(t.var, name)[-1] for t in traders], dtype=float))
+        self.horizon = np.array([t.par.horizon for t in traders], dtype=int)
+        self.risk_aversion = np.array([t.par.risk_aversion for t in traders], dtype=float)
+        self.learning_ability = np.array([t.par.learning_ability for t in traders], dtype=float)
+        self.spread = np.array([t.par.spread for t in traders], dtype=float)
+        self.momentum_lookback = np.array([t.par.momentum_lookback for t in traders], dtype=int)
+
+        # portfolio which follows a candidate strategy, used by the strategy learning step
+        self.candidate_weights = self.strategy_weights()
+        self.hypothetical_money = np.array([t.var.hypothetical_money[-1] for t in traders], dtype=float)
+        self.hypothetical_stocks = np.array([t.var.hypothetical_stocks[-1] for t in traders], dtype=float)
+        self.hypothetical_wealth = np.array([t.var.hypothetical_wealth[-1] for t in traders], dtype=float)
+        self.record_history = record_history
+        self.weight_history = []
+        self.hypothetical_history = []
+
+    def strategy_weights(self, rows=None):
+        """
+        :param rows: optional np.Array of trader names, by default all traders
+        :return: np.Array (traders, strategies) of strategy weights in the order of weight_names
+        """
+        if rows is None:
+            return np.column_stack([getattr(self, name) for name in self.weight_names])
+        return np.column_stack([getattr(self, name)[rows] for name in self.weight_names])
+
+    def set_strategy_weights(self, weights):
+        """
+        :param weights: np.Array (traders, strategies) of strategy weights in the order of weight_names
+        :return: None
+        """
+        for name, column in zip(self.weight_names, weights.T):
+            setattr(self, name, np.array(column))
+
+    def record(self):
+        """Store the current strategy weights and hypothetical portfolios if the history is recorded"""
+        if not self.record_history:
+            return
+        self.weight_history.append(self.strategy_weights())
+        self.hypothetical_history.append(np.column_stack([self.hypothetical_money, self.hypothetical_stocks,
+                                                          self.hypothetical_wealth]))
+
+    def update_traders(self, traders):
+        """
+        Write the recorded weights and hypothetical portfolios to the histories of the trader objects. Without a
+        recorded history only the final weights and hypothetical portfolios are appended to the initial values.
+        :param traders: list of Trader objects, position in the list equals the trader name
+        :return: None
+        """
+        if not self.record_history:
+            names = self.weight_names + ['hypothetical_money', 'hypothetical_stocks', 'hypothetical_wealth']
+            for name in names:
+                for trader, value in zip(traders, getattr(self, name).tolist()):
+                    setattr(trader.var, name, getattr(trader.var, name)[:1] + [value])
+            return
+        if not self.weight_history:
+            return
+        weights = np.transpose(self.weight_history, (1, 2, 0)).tolist()
+        hypothetical = np.transpose(self.hypothetical_history, (1, 2, 0)).tolist()
+        for trader, trader_weights, trader_hypothetical in zip(traders, weights, hypothetical):
+            for name, history in zip(self.weight_names, trader_weights):
+                setattr(trader.var, name, getattr(trader.var, name)[:1] + history)
+            trader.var.hypothetical_money = trader.var.hypothetical_money[:1] + trader_hypothetical[0]
+            trader.var.hypothetical_stocks = trader.var.hypothetical_stocks[:1] + trader_hypothetical[1]
+            trader.var.hypothetical_wealth = trader.var.hypothetical_wealth[:1] + trader_hypothetical[2]
+        self.weight_history = []
+        self.hypothetical_history = []
+
+    def __repr__(self):
+        """
+        :return: String representation of the population
+        """
+        return 'Population' + str(self.size)
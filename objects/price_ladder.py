@@ -0,0 +1,416 @@
+"""
+Order book on a tick-size price grid, backed by a dense ladder of volumes per price level.
+
+Resting volume per price tick around the mid price is held in NumPy arrays of a fixed width, so the best bid and ask
+after a level empties and the depth of the book are found with array searches instead of sorted Python lists. The
+rare levels outside of the window are held in dictionaries, so a far-off order costs no memory, and the window is
+moved to the mid price at the end of a tick when the mid price leaves its central half. Orders of a level wait in a
+FIFO queue. With the same price-time priority as LimitOrderBook, a PriceLadderOrderBook and a LimitOrderBook with the
+same tick_size produce the same trades.
+"""
+import collections
+import collections.abc
+import operator
+import numpy as np
+from objects.orderbook import LimitOrderBook, Order, ADD, MATCH
+
+# largest default amount of levels of the dense window, 2 MB per side
+MAX_LADDER_WIDTH = 1 << 18
+
+
+def next_level(volumes, start, step):
+    """
+    Find the nearest level with volume, searching windows of doubling size
+    :param volumes: np.Array of volume per level
+    :param start: integer index at which the search starts (inclusive)
+    :param step: integer direction of the search, 1 for higher and -1 for lower levels
+    :return: integer index of the level or None if there is none
+    """
+    window = 64
+    while 0 <= start < len(volumes):
+        if step > 0:
+            hits = np.flatnonzero(volumes[start:start + window])
+            if len(hits):
+                return start + hits[0]
+            start += window
+        else:
+            low = max(start - window + 1, 0)
+            hits = np.flatnonzero(volumes[low:start + 1])
+            if len(hits):
+                return low + hits[-1]
+            start = low - 1
+        window *= 2
+    return None
+
+
+class LadderOrders(collections.abc.Sequence):
+    """
+    Read-only view of the resting orders of one side of a PriceLadderOrderBook, in the order of LimitOrderBook.bids
+    or asks. The book keeps its length, iterating walks the occupied levels and orders only change through the book,
+    so writes (e.g. del book.bids[:]) raise a TypeError instead of changing a copy.
+    """
+    def __init__(self, queues, young_first):
+        """
+        Initialize the view
+        :param queues: dictionary of FIFO queues of orders per price tick of the side
+        :param young_first: boolean whether orders at equal prices are listed young-old (bids) or old-young (asks)
+        """
+        self.queues = queues
+        self.young_first = young_first
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for tick in sorted(self.queues):
+            yield from reversed(self.queues[tick]) if self.young_first else self.queues[tick]
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    def __repr__(self):
+        """
+        :return: String representation of the view
+        """
+        return 'LadderOrders_{}'.format(self.size)
+
+
+class PriceLadderOrderBook(LimitOrderBook):
+    """
+    Limit order book with a dense price ladder: a volume per price tick for both sides in a window around the mid
+    price, a dictionary of the volumes of levels outside of the window and a FIFO queue of orders per occupied level
+    """
+    def __init__(self, last_price, spread_max, max_return_interval, order_expiration, tick_size, ladder_width=None):
+        """
+        Initialize the price ladder order book
+        :param last_price: float initial price
+        :param spread_max: float initial spread used to initialize highest bid and ask
+        :param max_return_interval: integer length of initial returns series
+        :param order_expiration: integer amount of periods after which orders are deleted from the book
+        :param tick_size: float price grid, order prices are rounded to the nearest multiple
+        :param ladder_width: optional integer amount of levels of the dense window, by default the window covers
+        prices from 0.5 to 1.5 times the initial price with at most MAX_LADDER_WIDTH levels
+        """
+        super().__init__(last_price, spread_max, max_return_interval, order_expiration, tick_size)
+        # the depth is held by the ladder instead of dictionaries of price levels
+        del self.bid_depth, self.ask_depth, self.bid_levels, self.ask_levels
+
+        center = self.price_tick(last_price)
+        width = ladder_width if ladder_width is not None else min(max(center, 2), MAX_LADDER_WIDTH)
+        self.base = center - width // 2
+        self.bid_volume = np.zeros(width, dtype=np.int64)
+        self.ask_volume = np.zeros(width, dtype=np.int64)
+        # volume per price tick of the occupied levels outside of the window
+        self.bid_outside = {}
+        self.ask_outside = {}
+        # FIFO queue of resting orders per occupied price tick, oldest first
+        self.bid_queues = {}
+        self.ask_queues = {}
+        # bids price low-high and at equal prices young-old, asks price low-high and at equal prices old-young
+        self.bids = LadderOrders(self.bid_queues, True)
+        self.asks = LadderOrders(self.ask_queues, False)
+        self.best_bid = None
+        self.best_ask = None
+
+    def recenter(self, tick):
+        """
+        Move the window of the ladder so that it is centered on a price tick, levels which leave the window are moved
+        to the dictionaries of outside levels and outside levels which enter it to the arrays
+        :param tick: integer price tick of the new center
+        :return: None
+        """
+        width = len(self.bid_volume)
+        base = tick - width // 2
+        for name, outside in [('bid_volume', self.bid_outside), ('ask_volume', self.ask_outside)]:
+            volumes = getattr(self, name)
+            for index in np.flatnonzero(volumes):
+                outside[int(index) + self.base] = int(volumes[index])
+            volumes[:] = 0
+            for level in [level for level in outside if 0 <= level - base < width]:
+                volumes[level - base] = outside.pop(level)
+        self.base = base
+
+    def cleanse_book(self):
+        """
+        End the period as LimitOrderBook.cleanse_book and move the window of the ladder to the close price if it
+        left the central half of the window
+        :return: None
+        """
+        super().cleanse_book()
+        width = len(self.bid_volume)
+        offset = self.price_tick(self.tick_close_price[-1]) - self.base
+        if not width // 4 <= offset < width - width // 4:
+            self.recenter(self.price_tick(self.tick_close_price[-1]))
+
+    def add_bid(self, price, volume, agent):
+        """
+        Add a bid to the queue of its price level
+        :param price: float price of the bid, rounded to the grid
+        :param volume: integer volume of the bid
+        :param agent: object agent which issues the bid
+        :return: object bid
+        """
+        tick = self.price_tick(price)
+        bid = Order(order_type='b', owner=agent, price=tick * self.tick_size, volume=volume,
+                    order_id=next(self.order_ids))
+        bid.tick_level = tick
+        self.bid_queues.setdefault(tick, collections.deque()).append(bid)
+        self.bids.size += 1
+        if self.best_bid is None or tick > self.best_bid:
+            self.best_bid = tick
+        self.change_volume('b', tick, volume)
+        self.register_expiry(bid)
+        if self.event_log is not None:
+            self.event_log.write(ADD, bid, self.current_tick, self.current_turn, bid.price, volume)
+        self.update_bid_ask_spread('bid')
+        return bid
+
+    def add_ask(self, price, volume, agent):
+        """
+        Add an ask to the queue of its price level
+        :param price: float price of the ask, rounded to the grid
+        :param volume: integer volume of the ask
+        :param agent: object agent which issues the ask
+        :return: object ask
+        """
+        tick = self.price_tick(price)
+        ask = Order(order_type='a', owner=agent, price=tick * self.tick_size, volume=volume,
+                    order_id=next(self.order_ids))
+        ask.tick_level = tick
+        self.ask_queues.setdefault(tick, collections.deque()).append(ask)
+        self.asks.size += 1
+        if self.best_ask is None or tick < self.best_ask:
+            self.best_ask = tick
+        self.change_volume('a', tick, volume)
+        self.register_expiry(ask)
+        if self.event_log is not None:
+            self.event_log.write(ADD, ask, self.current_tick, self.current_turn, ask.price, volume)
+        self.update_bid_ask_spread('ask')
+        return ask
+
+    def side(self, order):
+        """
+        :param order: class Order
+        :return: object LadderOrders of the side of the order
+        """
+        return self.bids if order.order_type == 'b' else self.asks
+
+    def dequeue(self, order):
+        """
+        Remove the oldest order of its level and find the new best price if the level empties
+        :param order: class Order at the front of its queue
+        :return: None
+        """
+        queues = self.bid_queues if order.order_type == 'b' else self.ask_queues
+        queue = queues[order.tick_level]
+        queue.popleft()
+        self.side(order).size -= 1
+        if not queue:
+            self.level_emptied(order)
+
+    def level_emptied(self, order):
+        """
+        Delete the empty queue of the level of an order and find the new best price if it was the best level
+        :param order: class Order which was the last order of its level
+        :return: None
+        """
+        queues = self.bid_queues if order.order_type == 'b' else self.ask_queues
+        del queues[order.tick_level]
+        if order.order_type == 'b' and order.tick_level == self.best_bid:
+            self.best_bid = self.next_best(self.bid_volume, self.bid_outside, self.best_bid, -1) \
+                if self.bid_queues else None
+        elif order.order_type == 'a' and order.tick_level == self.best_ask:
+            self.best_ask = self.next_best(self.ask_volume, self.ask_outside, self.best_ask, 1) \
+                if self.ask_queues else None
+
+    def occupied_levels(self, volumes, outside, best, step, levels=None):
+        """
+        Occupied price ticks of a side from its best price outwards, in the window and outside of it
+        :param volumes: np.Array of volume per level of the window
+        :param outside: dictionary of volume per price tick outside of the window
+        :param best: integer price tick at which the search starts (inclusive)
+        :param step: integer direction of the search, -1 for bids and 1 for asks
+        :param levels: optional integer amount of levels, by default only the nearest level is searched
+        :return: list of integer price ticks, nearest first
+        """
+        width = len(volumes)
+        start = min(best - self.base, width - 1) if step < 0 else max(best - self.base, 0)
+        occupied = []
+        if 0 <= start < width:
+            if levels is None:
+                index = next_level(volumes, start, step)
+                occupied = [] if index is None else [index + self.base]
+            else:
+                # widen the window from the best level until it holds enough occupied levels
+                window = 64 * levels
+                while True:
+                    if step > 0:
+                        found = start + np.flatnonzero(volumes[start:start + window])
+                    else:
+                        low = max(start - window + 1, 0)
+                        found = low + np.flatnonzero(volumes[low:start + 1])[::-1]
+                    if len(found) >= levels or window >= width:
+                        break
+                    window *= 2
+                occupied = (found[:levels] + self.base).tolist()
+        if outside:
+            # the few levels outside of the window are merged in
+            occupied += [tick for tick in outside if (tick - best) * step >= 0]
+            occupied.sort(key=lambda tick: tick * step)
+        return occupied[:1 if levels is None else levels]
+
+    def next_best(self, volumes, outside, best, step):
+        """
+        :param volumes: np.Array of volume per level of the window
+        :param outside: dictionary of volume per price tick outside of the window
+        :param best: integer price tick of the emptied best level
+        :param step: integer direction of the search, -1 for bids and 1 for asks
+        :return: integer price tick of the new best level or None if the side is empty
+        """
+        occupied = self.occupied_levels(volumes, outside, best, step)
+        return occupied[0] if occupied else None
+
+    def remove_order(self, order):
+        """
+        Remove a resting order from its level
+        :param order: class Order
+        :return: boolean whether the order was in the book
+        """
+        queues = self.bid_queues if order.order_type == 'b' else self.ask_queues
+        queue = queues.get(order.tick_level)
+        if queue is None:
+            return False
+        try:
+            # orders have no equality of their own, so only this order is removed
+            queue.remove(order)
+        except ValueError:
+            return False
+        self.side(order).size -= 1
+        self.change_volume(order.order_type, order.tick_level, -order.volume)
+        if not queue:
+            self.level_emptied(order)
+        return True
+
+    def clear(self):
+        """
+        Remove all resting orders from the queues, the ladder and the expiry buckets without recording events
+        :return: None
+        """
+        self.bid_queues.clear()
+        self.ask_queues.clear()
+        self.bids.size = self.asks.size = 0
+        self.bid_volume[:] = 0
+        self.ask_volume[:] = 0
+        self.bid_outside.clear()
+        self.ask_outside.clear()
+        self.best_bid = self.best_ask = None
+        self.expiry_buckets.clear()
+
+    def match_orders(self):
+        """
+        Return a price, volume, bid and ask and delete them from the order book if volume of either reaches zero
+        :return: None if the best bid is below the best ask
+        """
+        if self.best_bid is None or self.best_ask is None or self.best_bid < self.best_ask:
+            return None
+
+        winning_bid = self.bid_queues[self.best_bid][0]
+        winning_ask = self.ask_queues[self.best_ask][0]
+        price = winning_ask.price
+        min_index, volume = min(enumerate([winning_bid.volume, winning_ask.volume]), key=operator.itemgetter(1))
+        if self.event_log is not None:
+            for order in [winning_bid, winning_ask]:
+                self.event_log.write(MATCH, order, self.current_tick, self.current_turn, price, volume)
+        self.change_volume('b', winning_bid.tick_level, -volume)
+        self.change_volume('a', winning_ask.tick_level, -volume)
+        if winning_bid.volume == winning_ask.volume:
+            for order in [winning_bid, winning_ask]:
+                order.owner.var.active_orders = []
+                self.unregister_expiry(order)
+                self.dequeue(order)
+            for order_type in ['bid', 'ask']:
+                self.update_bid_ask_spread(order_type)
+        else:
+            winning_ask.volume -= volume
+            winning_bid.volume -= volume
+            filled, order_type = (winning_bid, 'bid') if min_index == 0 else (winning_ask, 'ask')
+            filled.owner.var.active_orders = []
+            self.unregister_expiry(filled)
+            self.dequeue(filled)
+            self.update_bid_ask_spread(order_type)
+        self.transaction_prices.append(price)
+        self.transaction_volumes.append(volume)
+
+        return price, volume, winning_bid, winning_ask
+
+    def update_depth(self, order_type, price, volume):
+        """
+        Change the volume of a price level
+        :param order_type: string 'b' or 'a'
+        :param price: float price of the level on the grid
+        :param volume: integer volume added to the level, negative to remove volume
+        :return: None
+        """
+        self.change_volume(order_type, self.price_tick(price), volume)
+
+    def change_volume(self, order_type, tick, volume):
+        """
+        Change the volume of a price level
+        :param order_type: string 'b' or 'a'
+        :param tick: integer price tick of the level
+        :param volume: integer volume added to the level, negative to remove volume
+        :return: None
+        """
+        volumes, outside = (self.bid_volume, self.bid_outside) if order_type == 'b' else \
+            (self.ask_volume, self.ask_outside)
+        index = tick - self.base
+        if 0 <= index < len(volumes):
+            volumes[index] += volume
+        else:
+            outside[tick] = outside.get(tick, 0) + volume
+            if outside[tick] <= 0:
+                del outside[tick]
+
+    def depth(self, levels=5):
+        """
+        Aggregated volume of the best price levels of both books, missing levels have price nan and volume 0
+        :param levels: integer amount of price levels per side
+        :return: np.Arrays of length levels: bid prices (high-low), bid volumes, ask prices (low-high), ask volumes
+        """
+        sides = []
+        for best, volumes, outside, step in [(self.best_bid, self.bid_volume, self.bid_outside, -1),
+                                             (self.best_ask, self.ask_volume, self.ask_outside, 1)]:
+            prices = np.full(levels, np.nan)
+            level_volumes = np.zeros(levels)
+            if best is not None:
+                occupied = self.occupied_levels(volumes, outside, best, step, levels)
+                prices[:len(occupied)] = np.array(occupied) * self.tick_size
+                level_volumes[:len(occupied)] = [volumes[tick - self.base] if 0 <= tick - self.base < len(volumes)
+                                                 else outside[tick] for tick in occupied]
+            sides += [prices, level_volumes]
+        return tuple(sides)
+
+    def update_bid_ask_spread(self, order_type):
+        """
+        Update the current highest bid or lowest ask and store previous values
+        :param order_type: string 'bid' or 'ask'
+        :return:
+        """
+        if ('ask' not in order_type) and ('bid' not in order_type):
+            raise ValueError("unknown order_type")
+
+        if order_type == 'ask' and self.best_ask is not None:
+            self.lowest_ask_price_history.append(self.lowest_ask_price)
+            self.highest_bid_price_history.append(self.highest_bid_price)
+            self.lowest_ask_price = self.best_ask * self.tick_size
+        if order_type == 'bid' and self.best_bid is not None:
+            self.highest_bid_price_history.append(self.highest_bid_price)
+            self.lowest_ask_price_history.append(self.lowest_ask_price)
+            self.highest_bid_price = self.best_bid * self.tick_size
+
+    def __repr__(self):
+        """
+        :return: String representation of the order book object
+        """
+        return "price_ladder_order_book"
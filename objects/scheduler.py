@@ -0,0 +1,72 @@
+import heapq
+import itertools
+import numpy as np
+
+# event kinds
+CLOSE, QUOTE, ACTIVATION = range(3)
+
+
+class EventScheduler:
+    """
+    Priority queue of timed events. Time is measured in ticks, events at the same time are processed in the order
+    in which they were scheduled.
+    """
+    def __init__(self):
+        self.queue = []
+        self.sequence = itertools.count()
+        self.time = 0.
+        self.processed = 0
+
+    def schedule(self, time, kind, target=None):
+        """
+        Add an event
+        :param time: float time of the event
+        :param kind: integer kind of event, e.g. ACTIVATION
+        :param target: optional index of the agent the event applies to
+        :return: None
+        """
+        heapq.heappush(self.queue, (time, next(self.sequence), kind, target))
+
+    def schedule_poisson(self, rate, kind, target=None):
+        """
+        Add an event after an exponentially distributed waiting time, so that events of the same kind and target
+        arrive as a Poisson process
+        :param rate: float expected amount of events per tick
+        :param kind: integer kind of event
+        :param target: optional index of the agent the event applies to
+        :return: None
+        """
+        if rate > 0:
+            self.schedule(self.time + np.random.exponential(1. / rate), kind, target)
+
+    def schedule_poisson_all(self, rate, kind, targets):
+        """
+        Add a Poisson arrival for many targets at once
+        :param rate: float expected amount of events per tick of every target
+        :param kind: integer kind of event
+        :param targets: list of indices of the agents
+        :return: None
+        """
+        if rate > 0:
+            times = self.time + np.random.exponential(1. / rate, len(targets))
+            self.queue.extend((time, next(self.sequence), kind, target) for time, target in zip(times.tolist(), targets))
+            heapq.heapify(self.queue)
+
+    def pop(self):
+        """
+        Remove the next event and advance the time to it
+        :return: float time, integer kind, target of the event
+        """
+        time, _, kind, target = heapq.heappop(self.queue)
+        self.time = time
+        self.processed += 1
+        return time, kind, target
+
+    def __len__(self):
+        return len(self.queue)
+
+    def __repr__(self):
+        """
+        :return: String representation of the scheduler
+        """
+        return 'EventScheduler_t={}_n={}'.format(self.time, len(self.queue))
@@ -1,4 +1,5 @@
 import numpy as np
+from objects.ledger import BalanceHistory, WealthHistory
 
 
 class Trader:
@@ -22,29 +23,39 @@ class Trader:
         """
         return 'Trader' + str(self.name)
 
-    def sell(self, amount, price, respect_stocks=True):
+    def sell(self, amount, price, respect_stocks=True, asset=None):
         """
         Sells `amount` of stocks for a total of `price`
         :param amount: int Number of stocks sold.
         :param price: float Total price for stocks.
+        :param asset: int index of the stock in a multi-asset portfolio, None if the trader holds a single stock
         :return: -
         """
-        if self.var.stocks[-1] < amount and respect_stocks:
-            raise ValueError("not enough stocks to sell this amount")
-        self.var.stocks[-1] -= amount
+        if asset is None:
+            if self.var.stocks[-1] < amount and respect_stocks:
+                raise ValueError("not enough stocks to sell this amount")
+            self.var.stocks[-1] -= amount
+        else:
+            if self.var.stocks[-1][asset] < amount and respect_stocks:
+                raise ValueError("not enough stocks to sell this amount")
+            self.var.stocks[-1][asset] -= amount
         self.var.money[-1] += price
 
-    def buy(self, amount, price, respect_stocks=True):
+    def buy(self, amount, price, respect_stocks=True, asset=None):
         """
         Buys `amount` of stocks for a total of `price`
         :param amount: int number of stocks bought.
         :param price: float total price for stocks.
+        :param asset: int index of the stock in a multi-asset portfolio, None if the trader holds a single stock
         :return: -
         """
         if self.var.money[-1] < price and respect_stocks:
             raise ValueError("not enough money to buy this amount of stocks")
 
-        self.var.stocks[-1] += amount
+        if asset is None:
+            self.var.stocks[-1] += amount
+        else:
+            self.var.stocks[-1][asset] += amount
         self.var.money[-1] -= price
 
 
@@ -53,21 +64,32 @@ class TraderVariables:
     Holds the initial variables for the traders
     """
     def __init__(self, weight_fundamentalist, weight_chartist, weight_random, c_share_strat,
-                 money, stocks, covariance_matrix, init_price):
+                 money, stocks, covariance_matrix, init_price, clock=None, extra_weights=None):
         """
         Initializes variables for the trader
         :param weight_fundamentalist: float fundamentalist expectation component
         :param weight_chartist: float trend-following chartism expectation component
         :param weight_random: float random or heterogeneous expectation component
-        :param weight_mean_reversion: float mean-reversion chartism expectation component
+        :param extra_weights: optional dictionary of weight variable names (e.g. 'weight_mean_reversion') and weights
+        of additional strategies, see functions.strategy_kernels
+        :param clock: optional objects.ledger.Clock, if given money, stocks and wealth are event-sourced histories
+        which only change when the trader trades, instead of lists which are appended every tick
         """
         self.weight_fundamentalist = [weight_fundamentalist]
         self.weight_chartist = [weight_chartist]
         self.weight_random = [weight_random]
+        for name, weight in (extra_weights or {}).items():
+            setattr(self, name, [weight])
         self.c_share_strat = c_share_strat
-        self.money = [money]
-        self.stocks = [stocks]
-        self.wealth = [money + stocks * init_price]
+        self.clock = clock
+        if clock is None:
+            self.money = [money]
+            self.stocks = [stocks]
+            self.wealth = [money + stocks * init_price]
+        else:
+            self.money = BalanceHistory(money, clock)
+            self.stocks = BalanceHistory(stocks, clock)
+            self.wealth = WealthHistory(self.money, self.stocks, money + stocks * init_price)
         self.covariance_matrix = covariance_matrix
         self.active_orders = []
         self.hypothetical_money = [money]
@@ -80,17 +102,19 @@ class TraderParameters:
     Holds the the trader parameters for the distribution model
     """
 
-    def __init__(self, ref_horizon, risk_aversion, learning_ability, max_spread):
+    def __init__(self, ref_horizon, risk_aversion, learning_ability, max_spread, momentum_lookback=5):
         """
         Initializes trader parameters
         :param ref_horizon: integer horizon over which the trader can observe the past
         :param max_spread: Maximum spread at which the trader will submit orders to the book
         :param risk_aversion: float aversion to price volatility
+        :param momentum_lookback: integer amount of ticks over which the momentum strategy measures the trend
         """
         self.horizon = ref_horizon
         self.risk_aversion = risk_aversion
         self.learning_ability = learning_ability
         self.spread = max_spread * np.random.rand()
+        self.momentum_lookback = momentum_lookback
 
 
 class TraderExpectations:
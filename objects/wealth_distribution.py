@@ -0,0 +1,229 @@
+"""Incrementally ranked wealth distribution of the traders"""
+
+import numpy as np
+
+
+class WealthDistribution:
+    """
+    Keeps the traders ranked by wealth (money + stocks * price) and publishes inequality metrics.
+
+    The rank order is repaired locally: a trader whose balance changed is shifted to its new rank,
+    which only touches the traders ranked in between. Since wealth is linear in the price, the
+    current order is valid on a price interval and a new price inside that interval costs nothing.
+
+    The interval is only wide while the traders hold similar amounts of stocks (e.g. at the start
+    of a simulation). Once holdings diverge almost every new price leaves it and set_price re-sorts
+    all traders, so the cost of a tick is O(n log n) in the amount of traders (about 10 ms at 100k
+    traders). An exact Gini coefficient needs the rank of every trader at the new price, so this
+    cost cannot be avoided by another order structure, only by recording the metrics less often.
+    """
+    def __init__(self, money, stocks, price, top_shares=(0.01, 0.1), quantiles=(0.1, 0.5, 0.9)):
+        """
+        Initialize the wealth distribution
+        :param money: list of money per trader, indexed by trader name
+        :param stocks: list of stocks per trader, indexed by trader name
+        :param price: float price at which the stocks are valued
+        :param top_shares: tuple of population fractions for which the wealth share is recorded
+        :param quantiles: tuple of wealth quantiles which are recorded
+        """
+        self.n = len(money)
+        self.money = np.array(money, dtype=float)
+        self.stocks = np.array(stocks, dtype=float)
+        self.price = price
+        self.top_shares = top_shares
+        self.quantiles = quantiles
+
+        # rank ordered (low-high) trader indices and balances
+        self.order = np.arange(self.n)
+        self.rank = np.arange(self.n)
+        self.sorted_money = self.money.copy()
+        self.sorted_stocks = self.stocks.copy()
+        self.coefficients = 2. * np.arange(self.n) - self.n + 1
+
+        # recorded metrics per tick
+        self.gini_history = []
+        self.top_share_history = {share: [] for share in top_shares}
+        self.quantile_history = {quantile: [] for quantile in quantiles}
+        self.resorts = 0
+
+        self.sort()
+
+    @classmethod
+    def from_traders(cls, traders, price, **kwargs):
+        """
+        Initialize the wealth distribution from the current balances of a list of traders
+        :param traders: list of Trader objects, position in the list equals the trader name
+        :param price: float price at which the stocks are valued
+        :return: object WealthDistribution
+        """
+        return cls([t.var.money[-1] for t in traders], [t.var.stocks[-1] for t in traders], price, **kwargs)
+
+    def sort(self):
+        """
+        Re-sort the traders at the current price and recalculate the rank dependent sums
+        :return: None
+        """
+        permutation = np.argsort(self.sorted_money + self.price * self.sorted_stocks, kind='stable')
+        self.order = self.order[permutation]
+        self.rank[self.order] = np.arange(self.n)
+        self.sorted_money = self.money[self.order]
+        self.sorted_stocks = self.stocks[self.order]
+
+        self.total_money = self.sorted_money.sum()
+        self.total_stocks = self.sorted_stocks.sum()
+        self.weighted_money = np.dot(self.coefficients, self.sorted_money)
+        self.weighted_stocks = np.dot(self.coefficients, self.sorted_stocks)
+
+        self.lowest_valid_price, self.highest_valid_price = self.valid_price_interval(0, self.n)
+        self.resorts += 1
+
+    def valid_price_interval(self, start, stop):
+        """
+        Calculate the price interval for which the order of the ranks start up to stop holds
+        :param start: integer first rank
+        :param stop: integer last rank (exclusive)
+        :return: tuple of floats lowest and highest price
+        """
+        start, stop = max(start, 0), min(stop, self.n)
+        lowest, highest = -np.inf, np.inf
+        if stop - start < 2:
+            return lowest, highest
+
+        # wealth of rank r stays below rank r + 1 as long as price * (s_r - s_r+1) <= m_r+1 - m_r
+        delta_stocks = self.sorted_stocks[start:stop - 1] - self.sorted_stocks[start + 1:stop]
+        delta_money = self.sorted_money[start + 1:stop] - self.sorted_money[start:stop - 1]
+        upper = delta_stocks > 0
+        lower = delta_stocks < 0
+        if upper.any():
+            highest = np.min(delta_money[upper] / delta_stocks[upper])
+        if lower.any():
+            lowest = np.max(delta_money[lower] / delta_stocks[lower])
+        return lowest, highest
+
+    def set_price(self, price):
+        """
+        Revalue the stocks at a new price, re-sorting (O(n log n)) only if the rank order can have changed
+        :param price: float new price
+        :return: None
+        """
+        self.price = price
+        if not self.lowest_valid_price <= price <= self.highest_valid_price:
+            self.sort()
+
+    def update(self, idx, money, stocks):
+        """
+        Update the balance of a single trader and move it to its new rank
+        :param idx: integer name of the trader
+        :param money: float new money balance
+        :param stocks: float new stocks balance
+        :return: None
+        """
+        old_rank = self.rank[idx]
+        old_money, old_stocks = self.sorted_money[old_rank], self.sorted_stocks[old_rank]
+        self.money[idx], self.stocks[idx] = money, stocks
+        new_rank = self.search(money + self.price * stocks, old_rank)
+
+        # traders ranked in between shift one rank, which changes their Gini coefficient by two
+        if new_rank > old_rank:
+            shifted = slice(old_rank, new_rank)
+            self.weighted_money -= 2 * self.sorted_money[old_rank + 1:new_rank + 1].sum()
+            self.weighted_stocks -= 2 * self.sorted_stocks[old_rank + 1:new_rank + 1].sum()
+            for array in [self.sorted_money, self.sorted_stocks, self.order]:
+                array[old_rank:new_rank] = array[old_rank + 1:new_rank + 1]
+        else:
+            shifted = slice(new_rank + 1, old_rank + 1)
+            self.weighted_money += 2 * self.sorted_money[new_rank:old_rank].sum()
+            self.weighted_stocks += 2 * self.sorted_stocks[new_rank:old_rank].sum()
+            for array in [self.sorted_money, self.sorted_stocks, self.order]:
+                array[new_rank + 1:old_rank + 1] = array[new_rank:old_rank]
+
+        self.sorted_money[new_rank], self.sorted_stocks[new_rank] = money, stocks
+        self.order[new_rank] = idx
+        self.rank[self.order[shifted]] = np.arange(shifted.start, shifted.stop)
+        self.rank[idx] = new_rank
+
+        self.weighted_money += self.coefficients[new_rank] * money - self.coefficients[old_rank] * old_money
+        self.weighted_stocks += self.coefficients[new_rank] * stocks - self.coefficients[old_rank] * old_stocks
+        self.total_money += money - old_money
+        self.total_stocks += stocks - old_stocks
+
+        # the order around the moved trader must also hold for future prices
+        lowest, highest = self.valid_price_interval(min(old_rank, new_rank) - 1, max(old_rank, new_rank) + 2)
+        self.lowest_valid_price = max(self.lowest_valid_price, lowest)
+        self.highest_valid_price = min(self.highest_valid_price, highest)
+
+    def search(self, wealth, excluded_rank):
+        """
+        Binary search for the rank of a wealth level among all traders except the one at excluded_rank
+        :param wealth: float wealth level
+        :param excluded_rank: integer rank which is skipped
+        :return: integer rank
+        """
+        low, high = 0, self.n - 1
+        while low < high:
+            middle = (low + high) // 2
+            rank = middle if middle < excluded_rank else middle + 1
+            if self.sorted_money[rank] + self.price * self.sorted_stocks[rank] < wealth:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def wealth(self):
+        """
+        :return: np.Array of current wealth per trader, indexed by trader name
+        """
+        return self.money + self.price * self.stocks
+
+    def total_wealth(self):
+        """
+        :return: float total wealth of all traders
+        """
+        return self.total_money + self.price * self.total_stocks
+
+    def gini(self):
+        """
+        Calculate the Gini coefficient of the current wealth distribution in constant time
+        :return: float Gini coefficient
+        """
+        return (self.weighted_money + self.price * self.weighted_stocks) / (self.n * self.total_wealth())
+
+    def top_share(self, share):
+        """
+        Calculate the share of total wealth owned by the richest fraction of traders
+        :param share: float fraction of the population, e.g. 0.1 for the top 10%
+        :return: float wealth share
+        """
+        k = self.n - int(self.n * (1 - share))
+        top_wealth = self.sorted_money[self.n - k:].sum() + self.price * self.sorted_stocks[self.n - k:].sum()
+        return top_wealth / self.total_wealth()
+
+    def quantile(self, quantile):
+        """
+        Calculate a wealth quantile with linear interpolation between ranks
+        :param quantile: float between 0 and 1
+        :return: float wealth level
+        """
+        position = quantile * (self.n - 1)
+        low = int(position)
+        high = min(low + 1, self.n - 1)
+        low_wealth = self.sorted_money[low] + self.price * self.sorted_stocks[low]
+        high_wealth = self.sorted_money[high] + self.price * self.sorted_stocks[high]
+        return low_wealth + (position - low) * (high_wealth - low_wealth)
+
+    def record(self):
+        """
+        Store the Gini coefficient, top wealth shares and quantiles of the current distribution
+        :return: None
+        """
+        self.gini_history.append(self.gini())
+        for share in self.top_shares:
+            self.top_share_history[share].append(self.top_share(share))
+        for quantile in self.quantiles:
+            self.quantile_history[quantile].append(self.quantile(quantile))
+
+    def __repr__(self):
+        """
+        :return: String representation of the wealth distribution
+        """
+        return "wealth_distribution"
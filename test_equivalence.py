@@ -0,0 +1,54 @@
+"""
+Equivalence checks of equivalence_check.py as tests. The distributional tests use enough seeds that a shift of the
+noise of the expectations by a quarter is detected, so an engine which changes the dynamics fails.
+"""
+import numpy as np
+import pytest
+import equivalence_check
+from equivalence_check import (BASE_PARAMETERS, ENGINES, KEY_STATISTICS, check_distributions, ensemble_statistics,
+                               simulate_statistics)
+
+PARAMETERS = dict(BASE_PARAMETERS, ticks=120)
+SEEDS = list(range(24))
+
+
+@pytest.fixture(autouse=True)
+def ignore_numpy_errors():
+    with np.errstate(all='ignore'):
+        yield
+
+
+@pytest.fixture(scope='module')
+def reference():
+    with np.errstate(all='ignore'):
+        return ensemble_statistics([simulate_statistics([seed, PARAMETERS]) for seed in SEEDS])
+
+
+@pytest.mark.parametrize('check, arguments', [
+    (equivalence_check.check_fundamental_paths, (SEEDS[:8],)),
+    (equivalence_check.check_orderbook_replay, (0,)),
+    (equivalence_check.check_event_sourced_balances, (0,)),
+    (equivalence_check.check_price_ladder, (0,)),
+    (equivalence_check.check_price_ladder, (0, 0.01, 200)),
+    (equivalence_check.check_determinism, (0,))])
+def test_exact_equivalence(check, arguments):
+    results = check(PARAMETERS, *arguments)
+    assert [result['name'] for result in results if not result['passed']] == []
+
+
+def test_portfolio_kernels():
+    results = equivalence_check.check_portfolio_kernels(PARAMETERS, 200, 0)
+    assert [result['name'] for result in results if not result['passed']] == []
+
+
+@pytest.mark.parametrize('engine', ['vectorized', 'event_sourced'])
+def test_engine_distributions(engine, reference):
+    results, _ = check_distributions(PARAMETERS, engine, SEEDS, reference=reference, statistics=KEY_STATISTICS)
+    assert [result['name'] for result in results if not result['passed']] == []
+
+
+def test_shifted_model_is_detected(reference, monkeypatch):
+    monkeypatch.setitem(ENGINES, 'shifted_noise', {'std_noise': 1.25 * PARAMETERS['std_noise']})
+    results, _ = check_distributions(PARAMETERS, 'shifted_noise', SEEDS, reference=reference,
+                                     statistics=KEY_STATISTICS)
+    assert not all(result['passed'] for result in results)
@@ -0,0 +1,46 @@
+"""Localhost tests of the distribution of tasks over workers in functions/job_queue.py"""
+import threading
+import time
+import pytest
+from functions.job_queue import JobServer, start_local_workers, job_authkey
+
+AUTHKEY = b'test-job-queue'
+
+
+def slow_square(x):
+    time.sleep(0.2)
+    if x == 1:
+        raise ValueError("failing task")
+    return x * x
+
+
+def square(x):
+    return x * x
+
+
+def test_authkey_is_required(monkeypatch):
+    monkeypatch.delenv('ABM_JOB_AUTHKEY', raising=False)
+    with pytest.raises(ValueError):
+        job_authkey()
+    with pytest.raises(ValueError):
+        JobServer(('127.0.0.1', 0))
+
+
+def test_failed_task_keeps_workers_alive():
+    with JobServer(('127.0.0.1', 0), authkey=AUTHKEY, task_timeout=30) as server:
+        workers = start_local_workers(server.address, 3, AUTHKEY)
+        # the failing task is in flight together with tasks of other workers when the job is abandoned
+        with pytest.raises(RuntimeError):
+            server.map(slow_square, range(6))
+        time.sleep(1.)
+        assert all(worker.is_alive() for worker in workers)
+        assert server.workers == 3
+        # the serve threads of all workers still take tasks, a lost worker would let this map hang
+        results = []
+        thread = threading.Thread(target=lambda: results.append(server.map(square, range(10))), daemon=True)
+        thread.start()
+        thread.join(20)
+        assert results == [[x * x for x in range(10)]]
+    for worker in workers:
+        worker.join(5)
+    assert not any(worker.is_alive() for worker in workers)
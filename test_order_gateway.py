@@ -0,0 +1,121 @@
+"""Localhost round trips of external agents through functions/order_gateway.py"""
+import math
+import socket
+import time
+import types
+import pytest
+from model import execute_matches
+from objects.orderbook import LimitOrderBook
+from objects.price_ladder import PriceLadderOrderBook
+from functions.order_gateway import (OrderGateway, MESSAGE, REPORT, FRAME, ORDER, CANCEL, ACK, REJECT, FILL,
+                                     CANCELLED, BOOK, MAX_FRAME_RECORDS, pack_frame)
+
+
+def receive_exactly(connection, size):
+    data = b''
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed by the gateway")
+        data += chunk
+    return data
+
+
+def receive_frame(connection):
+    count, = FRAME.unpack(receive_exactly(connection, FRAME.size))
+    return list(REPORT.iter_unpack(receive_exactly(connection, count * REPORT.size)))
+
+
+def connect(gateway, n_clients):
+    connection = socket.create_connection(gateway.address, timeout=10)
+    assert gateway.wait_for_clients(n_clients, 10)
+    return connection
+
+
+class SimulatedTrader:
+    def __init__(self):
+        self.var = types.SimpleNamespace(active_orders=[])
+
+    def buy(self, amount, price):
+        pass
+
+    def sell(self, amount, price):
+        pass
+
+
+@pytest.fixture
+def orderbook():
+    return LimitOrderBook(100., 0.01, 10, 10)
+
+
+def test_order_fill_cancel_round_trip(orderbook):
+    with OrderGateway(lockstep=True, timeout=10) as gateway:
+        connection = connect(gateway, 1)
+        connection.sendall(pack_frame([(ORDER, 1, 99.5, 5), (ORDER, 2, 101., -3)], MESSAGE))
+        gateway.apply(orderbook)
+        assert [(report[0], report[3], report[4], report[6]) for report in receive_frame(connection)] == \
+               [(ACK, 1, 99.5, 5), (ACK, 2, 101., -3)]
+
+        # a simulated ask crosses the external bid and fills 2 of its 5 stocks
+        orderbook.add_ask(99., 2, SimulatedTrader())
+        execute_matches(orderbook, None, set())
+        gateway.publish(orderbook, set())
+        fill, book = receive_frame(connection)
+        assert (fill[0], fill[3], fill[4], fill[6]) == (FILL, 1, 99., 2) and math.isnan(fill[5])
+        assert (book[0], book[4], book[5]) == (BOOK, 99.5, 101.)
+
+        connection.sendall(pack_frame([(CANCEL, 1, 0., 0), (CANCEL, 7, 0., 0)], MESSAGE))
+        gateway.apply(orderbook)
+        cancelled, rejected = receive_frame(connection)
+        assert (cancelled[0], cancelled[3], cancelled[6]) == (CANCELLED, 1, 3)
+        assert (rejected[0], rejected[3]) == (REJECT, 7)
+        assert len(orderbook.bids) == 0 and [order.price for order in orderbook.asks] == [101.]
+        connection.close()
+
+
+def test_stalled_client_is_dropped(orderbook):
+    with OrderGateway(lockstep=True, timeout=0.5) as gateway:
+        active = connect(gateway, 1)
+        stalled = connect(gateway, 2)
+        stalled.sendall(pack_frame([(ORDER, 1, 99.5, 5)], MESSAGE))
+        active.sendall(pack_frame([(ORDER, 1, 101., -1)], MESSAGE))
+        gateway.apply(orderbook)
+        assert len(orderbook.bids) == 1
+
+        # only the active client sends a frame for the next turn
+        active.sendall(pack_frame([(ORDER, 2, 102., -1)], MESSAGE))
+        start_time = time.perf_counter()
+        gateway.apply(orderbook)
+        assert time.perf_counter() - start_time < 5
+        assert gateway.dropped == 1 and len(gateway.connected_clients()) == 1
+        # the orders of the dropped client are cancelled in the turn it is dropped
+        assert len(orderbook.bids) == 0 and len(orderbook.asks) == 2
+        receive_frame(stalled)
+        with pytest.raises(ConnectionError):
+            receive_frame(stalled)
+        active.close()
+        stalled.close()
+
+
+def test_far_off_prices_are_rejected():
+    orderbook = PriceLadderOrderBook(100., 0.01, 10, 10, 0.01)
+    width = len(orderbook.bid_volume)
+    with OrderGateway(lockstep=True, timeout=10, price_band=0.5) as gateway:
+        connection = connect(gateway, 1)
+        connection.sendall(pack_frame([(ORDER, 1, 1e7, -1), (ORDER, 2, 10., 1), (ORDER, 3, math.inf, 1),
+                                       (ORDER, 4, 120., -1)], MESSAGE))
+        gateway.apply(orderbook)
+        assert [(report[0], report[3]) for report in receive_frame(connection)] == \
+               [(REJECT, 1), (REJECT, 2), (REJECT, 3), (ACK, 4)]
+        assert [order.price for order in orderbook.asks] == [120.] and len(orderbook.bids) == 0
+        assert len(orderbook.bid_volume) == width and orderbook.ask_outside == {}
+        connection.close()
+
+
+def test_oversized_frame_disconnects_client():
+    with OrderGateway() as gateway:
+        connection = connect(gateway, 1)
+        connection.sendall(FRAME.pack(MAX_FRAME_RECORDS + 1))
+        assert connection.recv(1) == b''
+        assert gateway.connected_clients() == []
+        connection.close()